@@ -0,0 +1,284 @@
+"""
+基准测试公共工具
+插件目录名（ComfyUI-Hive）包含连字符，无法直接 import，这里按路径加载为 hive 包
+"""
+import http.server
+import importlib
+import importlib.util
+import json
+import os
+import random
+import re
+import socket
+import socketserver
+import ssl
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_hive(submodule="nodes"):
+    """
+    按路径加载插件包并返回指定子模块
+    
+    Args:
+        submodule: 子模块名称
+    
+    Returns:
+        子模块对象
+    """
+    if "hive" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "hive", os.path.join(PLUGIN_DIR, "__init__.py"),
+            submodule_search_locations=[PLUGIN_DIR]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["hive"] = module
+        spec.loader.exec_module(module)
+    return importlib.import_module(f"hive.{submodule}")
+
+
+def use_models_dir(directory):
+    """
+    让插件把 directory 当作 ComfyUI 的 models 目录（下载、哈希索引都写到这里），避免基准测试写入真实的模型目录
+    """
+    comfy_paths = load_hive("hive_paths").comfy_paths
+    comfy_paths._resolve()
+    comfy_paths._models_dir = directory
+
+
+def io_write_bytes():
+    """
+    读取当前进程实际写入磁盘的字节数（仅 Linux 支持，其他平台返回 None）
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def make_sparse_safetensors(path, size):
+    """
+    生成指定大小的稀疏 safetensors 文件（一个 U8 张量，数据全为零，不占用磁盘空间），可以通过下载器的格式检查
+    """
+    header = b''
+    for _ in range(2):
+        # 头部长度会影响张量大小的位数，计算两次使其稳定
+        data_size = size - 8 - len(header)
+        header = json.dumps({"weight": {"dtype": "U8", "shape": [data_size], "data_offsets": [0, data_size]}}).encode('utf-8')
+    header += b' ' * (size - 8 - len(header) - data_size)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.truncate(size)
+
+
+def format_mb(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    支持 Range 请求和 keep-alive 的静态文件处理器
+    服务器的 network 属性（NetworkConditions）可以模拟延迟、限速、不支持 Range、断连和重定向链
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _serve(self, send_body):
+        network = getattr(self.server, 'network', None) or NetworkConditions()
+        if network.latency:
+            time.sleep(network.latency)
+
+        # 重定向链：/redirect/<剩余次数>/<文件名>
+        request_path = self.path.split('?')[0]
+        match = re.match(r'/redirect/(\d+)/(.+)', request_path)
+        if match:
+            remaining_hops = int(match.group(1)) - 1
+            location = f"/redirect/{remaining_hops}/{match.group(2)}" if remaining_hops > 0 else f"/{match.group(2)}"
+            self._send_empty(302, [('Location', location)])
+            return
+
+        path = os.path.join(self.server.root, request_path.lstrip('/'))
+        if not os.path.isfile(path):
+            self._send_empty(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range') if network.range_support else None
+        if range_header:
+            match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        if network.range_support:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{size:x}-{int(os.path.getmtime(path)):x}"')
+        self.end_headers()
+        if not send_body:
+            return
+
+        # 按概率在响应中途的随机位置断开连接
+        remaining = end - start + 1
+        drop_after = None
+        if network.drop_rate and random.random() < network.drop_rate:
+            drop_after = random.randint(0, remaining - 1)
+        throttle = Throttle(network.bandwidth) if network.bandwidth else None
+        sent = 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                length = min(256 * 1024, remaining)
+                if drop_after is not None and sent + length > drop_after:
+                    self.wfile.write(f.read(drop_after - sent))
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                data = f.read(length)
+                if not data:
+                    break
+                if throttle:
+                    throttle.consume(len(data))
+                if self.server.throttle:
+                    self.server.throttle.consume(len(data))
+                self.wfile.write(data)
+                sent += len(data)
+                remaining -= len(data)
+
+
+class Throttle:
+    """
+    令牌桶限速器（线程安全，可以由多个连接共享）
+    
+    Args:
+        rate: 每秒字节数
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_time = time.perf_counter()
+
+    def consume(self, length):
+        with self.lock:
+            now = time.perf_counter()
+            self.next_time = max(self.next_time, now) + length / self.rate
+            delay = self.next_time - now
+        # 允许 0.1 秒的突发
+        if delay > 0.1:
+            time.sleep(delay - 0.1)
+
+
+class NetworkConditions:
+    """
+    模拟的网络条件
+    
+    Args:
+        latency: 每个请求的额外延迟（秒）
+        bandwidth: 每个连接的带宽上限（字节/秒），0 表示不限
+        total_bandwidth: 所有连接共享的带宽上限（字节/秒），0 表示不限
+        range_support: 是否支持 Range 请求
+        drop_rate: 每个响应中途断开连接的概率
+    """
+    def __init__(self, latency=0.0, bandwidth=0, total_bandwidth=0, range_support=True, drop_rate=0.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.total_bandwidth = total_bandwidth
+        self.range_support = range_support
+        self.drop_rate = drop_rate
+
+
+class RangeServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    本地测试服务器，统计建立的连接数（HTTPS 下即为 TLS 握手次数）
+    
+    Args:
+        root: 提供文件的目录
+        certfile: 证书文件，为 None 时使用 HTTP
+        keyfile: 私钥文件
+        network: 模拟的网络条件（NetworkConditions），为 None 时不做限制
+    """
+    daemon_threads = True
+
+    def __init__(self, root, certfile=None, keyfile=None, handler=RangeRequestHandler, network=None):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.root = root
+        self.network = network or NetworkConditions()
+        self.throttle = Throttle(self.network.total_bandwidth) if self.network.total_bandwidth else None
+        self.connections = 0
+        self._connections_lock = threading.Lock()
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+            self.scheme = 'https'
+        self._thread = None
+
+    def finish_request(self, request, client_address):
+        with self._connections_lock:
+            self.connections += 1
+        if isinstance(request, ssl.SSLSocket):
+            request.do_handshake()
+        super().finish_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # 客户端断开或模拟断连时的异常不打印
+        pass
+
+    def url(self, name, redirects=0):
+        if redirects:
+            name = f"redirect/{redirects}/{name}"
+        return f"{self.scheme}://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def make_self_signed_cert(directory):
+    """
+    使用 openssl 命令生成 127.0.0.1 的自签名证书
+    
+    Returns:
+        (证书文件路径, 私钥文件路径)
+    """
+    key_path = os.path.join(directory, 'key.pem')
+    cert_path = os.path.join(directory, 'cert.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+        '-keyout', key_path, '-out', cert_path, '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1'
+    ], check=True, capture_output=True)
+    return cert_path, key_path
@@ -0,0 +1,142 @@
+"""
+模型下载端到端基准测试
+启动本地 HTTP 服务器（可模拟延迟、限速、不支持 Range、随机断连和重定向链），
+对不同大小的文件（稀疏文件，10MB ~ 20GB）执行完整的 run_download，统计吞吐量、峰值内存、CPU 时间和实际写入磁盘的字节数
+每次下载在独立的子进程中运行，峰值内存和 CPU 时间互不影响，服务器的开销也不计入
+
+用法 / Usage:
+    python benchmarks/bench_download.py --sizes 10,100,1024
+    python benchmarks/bench_download.py --sizes 1024 --latency-ms 50 --bandwidth-mbps 20 --drop-rate 0.01 --redirects 3
+    python benchmarks/bench_download.py --sizes 20480 --dir /path/on/target/disk
+    python benchmarks/bench_download.py --sizes 100 --no-range
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import load_hive, use_models_dir, io_write_bytes, format_mb, make_sparse_safetensors, NetworkConditions, RangeServer
+
+RESULT_PREFIX = "HIVE_BENCH_RESULT "
+
+
+def run_child(url, models_dir):
+    """子进程：执行一次下载并输出统计结果（JSON）"""
+    telemetry_path = os.path.join(models_dir, "telemetry.jsonl")
+    os.environ["HIVE_TELEMETRY_LOG"] = telemetry_path
+    nodes = load_hive("nodes")
+    use_models_dir(models_dir)
+
+    before = io_write_bytes()
+    start = time.perf_counter()
+    control = nodes.DownloadControl()
+    nodes.HiveModelDownloader().run_download(url, "bench", "", control)
+    elapsed = time.perf_counter() - start
+    after = io_write_bytes()
+
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_time = usage.ru_utime + usage.ru_stime
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    except ImportError:
+        cpu_time = time.process_time()
+        peak_rss = None
+
+    record = {}
+    try:
+        with open(telemetry_path, encoding="utf-8") as f:
+            record = json.loads(f.readlines()[-1])
+    except (OSError, ValueError, IndexError):
+        pass
+
+    print(RESULT_PREFIX + json.dumps({
+        "completed": control.completed,
+        "bytes": control.downloaded,
+        "seconds": elapsed,
+        "cpu_seconds": cpu_time,
+        "peak_rss": peak_rss,
+        "written": (after - before) if before is not None and after is not None else None,
+        "retries": record.get("retries", 0),
+        "peak_connections": record.get("connections_peak"),
+    }))
+
+
+def run_case(url, size, target_dir):
+    """在子进程中下载一次，返回统计结果"""
+    models_dir = tempfile.mkdtemp(prefix="hive-bench-models-", dir=target_dir)
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", url, "--dir", models_dir],
+            capture_output=True, text=True
+        )
+        for line in reversed(process.stdout.splitlines()):
+            if line.startswith(RESULT_PREFIX):
+                result = json.loads(line[len(RESULT_PREFIX):])
+                downloaded = os.path.join(models_dir, "bench", os.path.basename(url))
+                result["size_ok"] = os.path.exists(downloaded) and os.path.getsize(downloaded) == size
+                return result
+        raise RuntimeError(f"下载子进程没有输出结果 / The download process produced no result:\n{process.stdout[-2000:]}\n{process.stderr[-2000:]}")
+    finally:
+        shutil.rmtree(models_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1024", help="文件大小列表（MB，逗号分隔） / comma separated file sizes in MB")
+    parser.add_argument("--repeat", type=int, default=1, help="每个大小重复次数 / runs per size")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的额外延迟 / added latency per request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="每个连接的带宽上限 MB/s / per-connection bandwidth cap")
+    parser.add_argument("--total-bandwidth-mbps", type=float, default=0, help="总带宽上限 MB/s / total bandwidth cap")
+    parser.add_argument("--no-range", action="store_true", help="服务器不支持 Range 请求 / server without Range support")
+    parser.add_argument("--drop-rate", type=float, default=0, help="每个响应中途断开的概率 / probability of dropping a response midway")
+    parser.add_argument("--redirects", type=int, default=0, help="下载地址的重定向次数 / length of the redirect chain")
+    parser.add_argument("--dir", default=None, help="下载目录（应与模型目录在同一磁盘） / directory on the target disk")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.dir)
+        return
+
+    network = NetworkConditions(
+        latency=args.latency_ms / 1000,
+        bandwidth=int(args.bandwidth_mbps * 1024 * 1024),
+        total_bandwidth=int(args.total_bandwidth_mbps * 1024 * 1024),
+        range_support=not args.no_range,
+        drop_rate=args.drop_rate,
+    )
+    sizes = [int(float(size) * 1024 * 1024) for size in args.sizes.split(",") if size.strip()]
+
+    serve_dir = tempfile.mkdtemp(prefix="hive-bench-www-")
+    try:
+        # 稀疏文件：不占用磁盘空间，服务器读取时几乎没有开销
+        for size in sizes:
+            make_sparse_safetensors(os.path.join(serve_dir, f"model-{size}.safetensors"), size)
+
+        print(f"延迟/latency: {args.latency_ms:g} ms, 每连接带宽/per connection: {args.bandwidth_mbps or '∞'} MB/s, "
+              f"总带宽/total: {args.total_bandwidth_mbps or '∞'} MB/s, Range: {'off' if args.no_range else 'on'}, "
+              f"断连概率/drop rate: {args.drop_rate:g}, 重定向/redirects: {args.redirects}")
+        print(f"{'size':>10} {'MB/s':>8} {'seconds':>8} {'CPU s':>7} {'peak RSS':>10} {'written':>11} {'retries':>7} {'conns':>5}  ok")
+        with RangeServer(serve_dir, network=network) as server:
+            for size in sizes:
+                url = server.url(f"model-{size}.safetensors", redirects=args.redirects)
+                for _ in range(args.repeat):
+                    result = run_case(url, size, args.dir)
+                    seconds = result["seconds"]
+                    ok = result["completed"] and result["size_ok"]
+                    print(f"{format_mb(size):>10} {size / seconds / 1024 / 1024 if seconds > 0 else 0:8.1f} {seconds:8.2f} "
+                          f"{result['cpu_seconds']:7.2f} {format_mb(result['peak_rss']) if result['peak_rss'] else 'n/a':>10} "
+                          f"{format_mb(result['written']) if result['written'] is not None else 'n/a':>11} "
+                          f"{result['retries']:7d} {result['peak_connections'] or '-':>5}  {'✓' if ok else '✗'}")
+    finally:
+        shutil.rmtree(serve_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+节点安装（git clone）基准测试
+在本地创建一个带有较长历史和二进制示例图片的裸仓库，分别用 shallow / blobless / full 方式安装，
+统计耗时和传输的数据量（安装后对象包的大小），再推送一个新提交测量更新耗时；
+最后测试本地镜像缓存（HIVE_GIT_CACHE）：首次安装（创建镜像）、再次安装（从镜像克隆）和断网后安装
+
+仓库通过 file:// 地址访问：git 对普通本地路径会直接复制对象并忽略 --depth，不能反映网络传输的情况
+
+用法 / Usage:
+    python benchmarks/bench_git_clone.py
+    python benchmarks/bench_git_clone.py --commits 300 --image-mb 2 --ref v1.0
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from bench_common import load_hive, format_mb
+
+
+def git(args, cwd):
+    subprocess.run(['git'] + args, cwd=cwd, check=True, capture_output=True)
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def make_repo(base, commits, image_mb):
+    """
+    创建测试用的裸仓库：每次提交修改一个 Python 文件，每 10 次提交替换一张示例图片（随机内容，无法压缩）
+
+    Returns:
+        (裸仓库路径, 工作目录路径)
+    """
+    work = os.path.join(base, "src")
+    bare = os.path.join(base, "ComfyUI-BenchNode.git")
+    os.makedirs(work)
+    git(['init', '--quiet', '-b', 'main'], work)
+    git(['config', 'user.email', 'bench@example.com'], work)
+    git(['config', 'user.name', 'bench'], work)
+    os.makedirs(os.path.join(work, "examples"))
+    for i in range(commits):
+        with open(os.path.join(work, "nodes.py"), "w") as f:
+            f.write(f"VERSION = {i}\n" + "# padding\n" * 200)
+        if i % 10 == 0:
+            with open(os.path.join(work, "examples", f"sample_{i % 30}.png"), "wb") as f:
+                f.write(os.urandom(int(image_mb * 1024 * 1024)))
+        git(['add', '-A'], work)
+        git(['commit', '--quiet', '-m', f'commit {i}'], work)
+        if i == commits // 2:
+            git(['tag', 'v1.0'], work)
+    git(['clone', '--quiet', '--bare', work, bare], base)
+    # 与 GitHub 等托管服务一样允许部分克隆（--filter）
+    git(['config', 'uploadpack.allowFilter', 'true'], bare)
+    git(['remote', 'add', 'origin', bare], work)
+    return bare, work
+
+
+def run_cached(nodes, installer, base, url, bare):
+    """镜像缓存：首次安装、缓存命中、断网后安装，返回 [(场景, 耗时, 节点目录 .git 大小, 是否成功)]"""
+    nodes.GIT_CACHE_DIR = os.path.join(base, "git-cache")
+    results = []
+    try:
+        for case in ("cold", "warm", "offline"):
+            custom_nodes = os.path.join(base, f"custom_nodes_cache_{case}")
+            os.makedirs(custom_nodes)
+            install_path = os.path.join(custom_nodes, "ComfyUI-BenchNode")
+            if case == "offline":
+                # 移走远程仓库模拟断网
+                os.rename(bare, bare + ".offline")
+            try:
+                start = time.perf_counter()
+                installer._install_from_git(url, custom_nodes)
+                seconds = time.perf_counter() - start
+            finally:
+                if case == "offline":
+                    os.rename(bare + ".offline", bare)
+            ok = os.path.exists(os.path.join(install_path, "nodes.py"))
+            results.append((case, seconds, dir_size(os.path.join(install_path, ".git")), ok))
+    finally:
+        nodes.GIT_CACHE_DIR = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=200, help="仓库的提交数 / number of commits")
+    parser.add_argument("--image-mb", type=float, default=1, help="每张示例图片的大小（MB） / size of each sample image in MB")
+    parser.add_argument("--ref", default="", help="安装指定的分支、标签或提交 / branch, tag or commit to install")
+    args = parser.parse_args()
+
+    os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+    nodes = load_hive("nodes")
+    installer = nodes.HiveNodeInstaller()
+
+    base = tempfile.mkdtemp(prefix="hive-bench-git-")
+    try:
+        print(f"创建测试仓库 / Creating test repository: {args.commits} commits, {args.image_mb:g} MB images")
+        bare, work = make_repo(base, args.commits, args.image_mb)
+        url = "file://" + bare
+        print(f"仓库大小 / repository size: {format_mb(dir_size(bare))}")
+        print(f"{'mode':>9} {'clone s':>8} {'transferred':>12} {'.git size':>10} {'update s':>9}  ok")
+
+        for mode in nodes.GIT_INSTALL_MODES:
+            custom_nodes = os.path.join(base, f"custom_nodes_{mode}")
+            os.makedirs(custom_nodes)
+            install_path = os.path.join(custom_nodes, "ComfyUI-BenchNode")
+
+            start = time.perf_counter()
+            result = installer._install_from_git(url, custom_nodes, mode, args.ref)
+            clone_seconds = time.perf_counter() - start
+            ok = os.path.exists(os.path.join(install_path, "nodes.py"))
+            # 对象包的大小近似等于实际传输的数据量
+            transferred = dir_size(os.path.join(install_path, ".git", "objects"))
+            git_size = dir_size(os.path.join(install_path, ".git"))
+
+            # 推送一个新提交后更新
+            update_seconds = None
+            if ok and not args.ref:
+                with open(os.path.join(work, "nodes.py"), "a") as f:
+                    f.write(f"# update for {mode}\n")
+                git(['commit', '--quiet', '-am', f'update {mode}'], work)
+                git(['push', '--quiet', 'origin', 'main'], work)
+                start = time.perf_counter()
+                installer._install_from_git(url, custom_nodes, mode)
+                update_seconds = time.perf_counter() - start
+                with open(os.path.join(install_path, "nodes.py")) as f:
+                    ok = f"# update for {mode}" in f.read()
+            if not ok:
+                print(result["ui"]["text"][0])
+            print(f"{mode:>9} {clone_seconds:8.2f} {format_mb(transferred):>12} {format_mb(git_size):>10} "
+                  f"{update_seconds if update_seconds is not None else float('nan'):9.2f}  {'✓' if ok else '✗'}")
+
+        print(f"\n镜像缓存 / mirror cache (HIVE_GIT_CACHE)")
+        print(f"{'case':>9} {'clone s':>8} {'.git size':>10}  ok")
+        for case, seconds, git_size, ok in run_cached(nodes, installer, base, url, bare):
+            print(f"{case:>9} {seconds:8.2f} {format_mb(git_size):>10}  {'✓' if ok else '✗'}")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
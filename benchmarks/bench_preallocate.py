@@ -0,0 +1,110 @@
+"""
+预分配直写 vs 分片临时文件+合并 的磁盘开销对比
+只比较落盘部分（网络部分两种方式相同），统计耗时和实际写入字节数
+
+用法 / Usage:
+    python benchmarks/bench_preallocate.py --size-mb 2048 --segments 8 --dir /path/on/target/disk
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import load_hive, io_write_bytes, format_mb
+
+BLOCK = 1024 * 1024  # 模拟网络每次到达 1MB 数据
+
+
+def _segments(total_size, num_segments):
+    seg_size = total_size // num_segments
+    for i in range(num_segments):
+        start = i * seg_size
+        end = start + seg_size - 1 if i < num_segments - 1 else total_size - 1
+        yield i, start, end
+
+
+def _write_range(f, length, payload):
+    left = length
+    while left > 0:
+        n = min(left, len(payload))
+        f.write(payload[:n])
+        left -= n
+
+
+def run_temp_merge(target, total_size, num_segments, payload):
+    """旧方式：每个分片写入独立临时文件，再以 64MB 块合并到目标文件"""
+    part_paths = {}
+
+    def worker(seg_id, start, end):
+        path = f"{target}.part{seg_id}.tmp"
+        with open(path, 'wb') as f:
+            _write_range(f, end - start + 1, payload)
+        part_paths[seg_id] = path
+
+    with ThreadPoolExecutor(max_workers=num_segments) as executor:
+        list(executor.map(lambda args: worker(*args), _segments(total_size, num_segments)))
+
+    with open(target, 'wb') as out:
+        for seg_id in range(num_segments):
+            with open(part_paths[seg_id], 'rb') as f:
+                shutil.copyfileobj(f, out, 64 * 1024 * 1024)
+            os.unlink(part_paths[seg_id])
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def run_preallocated(target, total_size, num_segments, payload, preallocate):
+    """新方式：预分配目标文件，各线程按偏移直接写入"""
+    preallocate(target, total_size)
+
+    def worker(seg_id, start, end):
+        with open(target, 'r+b') as f:
+            f.seek(start)
+            _write_range(f, end - start + 1, payload)
+
+    with ThreadPoolExecutor(max_workers=num_segments) as executor:
+        list(executor.map(lambda args: worker(*args), _segments(total_size, num_segments)))
+
+    with open(target, 'r+b') as f:
+        os.fsync(f.fileno())
+
+
+def measure(name, func, *args):
+    before = io_write_bytes()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    after = io_write_bytes()
+    written = (after - before) if before is not None and after is not None else None
+    written_text = format_mb(written) if written is not None else "n/a"
+    print(f"{name:<24} {elapsed:8.2f} s   写入/written: {written_text}")
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--dir", default=None, help="测试目录（应与模型目录在同一磁盘） / directory on the target disk")
+    args = parser.parse_args()
+
+    nodes = load_hive("nodes")
+    total_size = args.size_mb * 1024 * 1024
+    payload = os.urandom(BLOCK)
+
+    work_dir = tempfile.mkdtemp(prefix="hive-bench-", dir=args.dir)
+    try:
+        target = os.path.join(work_dir, "model.safetensors")
+        print(f"文件大小 / File size: {format_mb(total_size)}, 分片数 / Segments: {args.segments}")
+        measure("temp files + merge", run_temp_merge, target, total_size, args.segments, payload)
+        os.unlink(target)
+        measure("preallocated offsets", run_preallocated, target, total_size, args.segments, payload, nodes._preallocate_file)
+        os.unlink(target)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+模型文件的块级增量更新（类似 zsync）
+发布者为模型文件生成块校验索引（<文件名>.blocks.json，与模型放在同一目录），
+下载器更新本地已有的旧版本时，先对比块哈希，内容相同的块直接从旧文件复制，只用 Range 请求下载变化的部分
+
+safetensors 文件的头部（张量元数据）长度经常随修订变化，导致后面所有数据整体偏移；
+因此块从数据区起始位置开始划分（头部单独作为一块），旧文件按它自己的数据区起始位置划分后再按哈希匹配，
+偏移变化或张量顺序调整（块大小的整数倍）都不影响复用
+
+生成索引:
+    python hive_delta.py index <模型文件>... [--block-size MB]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+try:
+    from .hive_formats import safetensors_header_size
+except ImportError:
+    # 作为脚本运行（python hive_delta.py index ...）
+    from hive_formats import safetensors_header_size
+
+BLOCK_INDEX_SUFFIX = '.blocks.json'
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+INDEX_VERSION = 1
+
+
+def safetensors_data_offset(f, size):
+    """
+    safetensors 数据区的起始位置（8 字节头部长度 + JSON 头部），不是 safetensors 文件时返回 0
+
+    Args:
+        f: 以二进制方式打开的文件
+        size: 文件大小
+    """
+    f.seek(0)
+    prefix = f.read(9)
+    # 头部长度的范围检查与下载时的格式检查共用同一规则
+    header_size = safetensors_header_size(prefix, size) if len(prefix) == 9 else None
+    if header_size is None:
+        return 0
+    return 8 + header_size
+
+
+def block_ranges(size, block_size, data_offset=0):
+    """
+    文件的分块方式：[0, data_offset) 为头部块，之后从 data_offset 开始按 block_size 划分
+
+    Returns:
+        [(start, length)]
+    """
+    ranges = []
+    if data_offset:
+        ranges.append((0, data_offset))
+    start = data_offset
+    while start < size:
+        length = min(block_size, size - start)
+        ranges.append((start, length))
+        start += length
+    return ranges
+
+
+def _hash_blocks(path, block_size, with_sha256=False):
+    """
+    计算文件每个块的哈希
+
+    Returns:
+        (文件大小, 数据区起始位置, [块哈希], 文件 SHA-256 或 None)
+    """
+    size = os.path.getsize(path)
+    sha256 = hashlib.sha256() if with_sha256 else None
+    hashes = []
+    with open(path, 'rb') as f:
+        data_offset = safetensors_data_offset(f, size)
+        f.seek(0)
+        for start, length in block_ranges(size, block_size, data_offset):
+            data = f.read(length)
+            hashes.append(hashlib.blake2b(data, digest_size=16).hexdigest())
+            if sha256:
+                sha256.update(data)
+    return size, data_offset, hashes, sha256.hexdigest() if sha256 else None
+
+
+def build_block_index(path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    生成文件的块校验索引
+
+    Returns:
+        {"version", "size", "sha256", "block_size", "data_offset", "hash", "blocks": [块哈希]}
+    """
+    size, data_offset, hashes, sha256 = _hash_blocks(path, block_size, with_sha256=True)
+    return {
+        "version": INDEX_VERSION,
+        "size": size,
+        "sha256": sha256,
+        "block_size": block_size,
+        "data_offset": data_offset,
+        "hash": "blake2b-128",
+        "blocks": hashes,
+    }
+
+
+def validate_block_index(index, total_size):
+    """检查下载到的索引格式正确且与远程文件大小一致"""
+    try:
+        if index.get("version") != INDEX_VERSION or index.get("hash") != "blake2b-128" or index["size"] != total_size:
+            return False
+        return len(index["blocks"]) == len(block_ranges(index["size"], index["block_size"], index["data_offset"]))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return False
+
+
+def plan_delta(index, local_path):
+    """
+    对比远程文件的块索引与本地旧文件，找出可以从旧文件复制的块
+
+    Args:
+        index: 远程文件的块校验索引
+        local_path: 本地旧版本文件
+
+    Returns:
+        [(start, length, 旧文件中的偏移 或 None)]，按远程文件顺序覆盖整个文件；None 表示需要下载
+    """
+    local_size, _, local_hashes, _ = _hash_blocks(local_path, index["block_size"])
+    with open(local_path, 'rb') as f:
+        local_offset = safetensors_data_offset(f, local_size)
+    local_blocks = {}
+    for (start, length), block_hash in zip(block_ranges(local_size, index["block_size"], local_offset), local_hashes):
+        local_blocks.setdefault((block_hash, length), start)
+
+    plan = []
+    for (start, length), block_hash in zip(block_ranges(index["size"], index["block_size"], index["data_offset"]), index["blocks"]):
+        plan.append((start, length, local_blocks.get((block_hash, length))))
+    return plan
+
+
+def copy_range(src, dst, src_offset, dst_offset, length, buffer_size=8 * 1024 * 1024):
+    """
+    把 src 文件的一段复制到 dst 文件的指定位置
+    支持 copy_file_range 时由内核直接复制（部分文件系统上不产生实际写入）
+
+    Args:
+        src: 源文件（二进制读）
+        dst: 目标文件（二进制写）
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = 0
+            while copied < length:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), length - copied, src_offset + copied, dst_offset + copied)
+                if n == 0:
+                    break
+                copied += n
+            if copied == length:
+                return
+            src_offset, dst_offset, length = src_offset + copied, dst_offset + copied, length - copied
+        except OSError:
+            pass
+    src.seek(src_offset)
+    dst.seek(dst_offset)
+    while length > 0:
+        data = src.read(min(buffer_size, length))
+        if not data:
+            raise OSError("旧文件读取不完整 / Unexpected end of the local file")
+        dst.write(data)
+        length -= len(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hive 块校验索引 / Hive block checksum index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="为模型文件生成块校验索引 / write a block index next to each file")
+    index_parser.add_argument("files", nargs="+")
+    index_parser.add_argument("--block-size", type=float, default=DEFAULT_BLOCK_SIZE / 1024 / 1024, help="块大小（MB） / block size in MB")
+    args = parser.parse_args(argv)
+
+    block_size = int(args.block_size * 1024 * 1024)
+    for path in args.files:
+        index = build_block_index(path, block_size)
+        index_path = path + BLOCK_INDEX_SUFFIX
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        print(f"✓ {index_path}: {len(index['blocks'])} 块/blocks, SHA-256 {index['sha256']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+模型文件格式检查
+下载开始前用文件开头的少量字节判断内容是否真的是模型文件（需要登录的地址常常返回 HTML 登录页或 JSON 错误信息），
+下载完成后再做一次廉价的结构检查（safetensors 头部记录的数据长度与文件大小一致、zip 目录完整等），尽早发现截断的文件
+"""
+import json
+import os
+import struct
+import zipfile
+
+# safetensors 头部长度的合理上限（hive_delta 也使用这里的规则）
+MAX_SAFETENSORS_HEADER = 100 * 1024 * 1024
+
+# 下载开始前检查的前缀长度（safetensors 头部更长时再补充读取）
+SNIFF_SIZE = 64 * 1024
+
+# 内容本来就是文本的文件，不做 HTML/JSON 检查
+TEXT_EXTENSIONS = {'.json', '.yaml', '.yml', '.txt', '.md', '.html', '.htm', '.py', '.csv', '.toml', '.xml'}
+
+# 模型权重文件：出现 JSON 内容也视为错误信息
+MODEL_EXTENSIONS = {'.safetensors', '.sft', '.ckpt', '.pt', '.pth', '.bin', '.gguf', '.onnx', '.pkl'}
+
+ZIP_MAGIC = b'PK\x03\x04'
+GGUF_MAGIC = b'GGUF'
+
+
+class ModelFormatError(ValueError):
+    """内容不是有效的模型文件"""
+
+
+def _text_error(prefix, ext):
+    """
+    内容是 HTML 页面或 JSON 错误信息时返回错误描述，否则返回 None
+    """
+    if ext in TEXT_EXTENSIONS:
+        return None
+    text = prefix[:1024].lstrip(b'\xef\xbb\xbf \t\r\n')
+    head = text.lower()
+    if head.startswith((b'<!doctype', b'<html', b'<head', b'<?xml')):
+        return "服务器返回的是网页（可能需要登录或接受许可） / The server returned a web page (login or license acceptance may be required)"
+    if ext in MODEL_EXTENSIONS and head.startswith((b'{', b'[')):
+        return f"服务器返回的是 JSON 信息而不是模型文件 / The server returned a JSON message instead of a model file: {text[:200].decode('utf-8', 'replace')}"
+    return None
+
+
+def safetensors_header_size(prefix, total_size=0):
+    """
+    读取 safetensors 开头 8 字节记录的头部（JSON）长度并检查范围
+
+    Args:
+        prefix: 文件开头的字节（至少 8 字节；多于 8 字节时还检查头部以 { 开始）
+        total_size: 文件总大小，未知时为 0
+
+    Returns:
+        头部长度，不是有效的 safetensors 文件时返回 None
+    """
+    if len(prefix) < 8:
+        return None
+    header_size = struct.unpack('<Q', prefix[:8])[0]
+    if header_size > MAX_SAFETENSORS_HEADER or (total_size and 8 + header_size > total_size):
+        return None
+    if len(prefix) > 8 and header_size and prefix[8:9] != b'{':
+        return None
+    return header_size
+
+
+def _check_safetensors(prefix, total_size):
+    """
+    检查 safetensors 头部
+
+    Returns:
+        头部不完整时返回完整检查需要的前缀长度，否则返回 0
+    """
+    if len(prefix) < 8:
+        if total_size and total_size < 8:
+            raise ModelFormatError(f"文件太小，不是 safetensors 文件 / File too small to be a safetensors file: {total_size} bytes")
+        return 8
+    header_size = safetensors_header_size(prefix, total_size)
+    if header_size is None:
+        header_size = struct.unpack('<Q', prefix[:8])[0]
+        raise ModelFormatError(f"不是有效的 safetensors 文件（头部长度 {header_size}） / Not a valid safetensors file (header length {header_size})")
+    if len(prefix) < 8 + header_size:
+        return 8 + header_size
+    try:
+        header = json.loads(prefix[8:8 + header_size].decode('utf-8'))
+        data_size = 0
+        for name, info in header.items():
+            if name == '__metadata__':
+                continue
+            begin, end = info['data_offsets']
+            if not 0 <= begin <= end:
+                raise ValueError(f"{name}: {begin}-{end}")
+            data_size = max(data_size, end)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ModelFormatError(f"safetensors 头部无效 / Invalid safetensors header: {e}")
+    if total_size and 8 + header_size + data_size != total_size:
+        raise ModelFormatError(f"safetensors 头部记录的大小与文件大小不一致（文件可能不完整） / The safetensors header expects {8 + header_size + data_size} bytes but the file has {total_size} bytes (truncated file?)")
+    return 0
+
+
+def check_prefix(prefix, filename, total_size=0):
+    """
+    根据文件开头的字节检查内容与文件类型是否相符
+
+    Args:
+        prefix: 文件开头的字节
+        filename: 文件名（按扩展名判断类型）
+        total_size: 文件总大小，未知时为 0
+
+    Returns:
+        需要更长的前缀才能完成检查时返回所需长度，否则返回 0
+
+    Raises:
+        ModelFormatError: 内容不是有效的模型文件
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.safetensors', '.sft'):
+        try:
+            return _check_safetensors(prefix, total_size)
+        except ModelFormatError:
+            error = _text_error(prefix, ext)
+            if error:
+                raise ModelFormatError(error)
+            raise
+    if ext == '.gguf':
+        if prefix[:4] != GGUF_MAGIC:
+            raise ModelFormatError(_text_error(prefix, ext) or "不是有效的 GGUF 文件 / Not a valid GGUF file")
+        return 0
+    if ext in ('.ckpt', '.pt', '.pth'):
+        # PyTorch 的 zip 格式，或旧版 torch.save 的 pickle（协议 2 以上以 0x80 开头）
+        if not (prefix.startswith(ZIP_MAGIC) or prefix[:1] == b'\x80'):
+            raise ModelFormatError(_text_error(prefix, ext) or f"不是有效的 {ext} 文件 / Not a valid {ext} file")
+        return 0
+    error = _text_error(prefix, ext)
+    if error:
+        raise ModelFormatError(error)
+    return 0
+
+
+def validate_file(path, filename=None):
+    """
+    下载完成后的结构检查：safetensors 头部与文件大小一致，zip 格式（PyTorch 权重）的目录完整，GGUF 文件头正确
+
+    Args:
+        path: 文件路径
+        filename: 用于判断类型的文件名（path 为临时文件名时指定）
+
+    Raises:
+        ModelFormatError: 文件结构不正确
+    """
+    filename = filename or os.path.basename(path)
+    total_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        prefix = f.read(SNIFF_SIZE)
+        needed = check_prefix(prefix, filename, total_size)
+        if needed > len(prefix):
+            f.seek(0)
+            check_prefix(f.read(needed), filename, total_size)
+    if prefix.startswith(ZIP_MAGIC):
+        try:
+            # 只读取文件末尾的中央目录，截断的 zip 会在这里报错
+            with zipfile.ZipFile(path) as zf:
+                zf.infolist()
+        except zipfile.BadZipFile as e:
+            raise ModelFormatError(f"zip 结构损坏（文件可能不完整） / Broken zip structure (truncated file?): {e}")
@@ -0,0 +1,139 @@
+"""
+ComfyUI 目录解析
+ComfyUI 根目录、models 目录和 custom_nodes 目录只解析一次；能导入 ComfyUI 的 folder_paths 时直接使用，
+否则从插件目录向上查找。models 子目录列表按目录修改时间缓存，
+避免每次请求节点定义（/object_info）都遍历目录，网络文件系统上尤其明显
+"""
+import os
+import threading
+
+DEFAULT_MODELS_SUBDIRS = ["checkpoints", "loras", "vae", "upscale_models", "controlnet"]
+
+# 向上查找的最大层数
+MAX_PARENT_LEVELS = 5
+
+
+class ComfyPaths:
+    """ComfyUI 目录解析服务（全局共享一个实例 comfy_paths）"""
+    def __init__(self):
+        self.plugin_dir = os.path.dirname(os.path.abspath(__file__))
+        self.lock = threading.Lock()
+        self._resolved = False
+        self._comfyui_root = None
+        self._models_dir = None
+        self._custom_nodes_dir = None
+        self._subdirs = None
+        self._subdirs_mtime = None
+
+    def _parents(self):
+        """插件目录及其上级目录（最多向上查找5层）"""
+        check_dir = self.plugin_dir
+        for _ in range(MAX_PARENT_LEVELS):
+            yield check_dir
+            parent = os.path.dirname(check_dir)
+            if parent == check_dir:
+                break
+            check_dir = parent
+
+    def _resolve(self):
+        if self._resolved:
+            return
+        with self.lock:
+            if self._resolved:
+                return
+            try:
+                # 在 ComfyUI 中运行时直接使用官方的目录配置
+                import folder_paths
+                self._comfyui_root = folder_paths.base_path
+                self._models_dir = folder_paths.models_dir
+                custom_nodes_paths = folder_paths.get_folder_paths("custom_nodes")
+                if custom_nodes_paths:
+                    self._custom_nodes_dir = custom_nodes_paths[0]
+            except:
+                pass
+
+            if not self._comfyui_root:
+                for check_dir in self._parents():
+                    if os.path.exists(os.path.join(check_dir, "models")):
+                        self._comfyui_root = check_dir
+                        break
+
+            if not self._models_dir:
+                if self._comfyui_root:
+                    self._models_dir = os.path.join(self._comfyui_root, "models")
+                else:
+                    # 如果找不到，使用插件目录下的 models 文件夹
+                    self._models_dir = os.path.join(self.plugin_dir, "models")
+
+            if not self._custom_nodes_dir:
+                self._custom_nodes_dir = self._find_custom_nodes_dir()
+
+            self._resolved = True
+
+    def _find_custom_nodes_dir(self):
+        # 方法1: 当前文件就在 custom_nodes 目录下
+        if os.path.basename(os.path.dirname(self.plugin_dir)) == "custom_nodes":
+            return os.path.dirname(self.plugin_dir)
+
+        # 方法2: 向上查找 custom_nodes 目录
+        for check_dir in self._parents():
+            if os.path.basename(check_dir) == "custom_nodes":
+                return check_dir
+
+        # 方法3: 查找 ComfyUI 根目录下的 custom_nodes
+        for check_dir in self._parents():
+            custom_nodes_path = os.path.join(check_dir, "custom_nodes")
+            if os.path.isdir(custom_nodes_path):
+                return custom_nodes_path
+
+        return None
+
+    @property
+    def comfyui_root(self):
+        """ComfyUI 根目录，找不到时为 None"""
+        self._resolve()
+        return self._comfyui_root
+
+    @property
+    def models_dir(self):
+        """models 目录的绝对路径"""
+        self._resolve()
+        return os.path.abspath(self._models_dir)
+
+    @property
+    def custom_nodes_dir(self):
+        """custom_nodes 目录，找不到时为 None"""
+        self._resolve()
+        return self._custom_nodes_dir
+
+    def models_subdirs(self):
+        """
+        models 下的子目录列表
+        只有 models 目录的修改时间变化（新增或删除子目录）时才重新列出
+
+        Returns:
+            子目录名称列表，目录不存在或为空时返回默认列表
+        """
+        models_dir = self.models_dir
+        try:
+            mtime = os.stat(models_dir).st_mtime_ns
+        except OSError:
+            return list(DEFAULT_MODELS_SUBDIRS)
+
+        with self.lock:
+            if self._subdirs is None or self._subdirs_mtime != mtime:
+                subdirs = []
+                try:
+                    with os.scandir(models_dir) as entries:
+                        for entry in entries:
+                            if entry.is_dir() and not entry.name.startswith('.'):
+                                subdirs.append(entry.name)
+                except OSError:
+                    subdirs = []
+                self._subdirs = sorted(subdirs)
+                self._subdirs_mtime = mtime
+            subdirs = self._subdirs
+        return list(subdirs) if subdirs else list(DEFAULT_MODELS_SUBDIRS)
+
+
+comfy_paths = ComfyPaths()
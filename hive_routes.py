@@ -0,0 +1,112 @@
+"""
+Hive 后台任务的 HTTP 接口（注册到 ComfyUI 的 PromptServer）
+
+    GET  /hive/downloads                  列出所有下载任务
+    POST /hive/downloads                  提交下载任务 {"url": ..., "save_directory": ..., "sha256": ..., "update": false}
+    GET  /hive/downloads/{job_id}         查询任务状态
+    POST /hive/downloads/{job_id}/pause   暂停任务
+    POST /hive/downloads/{job_id}/resume  恢复任务
+    POST /hive/downloads/{job_id}/cancel  取消任务并删除已下载的部分
+    POST /hive/batches                    提交批量下载 {"manifest": ..., "save_directory": ...}
+    GET  /hive/batches/{batch_id}         查询批量下载的总进度和每个文件的进度
+    POST /hive/batches/{batch_id}/pause|resume|cancel  暂停/恢复/取消整批任务
+    GET  /hive/metrics                    下载指标（Prometheus 文本格式）
+"""
+import asyncio
+
+from aiohttp import web
+from server import PromptServer
+
+from .nodes import download_jobs, download_metrics, HiveBatchModelDownloader
+
+routes = PromptServer.instance.routes
+
+
+def _job_response(job):
+    if job is None:
+        return web.json_response({"error": "任务不存在 / Job not found"}, status=404)
+    return web.json_response(job.to_dict())
+
+
+@routes.get("/hive/downloads")
+async def list_download_jobs(request):
+    return web.json_response({"jobs": download_jobs.list()})
+
+
+@routes.post("/hive/downloads")
+async def submit_download_job(request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    url = (data.get("url") or "").strip()
+    if not url:
+        return web.json_response({"error": "请提供有效的下载地址 / Please provide a valid download URL"}, status=400)
+    try:
+        job = download_jobs.submit(url, data.get("save_directory") or "checkpoints", data.get("sha256") or "", update=bool(data.get("update")))
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    return _job_response(job)
+
+
+@routes.get("/hive/downloads/{job_id}")
+async def get_download_job(request):
+    return _job_response(download_jobs.get(request.match_info["job_id"]))
+
+
+@routes.post("/hive/downloads/{job_id}/pause")
+async def pause_download_job(request):
+    return _job_response(download_jobs.pause(request.match_info["job_id"]))
+
+
+@routes.post("/hive/downloads/{job_id}/resume")
+async def resume_download_job(request):
+    return _job_response(download_jobs.resume(request.match_info["job_id"]))
+
+
+@routes.post("/hive/downloads/{job_id}/cancel")
+async def cancel_download_job(request):
+    return _job_response(download_jobs.cancel(request.match_info["job_id"]))
+
+
+def _batch_response(batch_id):
+    batch = download_jobs.get_batch(batch_id)
+    if batch is None:
+        return web.json_response({"error": "批次不存在 / Batch not found"}, status=404)
+    return web.json_response(batch)
+
+
+@routes.post("/hive/batches")
+async def submit_download_batch(request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    # 解析清单时需要请求所有文件的大小，放到线程中执行，避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, HiveBatchModelDownloader().download_models, data.get("manifest") or "", data.get("save_directory") or "checkpoints")
+    batch_ids = result["ui"].get("batch_id")
+    if not batch_ids:
+        return web.json_response({"error": result["ui"]["text"][0]}, status=400)
+    return _batch_response(batch_ids[0])
+
+
+@routes.get("/hive/batches/{batch_id}")
+async def get_download_batch(request):
+    return _batch_response(request.match_info["batch_id"])
+
+
+@routes.post("/hive/batches/{batch_id}/{action}")
+async def control_download_batch(request):
+    batch_id = request.match_info["batch_id"]
+    action = {"pause": download_jobs.pause, "resume": download_jobs.resume, "cancel": download_jobs.cancel}.get(request.match_info["action"])
+    if action is None:
+        return web.json_response({"error": "不支持的操作 / Unsupported action"}, status=400)
+    for job_id in download_jobs.batch_job_ids(batch_id):
+        action(job_id)
+    return _batch_response(batch_id)
+
+
+@routes.get("/hive/metrics")
+async def get_download_metrics(request):
+    return web.Response(body=download_metrics.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
@@ -0,0 +1,400 @@
+"""
+模型文件的内容哈希索引与去重
+models 目录下维护一个 SHA-256 索引（.hive_hash_index.json），下载前如果已知远程文件的哈希，
+并且本地已有相同内容的文件（哪怕文件名或目录不同），直接用硬链接/reflink 完成“下载”；
+下载完成后如果发现与已有文件内容相同，也替换为硬链接以节省磁盘空间
+另外提供跨进程文件锁，多个 ComfyUI 实例共用同一个 models 目录时避免同时写入同一个文件
+
+离线去重（把 models 目录下已有的重复文件合并为硬链接）:
+    python hive_store.py dedup [models 目录] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+INDEX_NAME = '.hive_hash_index.json'
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 小于该大小的文件不参与去重（配置文件等，去重收益很小）
+MIN_DEDUP_SIZE = 1024 * 1024
+
+
+def sha256_file(path, buffer=None):
+    """
+    计算文件的 SHA-256
+
+    Args:
+        buffer: 可选的读缓冲区，不提供时分配 HASH_BLOCK_SIZE 大小的缓冲区
+    """
+    sha256 = hashlib.sha256()
+    view = memoryview(buffer if buffer is not None else bytearray(HASH_BLOCK_SIZE))
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            length = f.readinto(view)
+            if not length:
+                break
+            sha256.update(view[:length])
+    return sha256.hexdigest()
+
+
+def _reflink(src, dst):
+    """
+    尝试使用 reflink（写时复制克隆，Btrfs/XFS 等支持）创建 dst
+
+    Returns:
+        是否成功
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+
+
+def link_file(src, dst, allow_copy=True):
+    """
+    让 dst 成为 src 的相同内容：优先硬链接，其次 reflink，最后（允许时）复制
+    先创建临时文件再替换，dst 已存在时也不会出现中间状态
+
+    Returns:
+        使用的方式 "hardlink" / "reflink" / "copy"，失败返回 None
+    """
+    tmp_path = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.hive-link.tmp')
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    try:
+        os.link(src, tmp_path)
+        method = "hardlink"
+    except OSError:
+        if _reflink(src, tmp_path):
+            method = "reflink"
+        elif allow_copy:
+            shutil.copy2(src, tmp_path)
+            method = "copy"
+        else:
+            return None
+    os.replace(tmp_path, dst)
+    return method
+
+
+class FileLock:
+    """
+    跨进程文件锁（POSIX 使用 flock，Windows 使用 msvcrt.locking）
+    flock 对每次打开的文件分别加锁，同一进程内不同线程之间也互斥；进程退出时操作系统自动释放，不会残留失效的锁
+
+    Args:
+        path: 锁文件路径，释放时删除
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @staticmethod
+    def _lock(f):
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def _unlock(f):
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def acquire(self):
+        """
+        尝试获取锁（不阻塞）
+
+        Returns:
+            是否获取成功
+        """
+        while True:
+            f = open(self.path, 'a+b')
+            try:
+                self._lock(f)
+            except OSError:
+                f.close()
+                return False
+            # 持有者释放锁时会删除锁文件：加锁前文件已被删除时锁住的是旧文件，需要重新打开
+            try:
+                if os.path.samestat(os.fstat(f.fileno()), os.stat(self.path)):
+                    self._file = f
+                    return True
+            except OSError:
+                pass
+            self._unlock(f)
+            f.close()
+
+    def release(self):
+        if self._file is None:
+            return
+        # 先删除再解锁，等待中的进程拿到锁后会发现文件已被替换而重新打开
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        try:
+            self._unlock(self._file)
+        except OSError:
+            pass
+        self._file.close()
+        self._file = None
+
+
+class ModelHashIndex:
+    """
+    models 目录的内容哈希索引
+    以相对路径为键记录文件大小、修改时间和 SHA-256，大小或修改时间变化的记录视为失效
+
+    Args:
+        models_dir: models 目录
+        buffers: 可选的缓冲区池（acquire()/release()），计算哈希时从中申请读缓冲区，
+            使下载过程中的哈希计算也受下载内存上限约束
+    """
+    def __init__(self, models_dir, buffers=None):
+        self.models_dir = os.path.abspath(models_dir)
+        self.index_path = os.path.join(self.models_dir, INDEX_NAME)
+        self.lock = threading.RLock()
+        self.buffers = buffers
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('files', {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.index_path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": 1, "files": self.entries}, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"[警告] 保存哈希索引失败 / [Warning] Failed to save hash index: {e}")
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.models_dir).replace(os.sep, '/')
+
+    def _valid_entry(self, key):
+        """返回仍然有效的索引记录（文件存在且大小、修改时间未变化）"""
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.models_dir, key))
+        except OSError:
+            return None
+        if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+            return None
+        return entry
+
+    def add(self, path, sha256, save=True):
+        """记录文件的 SHA-256（调用方已经计算过哈希，例如下载时边下载边计算）"""
+        stat = os.stat(path)
+        with self.lock:
+            self.entries[self._key(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+            if save:
+                self.save()
+
+    def hash_file(self, path):
+        """返回文件的 SHA-256，索引中有有效记录时直接使用，否则计算并记录"""
+        key = self._key(path)
+        with self.lock:
+            entry = self._valid_entry(key)
+            if entry:
+                return entry['sha256']
+        if self.buffers is None:
+            sha256 = sha256_file(path)
+        else:
+            buffer = self.buffers.acquire()
+            try:
+                sha256 = sha256_file(path, buffer)
+            finally:
+                self.buffers.release(buffer)
+        self.add(path, sha256, save=False)
+        return sha256
+
+    def find(self, sha256, exclude=None, size=None):
+        """
+        查找内容为指定 SHA-256 的本地文件
+        索引中没有时，如果给出了文件大小，再对 models 目录下大小完全相同、尚未索引的文件计算哈希
+        （索引只记录下载过或校验过的文件，手动放入 models 的模型需要这样才能找到）
+
+        Args:
+            sha256: 文件哈希
+            exclude: 排除的路径（通常是目标路径本身）
+            size: 文件大小，未知时只查找索引
+
+        Returns:
+            文件路径，找不到返回 None
+        """
+        exclude_key = self._key(exclude) if exclude else None
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry.get('sha256') != sha256 or key == exclude_key:
+                    continue
+                if self._valid_entry(key):
+                    return os.path.join(self.models_dir, *key.split('/'))
+        if not size or size < MIN_DEDUP_SIZE:
+            return None
+
+        found = None
+        hashed = False
+        for path, stat in iter_model_files(self.models_dir):
+            if stat.st_size != size:
+                continue
+            key = self._key(path)
+            with self.lock:
+                if key == exclude_key or self._valid_entry(key):
+                    # 有效记录已在上面检查过
+                    continue
+            print(f"计算哈希 / Hashing: {path}")
+            hashed = True
+            if self.hash_file(path) == sha256:
+                found = path
+                break
+        if hashed:
+            self.save()
+        return found
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_model_index(models_dir, buffers=None):
+    """
+    获取 models 目录的哈希索引（每个目录一个共享实例）
+
+    Args:
+        buffers: 计算哈希时使用的缓冲区池，见 ModelHashIndex
+    """
+    models_dir = os.path.abspath(models_dir)
+    with _indexes_lock:
+        if models_dir not in _indexes:
+            _indexes[models_dir] = ModelHashIndex(models_dir)
+        if buffers is not None:
+            _indexes[models_dir].buffers = buffers
+        return _indexes[models_dir]
+
+
+def iter_model_files(models_dir):
+    """
+    遍历 models 目录下的模型文件（跳过隐藏文件和目录、符号链接以及过小的文件）
+
+    Yields:
+        (路径, os.stat 结果)
+    """
+    for root, dirs, files in os.walk(models_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size >= MIN_DEDUP_SIZE:
+                yield path, stat
+
+
+def dedup_models(models_dir, dry_run=False):
+    """
+    把 models 目录下内容相同的文件合并为硬链接（或 reflink）
+    只对大小相同的文件计算哈希，已经是同一个文件（同一 inode）的不重复处理
+
+    Returns:
+        (合并的文件数, 节省的字节数)
+    """
+    index = get_model_index(models_dir)
+    by_size = {}
+    for path, stat in iter_model_files(models_dir):
+        by_size.setdefault(stat.st_size, []).append((path, stat))
+
+    merged = 0
+    saved = 0
+    for size, candidates in by_size.items():
+        # 同一 inode 的文件只保留一个代表
+        inodes = {}
+        for path, stat in candidates:
+            inodes.setdefault((stat.st_dev, stat.st_ino), path)
+        if len(inodes) < 2:
+            continue
+        by_hash = {}
+        for path in inodes.values():
+            print(f"计算哈希 / Hashing: {path}")
+            by_hash.setdefault(index.hash_file(path), []).append(path)
+        for sha256, paths in by_hash.items():
+            if len(paths) < 2:
+                continue
+            paths.sort(key=lambda p: os.stat(p).st_mtime_ns)
+            keep = paths[0]
+            for duplicate in paths[1:]:
+                if dry_run:
+                    method = "dry-run"
+                else:
+                    method = link_file(keep, duplicate, allow_copy=False)
+                    if method is None:
+                        print(f"[跳过] 无法创建链接（可能不在同一文件系统） / [Skip] Cannot link (different filesystem?): {duplicate}")
+                        continue
+                    index.add(duplicate, sha256, save=False)
+                merged += 1
+                saved += size
+                print(f"{method}: {duplicate} -> {keep}")
+    index.save()
+    return merged, saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hive 模型去重 / Hive model deduplication")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    dedup_parser = subparsers.add_parser("dedup", help="把重复的模型文件合并为硬链接 / merge duplicate model files into hardlinks")
+    dedup_parser.add_argument("models_dir", nargs="?", default=None)
+    dedup_parser.add_argument("--dry-run", action="store_true", help="只列出重复文件，不修改 / only list duplicates")
+    args = parser.parse_args(argv)
+
+    if args.models_dir:
+        models_dir = args.models_dir
+    else:
+        # 作为脚本运行时插件目录在 sys.path 中，可以直接导入
+        from hive_paths import comfy_paths
+        models_dir = comfy_paths.models_dir
+    if not models_dir or not os.path.isdir(models_dir):
+        print("错误: 未找到 models 目录 / Error: models directory not found")
+        return 1
+    merged, saved = dedup_models(models_dir, dry_run=args.dry_run)
+    print(f"✓ 合并重复文件 / Merged duplicates: {merged}, 节省空间 / Space saved: {saved / 1024 / 1024:.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+ZIP 节点包的流式、并行、增量解压
+下载的同时按本地文件头逐个解析已经完整到达的成员，交给线程池解压写入，不需要先把整个文件下载完；
+下载结束后以中央目录为准核对，并补充解压流式阶段无法处理的成员（使用数据描述符、ZIP64 或很大的成员）。
+磁盘上已有且大小和 CRC32 都一致的文件直接跳过，重新安装或更新 ZIP 节点包时几乎不产生写入。
+解压过程中被覆盖的文件先移到备份目录，下载或解压失败时删除新写入的文件并恢复备份，不会留下不完整的节点包
+"""
+import io
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# 归档内容在内存中保留的大小，超过后转存到临时文件（节点包通常远小于该大小）
+SPOOL_SIZE = 64 * 1024 * 1024
+
+# 流式阶段在内存中暂存的单个成员的最大压缩大小，更大的成员下载结束后从归档中解压
+MAX_STREAM_MEMBER = 32 * 1024 * 1024
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def member_path(base_dir, name):
+    """
+    成员解压到 base_dir 下的路径，去掉绝对路径、盘符和 . / .. 部分（与 zipfile.extract 的规则一致）
+
+    Returns:
+        路径，成员名为空时返回 None
+    """
+    arcname = name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    if not parts:
+        return None
+    return os.path.join(base_dir, *parts)
+
+
+def file_matches(path, size, crc):
+    """磁盘上的文件大小和 CRC32 是否与成员一致"""
+    try:
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return False
+        value = 0
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(COPY_BLOCK_SIZE)
+                if not data:
+                    break
+                value = zlib.crc32(data, value)
+        return value == crc
+    except OSError:
+        return False
+
+
+class ZipStreamExtractor:
+    """
+    边下载边解压 ZIP 文件
+
+    用法:
+        with ZipStreamExtractor(目标目录) as extractor:
+            for chunk in 下载数据:
+                extractor.feed(chunk)
+            names = extractor.finish()
+
+    finish() 成功之前退出（下载中断、解压出错）时撤销所有改动
+
+    Args:
+        base_dir: 解压目录
+        workers: 并行解压的线程数
+    """
+    def __init__(self, base_dir, workers=None):
+        self.base_dir = base_dir
+        # 不使用 SpooledTemporaryFile：Python 3.11 之前它没有 seekable()，zipfile 读取成员时会出错
+        self.archive = io.BytesIO()
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 4), thread_name_prefix="hive-unzip")
+        self.extracted = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._futures = []
+        # 本地文件头位置 -> (成员名, CRC32, 是否写入了文件)
+        self._handled = {}
+        # 尚未解析的数据，_buffer[0] 在归档中的位置为 _offset
+        self._buffer = bytearray()
+        self._offset = 0
+        self._skip = 0
+        self._streaming = True
+        # 撤销记录：写入过的文件 -> 备份路径（原来不存在时为 None），新建的目录
+        self._written = {}
+        self._created_dirs = []
+        self._backup_dir = None
+        self._committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._streaming = False
+        self.executor.shutdown(wait=True)
+        self.archive.close()
+        if self._committed:
+            self._discard_backups()
+        else:
+            self.rollback()
+
+    def _discard_backups(self):
+        if self._backup_dir:
+            shutil.rmtree(self._backup_dir, ignore_errors=True)
+            self._backup_dir = None
+
+    def rollback(self):
+        """删除新写入的文件和目录，恢复被覆盖的文件"""
+        for path, backup in self._written.items():
+            try:
+                if backup is None:
+                    if os.path.lexists(path):
+                        os.unlink(path)
+                else:
+                    os.replace(backup, path)
+            except OSError as e:
+                print(f"[警告] 无法恢复 / [Warning] Failed to restore {path}: {e}")
+        for directory in reversed(self._created_dirs):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        self._written.clear()
+        self._created_dirs.clear()
+        self._discard_backups()
+
+    def _prepare_path(self, path, directory=False):
+        """记录即将写入的文件或目录，已有的文件移到备份目录（调用时持有 _lock）"""
+        parent = path if directory else os.path.dirname(path)
+        missing = []
+        while parent and not os.path.isdir(parent):
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        os.makedirs(path if directory else os.path.dirname(path), exist_ok=True)
+        self._created_dirs.extend(reversed(missing))
+        if directory or path in self._written:
+            return
+        backup = None
+        if os.path.lexists(path):
+            if self._backup_dir is None:
+                # 与目标在同一目录下，备份和恢复都只是重命名；.disabled 后缀使 ComfyUI 不会加载它
+                self._backup_dir = tempfile.mkdtemp(prefix='.hive-unzip-', suffix='.disabled', dir=self.base_dir)
+            backup = os.path.join(self._backup_dir, str(len(self._written)))
+            os.replace(path, backup)
+        self._written[path] = backup
+
+    def feed(self, data):
+        """提供下一段下载数据，已经完整到达的成员立即交给线程池解压"""
+        if isinstance(self.archive, io.BytesIO) and self.archive.tell() + len(data) > SPOOL_SIZE:
+            # 超过内存上限，转存到临时文件
+            spool = tempfile.TemporaryFile()
+            spool.write(self.archive.getbuffer())
+            self.archive = spool
+        self.archive.write(data)
+        if not self._streaming:
+            return
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            self._offset += skipped
+            data = data[skipped:]
+        self._buffer += data
+        while self._streaming and not self._skip and self._parse_member():
+            pass
+
+    def _consume(self, length):
+        """丢弃接下来 length 字节（尚未到达的部分在 feed 中跳过）"""
+        consumed = min(length, len(self._buffer))
+        del self._buffer[:consumed]
+        self._offset += consumed
+        self._skip = length - consumed
+
+    def _parse_member(self):
+        """
+        解析缓冲区开头的一个成员
+
+        Returns:
+            是否解析了一个成员（数据不完整或流式阶段结束时返回 False）
+        """
+        buffer = self._buffer
+        if len(buffer) < LOCAL_HEADER.size:
+            return False
+        if buffer[:4] != LOCAL_HEADER_SIGNATURE:
+            # 已到达中央目录（或不是 ZIP 文件），剩下的交给 finish 处理
+            self._streaming = False
+            return False
+        (_, _, flags, method, _, _, crc, compressed_size, file_size,
+         name_length, extra_length) = LOCAL_HEADER.unpack_from(buffer)
+        if flags & 0x9 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) or 0xFFFFFFFF in (compressed_size, file_size):
+            # 加密、数据描述符（大小写在数据之后）、ZIP64 或其他压缩方式：无法确定数据边界，剩余成员按中央目录解压
+            self._streaming = False
+            return False
+        header_size = LOCAL_HEADER.size + name_length + extra_length
+        if compressed_size > MAX_STREAM_MEMBER:
+            self._consume(header_size + compressed_size)
+            return True
+        end = header_size + compressed_size
+        if len(buffer) < end:
+            return False
+        name = bytes(buffer[LOCAL_HEADER.size:LOCAL_HEADER.size + name_length]).decode('utf-8' if flags & 0x800 else 'cp437')
+        data = bytes(buffer[header_size:end])
+        offset = self._offset
+        self._consume(end)
+        self._futures.append(self.executor.submit(self._extract_streamed, offset, name, method, crc, file_size, data))
+        return True
+
+    def _write(self, name, crc, size, open_source):
+        """
+        把成员写到磁盘，内容相同的文件跳过
+
+        Args:
+            open_source: 返回成员解压后内容（可读文件对象）的函数
+
+        Returns:
+            是否写入了文件
+        """
+        path = member_path(self.base_dir, name)
+        if path is None:
+            return False
+        if name.endswith('/'):
+            with self._lock:
+                self._prepare_path(path, directory=True)
+            return False
+        if file_matches(path, size, crc):
+            with self._lock:
+                self.skipped += 1
+            return False
+        with self._lock:
+            self._prepare_path(path)
+        with open_source() as source, open(path, 'wb') as f:
+            shutil.copyfileobj(source, f, COPY_BLOCK_SIZE)
+        with self._lock:
+            self.extracted += 1
+        return True
+
+    def _extract_streamed(self, offset, name, method, crc, size, data):
+        def open_source():
+            try:
+                content = zlib.decompress(data, -15) if method == zipfile.ZIP_DEFLATED else data
+            except zlib.error as e:
+                raise zipfile.BadZipFile(f"Bad compressed data for file {name!r}: {e}")
+            if len(content) != size or zlib.crc32(content) != crc:
+                raise zipfile.BadZipFile(f"Bad CRC-32 for file {name!r}")
+            return io.BytesIO(content)
+
+        written = self._write(name, crc, size, open_source)
+        with self._lock:
+            self._handled[offset] = (name, crc, written)
+
+    def finish(self):
+        """
+        下载结束：等待流式解压完成，按中央目录核对并解压其余成员
+
+        Returns:
+            成员名列表
+
+        Raises:
+            zipfile.BadZipFile: 不是有效的 ZIP 文件或成员损坏
+        """
+        self._streaming = False
+        for future in self._futures:
+            future.result()
+        with zipfile.ZipFile(self.archive) as zf:
+            infos = zf.infolist()
+            listed = {info.header_offset for info in infos}
+            pending = [info for info in infos if self._handled.get(info.header_offset, (None, None))[:2] != (info.filename, info.CRC)]
+            # 本地文件头存在但中央目录中没有的条目（被替换的旧版本等）：删除写出的文件，
+            # 同名的正式成员重新核对（内容不同时会被重新写入）
+            paths = {member_path(self.base_dir, info.filename): info for info in infos}
+            for offset, (name, _, written) in self._handled.items():
+                if offset in listed or not written:
+                    continue
+                path = member_path(self.base_dir, name)
+                if path in paths:
+                    if paths[path] not in pending:
+                        pending.append(paths[path])
+                elif path and os.path.isfile(path):
+                    # 本任务写入的文件，撤销时按记录处理
+                    os.unlink(path)
+
+            futures = [
+                self.executor.submit(self._write, info.filename, info.CRC, info.file_size, lambda info=info: zf.open(info))
+                for info in pending
+            ]
+            for future in futures:
+                future.result()
+            # 同名的成员并行写入时顺序不确定，与 zipfile.extract 一样以最后一个为准
+            last = {}
+            for info in infos:
+                last[member_path(self.base_dir, info.filename)] = info
+            if len(last) < len(infos):
+                for info in last.values():
+                    self._write(info.filename, info.CRC, info.file_size, lambda info=info: zf.open(info))
+        self._committed = True
+        return [info.filename for info in infos]
@@ -2,13 +2,1315 @@ import os
 import sys
 import subprocess
 import zipfile
-import tempfile
+import shutil
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import json
+import hashlib
+import re
+import random
+import uuid
+import calendar
+from urllib.parse import urlsplit, parse_qs
+from contextlib import contextmanager
+from itertools import chain
+from .hive_store import get_model_index, link_file, FileLock
+from .hive_paths import comfy_paths
+from .hive_delta import BLOCK_INDEX_SUFFIX, validate_block_index, plan_delta, copy_range
+from .hive_formats import SNIFF_SIZE, ModelFormatError, check_prefix, validate_file
+from .hive_zip import ZipStreamExtractor
+
+HTTP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# 全局共享的 HTTP 连接池：下载器和安装器的所有请求共用，
+# keep-alive 连接在分片之间、多次下载之间复用，省去每个分片重新进行 TCP+TLS 握手
+_http_session = None
+_http_pool_size = 0
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_size=8):
+    """
+    获取全局共享的 HTTP Session
+    
+    Args:
+        pool_size: 需要的并发连接数（通常为下载线程数），连接池不足时自动扩容
+    
+    Returns:
+        requests.Session
+    """
+    global _http_session, _http_pool_size
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            _http_session.headers.update({'User-Agent': HTTP_USER_AGENT})
+        if pool_size > _http_pool_size:
+            # 连接池大小不小于线程数，且不阻塞等待空闲连接，避免线程之间争抢连接导致卡死
+            _http_pool_size = max(pool_size, 8)
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=_http_pool_size, pool_block=False)
+            replaced = {_http_session.adapters.get(prefix) for prefix in ('http://', 'https://')}
+            _http_session.mount('http://', adapter)
+            _http_session.mount('https://', adapter)
+            # 关闭被替换的连接池中空闲的 keep-alive 连接；正在进行的请求不受影响，结束后连接直接关闭
+            for old_adapter in replaced:
+                if old_adapter is not None:
+                    old_adapter.close()
+        return _http_session
+
+
+def _preallocate_file(path, size):
+    """
+    为目标文件一次性预分配空间，各线程直接按偏移写入，无需再合并分片
+    
+    Args:
+        path: 文件路径
+        size: 文件总大小（字节）
+    """
+    with open(path, 'wb') as f:
+        if size <= 0:
+            return
+        # Linux 上优先使用 fallocate 真正占用磁盘块，空间不足时可以在下载前就发现
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError as e:
+                # 部分文件系统（如某些网络文件系统）不支持 fallocate，回退到稀疏文件
+                import errno
+                if e.errno == errno.ENOSPC:
+                    raise
+        # 其他平台（Windows/macOS）使用稀疏文件
+        f.truncate(size)
+
+
+def _load_download_manifest(manifest_path, part_path, url, total_size, etag, last_modified):
+    """
+    读取断点续传清单，校验远程文件未发生变化
+    
+    Args:
+        manifest_path: 清单文件路径
+        part_path: 未完成的下载文件路径
+        url: 下载地址
+        total_size: 远程文件大小
+        etag: 远程文件 ETag
+        last_modified: 远程文件 Last-Modified
+    
+    Returns:
+        可续传的分片列表 [{"start", "end", "done"}]，无法续传时返回 None
+    """
+    if not os.path.exists(manifest_path) or not os.path.exists(part_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('url') != url or manifest.get('total_size') != total_size:
+            return None
+        if os.path.getsize(part_path) != total_size:
+            return None
+        # 没有 ETag/Last-Modified 时无法确认远程文件未变化，不续传
+        if not etag and not last_modified:
+            return None
+        if manifest.get('etag') != etag or manifest.get('last_modified') != last_modified:
+            print("远程文件已变化，重新下载 / Remote file has changed, restarting download")
+            return None
+        segments = manifest.get('segments') or []
+        # 分片必须连续覆盖整个文件
+        expected_start = 0
+        for seg in segments:
+            if seg['start'] != expected_start or not (0 <= seg['done'] <= seg['end'] - seg['start'] + 1):
+                return None
+            expected_start = seg['end'] + 1
+        if expected_start != total_size:
+            return None
+        return segments
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_download_manifest(manifest_path, manifest):
+    """
+    原子写入断点续传清单（先写临时文件再替换，避免进程中断时清单损坏）
+    """
+    tmp_path = manifest_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print(f"[警告] 保存续传清单失败 / [Warning] Failed to save resume manifest: {e}")
+
+
+def _read_download_progress(manifest_path):
+    """
+    读取续传清单中的下载进度（用于显示其他进程正在进行的下载）
+
+    Returns:
+        (已下载字节数, 文件大小)，清单不存在或无法读取时返回 None
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return sum(seg['done'] for seg in manifest['segments']), manifest['total_size']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _normalize_save_directory(save_directory):
+    """
+    检查保存目录必须在 models 目录之内（HTTP 接口传入的目录没有经过节点输入的下拉框校验）
+    
+    Args:
+        save_directory: 保存目录名称（models 下的相对路径）
+    
+    Returns:
+        统一为 / 分隔的相对路径
+    
+    Raises:
+        ValueError: 绝对路径、包含 .. 或超出 models 目录
+    """
+    directory = os.path.normpath(save_directory or ".")
+    models_dir = comfy_paths.models_dir
+    path = os.path.abspath(os.path.join(models_dir, directory))
+    if (os.path.isabs(directory) or os.path.splitdrive(directory)[0] or directory == os.pardir
+            or directory.startswith(os.pardir + os.sep) or os.path.commonpath([models_dir, path]) != models_dir):
+        raise ValueError(f"无效的保存目录 / Invalid save directory: {save_directory}")
+    return directory.replace(os.sep, "/")
+
+
+def _download_destination(url, save_directory):
+    """
+    下载的目标文件路径：models 目录下的保存目录 + 地址中的文件名
+    
+    Args:
+        url: 主下载地址
+        save_directory: 保存目录名称（models 下的子目录）
+    
+    Raises:
+        ValueError: 保存目录不在 models 目录之内
+    """
+    save_directory_path = os.path.abspath(os.path.join(comfy_paths.models_dir, _normalize_save_directory(save_directory)))
+    filename = os.path.basename(url.split('?')[0])  # 移除查询参数
+    if not filename or '.' not in filename:
+        # 如果无法从URL获取文件名，尝试从Content-Disposition获取
+        filename = "downloaded_model.bin"
+    return os.path.join(save_directory_path, filename)
+
+
+class _BufferPool:
+    """
+    可复用读缓冲区池，限制下载器的峰值内存
+    缓冲区按需创建，最多 count 个；全部被占用时，申请缓冲区的下载线程等待
+    """
+    def __init__(self, buffer_size, count):
+        self.buffer_size = buffer_size
+        self.count = count
+        self._free = []
+        self._allocated = 0
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        """缓冲区占用内存的上限（字节）"""
+        return self.buffer_size * self.count
+
+    def acquire(self, timeout=None):
+        """
+        申请一个缓冲区
+        
+        Returns:
+            bytearray，超时返回 None
+        """
+        with self._condition:
+            while not self._free and self._allocated >= self.count:
+                if not self._condition.wait(timeout):
+                    return None
+            if self._free:
+                return self._free.pop()
+            self._allocated += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        with self._condition:
+            self._free.append(buffer)
+            self._condition.notify()
+
+    @contextmanager
+    def borrow(self):
+        """申请一个缓冲区（阻塞等待），离开 with 时归还"""
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+# 下载读缓冲区：每个1MB（避免过大Buffer触发防火墙流量整形），所有下载任务共用
+# 总量由环境变量 HIVE_DOWNLOAD_MEMORY_MB 控制（默认64MB），缓冲区用完时下载线程等待；
+# 分片读取、哈希读回和单线程下载都使用这里的缓冲区，峰值内存不超过该上限
+# （服务器使用压缩传输时单线程下载需要解码，由 requests 分配数据块）
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+download_buffers = _BufferPool(DOWNLOAD_BUFFER_SIZE, max(1, int(os.environ.get('HIVE_DOWNLOAD_MEMORY_MB', 64))))
+
+
+def _is_retryable_error(error):
+    """
+    判断分片下载错误是否值得重试：网络中断、超时、5xx、429 等临时错误重试；
+    404/403 等客户端错误重试也不会成功，直接失败
+    """
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+
+class _Segment:
+    """文件中的一段字节范围 [start, end]，done 为从 start 开始已写入的字节数"""
+    __slots__ = ('start', 'end', 'done', 'reserved', 'active')
+
+    def __init__(self, start, end, done=0):
+        self.start = start
+        self.end = end
+        self.done = done
+        self.reserved = start + done  # 已分配给正在进行的写入的最远位置（不含）
+        self.active = False  # 是否有线程正在下载该分片
+
+    @property
+    def size(self):
+        return self.end - self.start + 1
+
+    @property
+    def finished(self):
+        return self.done >= self.size
+
+
+class _SegmentScheduler:
+    """
+    工作窃取式分片调度器
+    文件被切成许多小分片放入共享队列，空闲线程领取下一个分片；
+    队列为空时，把剩余最多的进行中分片的后半段拆出来交给空闲线程，
+    保证所有连接一直工作到最后一个字节，而不是等待最慢的那个连接
+    """
+    # 剩余不足该大小的分片不再拆分（拆分本身需要一次新的请求，过小不划算）
+    MIN_SPLIT_SIZE = 2 * 1024 * 1024
+
+    def __init__(self, segments):
+        self.lock = threading.Lock()
+        self.segments = sorted(segments, key=lambda seg: seg.start)
+        self.aborted = False
+
+    @classmethod
+    def split_evenly(cls, total_size, segment_size):
+        """按固定大小把文件切分为多个分片"""
+        segments = []
+        start = 0
+        while start < total_size:
+            end = min(start + segment_size, total_size) - 1
+            segments.append(_Segment(start, end))
+            start = end + 1
+        return cls(segments)
+
+    def next_segment(self):
+        """
+        领取下一个待下载的分片
+        
+        Returns:
+            _Segment，没有可领取的分片时返回 None
+        """
+        with self.lock:
+            if self.aborted:
+                return None
+            for seg in self.segments:
+                if not seg.active and not seg.finished:
+                    seg.active = True
+                    return seg
+            # 队列已空：拆分剩余最多的进行中分片
+            victim = None
+            victim_remaining = 0
+            for seg in self.segments:
+                if seg.active:
+                    remaining = seg.end + 1 - seg.reserved
+                    if remaining > victim_remaining:
+                        victim, victim_remaining = seg, remaining
+            if victim is None or victim_remaining < 2 * self.MIN_SPLIT_SIZE:
+                return None
+            split_at = victim.reserved + victim_remaining // 2
+            new_seg = _Segment(split_at, victim.end)
+            new_seg.active = True
+            victim.end = split_at - 1
+            self.segments.insert(self.segments.index(victim) + 1, new_seg)
+            return new_seg
+
+    def has_pending(self):
+        """是否还有可以分给新线程的工作（未领取的分片，或足够大可以拆分的进行中分片）"""
+        with self.lock:
+            for seg in self.segments:
+                if seg.finished:
+                    continue
+                if not seg.active or seg.end + 1 - seg.reserved >= 2 * self.MIN_SPLIT_SIZE:
+                    return True
+            return False
+
+    def reserve(self, seg, length):
+        """
+        为即将写入的数据占位，返回本次允许写入的字节数（分片可能已被拆分缩短）
+        """
+        with self.lock:
+            position = seg.start + seg.done
+            allowed = max(0, min(length, seg.end + 1 - position))
+            seg.reserved = position + allowed
+            return allowed
+
+    def commit(self, seg, length):
+        """
+        记录已写入磁盘的字节数
+        
+        Returns:
+            该分片是否已完成
+        """
+        with self.lock:
+            seg.done += length
+            seg.reserved = seg.start + seg.done
+            if seg.finished:
+                seg.active = False
+                return True
+            return False
+
+    def release(self, seg):
+        """放弃一个未完成的分片（已写入的部分保留），让它可以被重新领取"""
+        with self.lock:
+            seg.active = False
+            seg.reserved = seg.start + seg.done
+
+    def abort(self):
+        """停止调度，其余线程会在当前数据块写完后退出"""
+        with self.lock:
+            self.aborted = True
+
+    def downloaded(self):
+        with self.lock:
+            return sum(seg.done for seg in self.segments)
+
+    def contiguous_done(self):
+        """返回从文件开头起连续已写入的字节数"""
+        with self.lock:
+            total = 0
+            for seg in self.segments:
+                total += seg.done
+                if not seg.finished:
+                    break
+            return total
+
+    def snapshot(self):
+        """返回当前分片状态，用于保存续传清单"""
+        with self.lock:
+            return [{"start": seg.start, "end": seg.end, "done": seg.done} for seg in self.segments]
+
+    def progress_state(self):
+        """分片进度概况，用于推送进度事件（只列出进行中的分片，避免事件过大）"""
+        with self.lock:
+            return {
+                "total": len(self.segments),
+                "finished": sum(1 for seg in self.segments if seg.finished),
+                "active": [{"start": seg.start, "end": seg.end, "done": seg.done} for seg in self.segments if seg.active],
+            }
+
+    def active_status(self):
+        """返回进行中分片的进度描述，用于提示停滞"""
+        with self.lock:
+            return [
+                f"{seg.start // (1024 * 1024)}MB+:{seg.done / seg.size * 100:.0f}%({seg.done / 1024 / 1024:.1f}/{seg.size / 1024 / 1024:.1f}MB)"
+                for seg in self.segments if seg.active
+            ]
+
+
+# 自适应连接数的上下限，可通过环境变量调整（高速内网镜像可调大上限，限流严重的 CDN 可调小）
+MIN_DOWNLOAD_CONNECTIONS = max(1, int(os.environ.get('HIVE_DOWNLOAD_MIN_CONNECTIONS', 2)))
+MAX_DOWNLOAD_CONNECTIONS = max(MIN_DOWNLOAD_CONNECTIONS, int(os.environ.get('HIVE_DOWNLOAD_MAX_CONNECTIONS', 16)))
+
+
+class _ConnectionController:
+    """
+    按实测吞吐量调整下载连接数（AIMD：加性增、乘性减）
+    每个测量窗口结束时：期间出现错误（限流、断线）则连接数减半；
+    上次增加连接后吞吐量明显上升则继续加一个连接；没有明显上升（已到瓶颈）则撤回上次增加的连接，
+    并在一段时间内保持不变，之后再次试探
+    """
+    # 测量窗口（秒），太短时新连接还在 TCP 慢启动，测量不准
+    WINDOW = 3.0
+    # 吞吐量至少提高该比例才认为增加连接有效
+    GAIN_THRESHOLD = 1.05
+    # 到达瓶颈后保持不变的窗口数
+    HOLD_WINDOWS = 5
+
+    def __init__(self, initial, min_connections=MIN_DOWNLOAD_CONNECTIONS, max_connections=MAX_DOWNLOAD_CONNECTIONS):
+        self.lock = threading.Lock()
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.target = max(min_connections, min(max_connections, initial))
+        self.active = 0
+        self.peak = 0
+        self._retired = set()
+        self._errors = 0
+        self._window_start = None
+        self._window_bytes = 0
+        self._baseline = 0.0  # 上次增加连接前的吞吐量
+        self._probing = False  # 上个窗口是否刚增加了连接
+        self._hold = 0
+
+    def spawned(self):
+        """记录启动了一个下载线程"""
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def try_retire(self, worker_id):
+        """
+        下载线程在分片之间（或出错后）调用：连接数超过目标时让该线程退出
+
+        Returns:
+            该线程是否应退出
+        """
+        with self.lock:
+            if self.active > self.target and self.active > self.min_connections:
+                self.active -= 1
+                self._retired.add(worker_id)
+                return True
+            return False
+
+    def exited(self, worker_id):
+        """下载线程退出"""
+        with self.lock:
+            if worker_id in self._retired:
+                self._retired.discard(worker_id)
+            else:
+                self.active -= 1
+
+    def record_error(self):
+        """记录一次分片错误（限流、断线等），下个窗口结束时减少连接"""
+        with self.lock:
+            self._errors += 1
+
+    def update(self, downloaded, now=None):
+        """
+        进度循环中定期调用，窗口结束时调整目标连接数
+
+        Args:
+            downloaded: 当前已下载的总字节数
+
+        Returns:
+            需要新启动的下载线程数
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            if self._window_start is None:
+                self._window_start = now
+                self._window_bytes = downloaded
+            elif now - self._window_start >= self.WINDOW:
+                throughput = (downloaded - self._window_bytes) / (now - self._window_start)
+                old_target = self.target
+                if self._errors:
+                    # 乘性减：出现错误说明连接过多（或服务器限流）
+                    self.target = max(self.min_connections, self.target // 2)
+                    self._probing = False
+                    self._hold = self.HOLD_WINDOWS
+                elif self._probing and throughput < self._baseline * self.GAIN_THRESHOLD:
+                    # 增加连接没有带来明显提升，撤回并保持一段时间
+                    self.target = max(self.min_connections, self.target - 1)
+                    self._probing = False
+                    self._hold = self.HOLD_WINDOWS
+                elif self._hold > 0:
+                    self._hold -= 1
+                elif self.target < self.max_connections and self.active >= self.target:
+                    # 加性增：试探再加一个连接
+                    self._baseline = throughput
+                    self.target += 1
+                    self._probing = True
+                else:
+                    self._probing = False
+                if self.target != old_target:
+                    print(f"\n连接数调整 / Connections adjusted: {old_target} -> {self.target} ({throughput / 1024 / 1024:.2f} MB/s{', 出现错误 / errors: ' + str(self._errors) if self._errors else ''})")
+                self._errors = 0
+                self._window_start = now
+                self._window_bytes = downloaded
+            return max(0, self.target - self.active)
+
+
+def _split_urls(value):
+    """把输入拆分为多个下载地址（换行或空格分隔，地址本身不含空白字符），去掉重复的地址"""
+    urls = []
+    for item in value.split():
+        if item not in urls:
+            urls.append(item)
+    return urls
+
+
+class _MirrorMismatch(Exception):
+    """镜像返回的文件与其他镜像不一致（大小、ETag 或 Range 响应异常）"""
+
+
+def _signed_url_expiry(url):
+    """
+    从签名地址的查询参数中解析过期时间
+    支持 Expires=<Unix 时间>（CloudFront、HuggingFace CDN）、X-Amz-Date + X-Amz-Expires（S3）和 X-Goog-Date + X-Goog-Expires（GCS）
+
+    Returns:
+        过期时间（Unix 时间戳），不是签名地址或无法解析时返回 None
+    """
+    query = {key.lower(): values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+    try:
+        if 'expires' in query:
+            return int(query['expires'])
+        for prefix in ('x-amz-', 'x-goog-'):
+            if prefix + 'date' in query and prefix + 'expires' in query:
+                signed_at = calendar.timegm(time.strptime(query[prefix + 'date'], '%Y%m%dT%H%M%SZ'))
+                return signed_at + int(query[prefix + 'expires'])
+    except ValueError:
+        pass
+    return None
+
+
+class _Mirror:
+    """
+    一个下载地址（镜像）及其实测速度
+    HuggingFace、civitai 等地址会跳转到带签名的 CDN 地址：跳转后的最终地址缓存起来供所有分片和重试使用，
+    不必每个请求都重新跳转；签名过期或被拒绝（401/403/410）时才从原始地址重新获取
+    """
+    # 连续失败达到该次数后放弃该镜像（还有其他镜像可用时）
+    MAX_FAILURES = 3
+    # 签名地址在过期前这么多秒就不再使用，避免请求发出时刚好过期
+    EXPIRY_MARGIN = 60
+
+    def __init__(self, url, etag=None, resolved_url=None):
+        self.url = url
+        self.etag = etag
+        self.speed = None  # 实测速度（字节/秒，指数滑动平均）
+        self.downloaded = 0
+        self.failures = 0
+        self.dropped = False
+        self._resolved = None  # (最终地址, 过期时间)，一起替换，多个线程读取时不会读到不一致的值
+        self.refreshes = 0  # 签名地址失效后重新获取的次数
+        if resolved_url:
+            self.set_resolved(resolved_url)
+
+    @property
+    def host(self):
+        return self.url.split('/')[2] if '://' in self.url else self.url
+
+    def set_resolved(self, resolved_url):
+        """记录跳转后的最终地址"""
+        if resolved_url and resolved_url != self.url:
+            self._resolved = (resolved_url, _signed_url_expiry(resolved_url))
+
+    def request_url(self):
+        """请求使用的地址：缓存的最终地址仍然有效时使用它，否则使用原始地址（重新跳转）"""
+        resolved = self._resolved
+        if resolved is None:
+            return self.url
+        resolved_url, expires_at = resolved
+        if expires_at is not None and time.time() >= expires_at - self.EXPIRY_MARGIN:
+            self.expire(resolved_url)
+            return self.url
+        return resolved_url
+
+    def expire(self, resolved_url):
+        """缓存的最终地址已失效（其他线程已经替换过时不重复处理）"""
+        if self._resolved is not None and self._resolved[0] == resolved_url:
+            self._resolved = None
+            self.refreshes += 1
+
+
+def _get_resolved(session, mirror, **kwargs):
+    """
+    通过镜像缓存的最终地址发送 GET 请求；签名地址被拒绝时从原始地址重新跳转一次，并缓存新的最终地址
+
+    Returns:
+        requests.Response（调用方负责关闭）
+    """
+    request_url = mirror.request_url()
+    response = session.get(request_url, **kwargs)
+    if response.status_code in (401, 403, 410) and request_url != mirror.url:
+        response.close()
+        mirror.expire(request_url)
+        response = session.get(mirror.url, **kwargs)
+    if response.history and response.ok:
+        mirror.set_resolved(response.url)
+    return response
+
+
+class _MirrorSet:
+    """
+    同一文件的多个镜像
+    每个分片请求按镜像的实测速度加权随机选择镜像，多个镜像同时下载不同的字节范围；
+    出错或文件不一致的镜像被自动放弃，剩余的镜像继续下载
+    """
+    def __init__(self, mirrors):
+        self.lock = threading.Lock()
+        self.mirrors = mirrors
+
+    def available(self):
+        with self.lock:
+            return [mirror for mirror in self.mirrors if not mirror.dropped]
+
+    def pick(self):
+        """
+        按实测速度加权选择一个镜像，还没有测速的镜像按当前最快的速度对待（保证每个镜像都会被尝试）
+
+        Returns:
+            _Mirror
+        """
+        with self.lock:
+            candidates = [mirror for mirror in self.mirrors if not mirror.dropped]
+            if len(candidates) == 1:
+                return candidates[0]
+            fastest = max([mirror.speed for mirror in candidates if mirror.speed] or [1.0])
+            weights = [mirror.speed or fastest for mirror in candidates]
+            return random.choices(candidates, weights=weights)[0]
+
+    def record(self, mirror, length, elapsed):
+        """记录一次请求下载的字节数和耗时，更新镜像速度"""
+        with self.lock:
+            mirror.downloaded += length
+            if length and elapsed > 0:
+                mirror.failures = 0
+                speed = length / elapsed
+                mirror.speed = speed if mirror.speed is None else mirror.speed * 0.7 + speed * 0.3
+
+    def fail(self, mirror, error):
+        """
+        记录镜像出错；文件不一致、不可重试的错误或连续失败过多时放弃该镜像（至少保留一个）
+
+        Returns:
+            是否放弃了该镜像（此时分片可以立即换到其他镜像重试）
+        """
+        with self.lock:
+            mirror.failures += 1
+            if mirror.dropped:
+                return True
+            fatal = isinstance(error, _MirrorMismatch) or not _is_retryable_error(error)
+            if not fatal and mirror.failures < _Mirror.MAX_FAILURES:
+                return False
+            if sum(1 for m in self.mirrors if not m.dropped) <= 1:
+                return False
+            mirror.dropped = True
+        print(f"\n[镜像] 放弃镜像 / [Mirror] Dropped mirror {mirror.host}: {str(error)}")
+        return True
+
+    def summary(self):
+        """各镜像的下载量和速度"""
+        with self.lock:
+            return ", ".join(
+                f"{mirror.host} {mirror.downloaded / 1024 / 1024:.1f}MB"
+                + (f" ({mirror.speed / 1024 / 1024:.2f}MB/s)" if mirror.speed else "")
+                + (" ✗" if mirror.dropped else "")
+                for mirror in self.mirrors
+            )
+
+
+def _range_probe(url):
+    """
+    用 Range: bytes=0-0 的 GET 请求代替 HEAD 获取文件信息
+    响应头按 HEAD 的含义改写：content-length 为文件总大小，返回 206 时说明支持 Range
+
+    Returns:
+        requests.Response（已关闭，只使用响应头）
+    """
+    headers = {'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'}
+    with get_http_session().get(url, headers=headers, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.headers.get('content-range', ''))
+        if response.status_code == 206 and match:
+            response.headers['content-length'] = match.group(1)
+            response.headers['accept-ranges'] = 'bytes'
+        else:
+            # 服务器忽略了 Range（返回整个文件），content-length 即为文件大小，但不能分片下载
+            response.headers.pop('accept-ranges', None)
+    return response
+
+
+def _probe_mirrors(urls):
+    """
+    并行请求所有镜像的文件信息
+
+    Returns:
+        [(url, head_response 或 None, 异常 或 None)]，顺序与 urls 一致
+    """
+    def probe(mirror_url):
+        try:
+            response = get_http_session().head(mirror_url, allow_redirects=True, timeout=30)
+            response.raise_for_status()
+            return mirror_url, response, None
+        except requests.exceptions.HTTPError:
+            # 有些签名地址（例如只对 GET 签名的 S3 地址）拒绝 HEAD 请求，改用只请求第一个字节的 GET
+            pass
+        except requests.exceptions.RequestException as e:
+            return mirror_url, None, e
+        try:
+            return mirror_url, _range_probe(mirror_url), None
+        except requests.exceptions.RequestException as e:
+            return mirror_url, None, e
+
+    if len(urls) == 1:
+        return [probe(urls[0])]
+    with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+        return list(executor.map(probe, urls))
+
+
+def _file_identity(path):
+    """
+    文件的 (inode, 修改时间)，用于判断文件是否被替换或修改
+    
+    Returns:
+        文件不存在时返回 None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class _StreamingHasher:
+    """
+    边下载边计算 SHA-256
+    SHA-256 只能按顺序计算，无法合并各分片的哈希：处于哈希位置的数据直接用下载缓冲区计算；
+    乱序到达的分片在哈希位置推进到它们时，从刚写入的文件（通常仍在系统页缓存中）读回计算，
+    与下载同时进行，下载结束时哈希也基本完成，不需要再完整读一遍文件
+    """
+    def __init__(self, path):
+        self.path = path
+        self.position = 0
+        self._sha256 = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def feed(self, offset, data):
+        """提供刚写入 offset 处的数据，如果正好接在哈希位置之后就直接计算"""
+        with self._lock:
+            end = offset + len(data)
+            if offset <= self.position < end:
+                self._sha256.update(data[self.position - offset:])
+                self.position = end
+
+    def catch_up(self, available, timeout=None):
+        """
+        从文件读回 [position, available) 区间的数据计算哈希，读缓冲区从共享缓冲区池申请
+        
+        Args:
+            available: 从文件开头起连续已写入的字节数
+            timeout: 等待缓冲区的时间；缓冲区被下载线程占满时放弃本次计算（None 表示一直等待）
+        """
+        if available <= self.position:
+            return
+        buffer = download_buffers.acquire(timeout)
+        if buffer is None:
+            return
+        try:
+            view = memoryview(buffer)
+            with open(self.path, 'rb', buffering=0) as f:
+                while True:
+                    with self._lock:
+                        if self.position >= available:
+                            return
+                        # 分块读取，每块都持锁，避免与下载线程的 feed 交错
+                        f.seek(self.position)
+                        length = f.readinto(view[:min(len(view), available - self.position)])
+                        if not length:
+                            return
+                        self._sha256.update(view[:length])
+                        self.position += length
+        finally:
+            download_buffers.release(buffer)
+
+    def hexdigest(self):
+        with self._lock:
+            return self._sha256.hexdigest()
+
+
+def _normalize_sha256(value):
+    """从字符串中提取 64 位十六进制 SHA-256（兼容带引号的 ETag 和 sha256sum 输出格式），无效时返回 None"""
+    if not value:
+        return None
+    match = re.search(r'\b([0-9a-fA-F]{64})\b', value)
+    return match.group(1).lower() if match else None
+
+
+def _linked_sha256(head_response):
+    """HuggingFace 在跳转到 CDN 前的响应中通过 X-Linked-Etag 提供的 LFS 文件 SHA-256，没有时返回 None"""
+    for response in list(head_response.history) + [head_response]:
+        sha256 = _normalize_sha256(response.headers.get('x-linked-etag'))
+        if sha256:
+            return sha256
+    return None
+
+
+def _find_remote_sha256(url, head_response):
+    """
+    获取远程文件的 SHA-256
+    1. HuggingFace 在跳转到 CDN 前的响应中通过 X-Linked-Etag 提供 LFS 文件的 SHA-256
+    2. 同目录下的 .sha256 附属文件
+    
+    Returns:
+        SHA-256 十六进制字符串，找不到时返回 None
+    """
+    sha256 = _linked_sha256(head_response)
+    if sha256:
+        return sha256
+    try:
+        sidecar_url = url.split('?')[0] + '.sha256'
+        with get_http_session().get(sidecar_url, timeout=(10, 10), stream=True) as response:
+            if response.status_code == 200 and int(response.headers.get('content-length') or 0) < 4096:
+                return _normalize_sha256(response.raw.read(4096).decode('utf-8', 'ignore'))
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+    return None
+
+
+def _sniff_remote(mirror, filename, total_size):
+    """
+    下载开始前读取远程文件开头的字节，检查内容确实是对应格式的模型文件（而不是登录页或错误信息），
+    safetensors 文件还会读取完整头部，检查记录的数据长度与文件大小一致
+    
+    Raises:
+        ModelFormatError: 内容不是有效的模型文件
+    """
+    length = min(SNIFF_SIZE, total_size)
+    while length > 0:
+        headers = {'Range': f'bytes=0-{length - 1}', 'Accept-Encoding': 'identity'}
+        try:
+            with _get_resolved(get_http_session(), mirror, headers=headers, stream=True, timeout=(30, 60)) as response:
+                response.raise_for_status()
+                prefix = response.raw.read(length)
+        except requests.exceptions.RequestException as e:
+            # 检查请求本身失败时不影响下载，由下载过程重试和报告错误
+            print(f"[警告] 无法预先检查文件内容 / [Warning] Could not check the file content before downloading: {e}")
+            return
+        needed = check_prefix(prefix, filename, total_size)
+        if needed <= len(prefix) or len(prefix) < length:
+            return
+        length = min(needed, total_size)
+
+
+def _fetch_block_index(url, total_size):
+    """
+    获取远程文件的块校验索引（同目录下的 .blocks.json 附属文件，由 hive_delta.py 生成）
+    
+    Returns:
+        块校验索引，不存在或与远程文件不一致时返回 None
+    """
+    try:
+        index_url = url.split('?')[0] + BLOCK_INDEX_SUFFIX
+        with get_http_session().get(index_url, timeout=(10, 60)) as response:
+            if response.status_code != 200:
+                return None
+            index = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    return index if validate_block_index(index, total_size) else None
+
+
+def _prepare_delta(plan, seed_path, part_path, total_size, segment_size):
+    """
+    按增量计划准备下载文件：预分配后把可复用的块从旧文件复制到对应位置，需要下载的连续范围合并后再按分片大小切分
+    
+    Args:
+        plan: hive_delta.plan_delta 的结果 [(start, length, 旧文件偏移 或 None)]
+        seed_path: 本地旧版本文件
+        part_path: 未完成的下载文件
+        total_size: 远程文件大小
+        segment_size: 下载分片大小
+    
+    Returns:
+        (_SegmentScheduler, 复用的字节数)
+    """
+    # 合并连续的范围：相邻的待下载块，以及在旧文件中也相邻的复用块
+    runs = []
+    for start, length, local_offset in plan:
+        if runs:
+            last = runs[-1]
+            if local_offset is None and last[2] is None:
+                last[1] += length
+                continue
+            if local_offset is not None and last[2] is not None and last[2] + last[1] == local_offset:
+                last[1] += length
+                continue
+        runs.append([start, length, local_offset])
+    
+    _preallocate_file(part_path, total_size)
+    segments = []
+    reused = 0
+    with open(seed_path, 'rb') as src, open(part_path, 'r+b') as dst:
+        for start, length, local_offset in runs:
+            if local_offset is not None:
+                copy_range(src, dst, local_offset, start, length)
+                segments.append(_Segment(start, start + length - 1, length))
+                reused += length
+            else:
+                # 连续的待下载范围切分为多个分片，由多个连接并行下载
+                for seg_start in range(start, start + length, segment_size):
+                    segments.append(_Segment(seg_start, min(seg_start + segment_size, start + length) - 1))
+    return _SegmentScheduler(segments), reused
+
+
+def _prompt_server():
+    """ComfyUI 的 PromptServer 实例，不在 ComfyUI 中运行时返回 None"""
+    try:
+        from server import PromptServer
+        return PromptServer.instance
+    except:
+        return None
+
+
+class _ProgressPublisher:
+    """
+    通过 ComfyUI 的 websocket 推送下载进度事件
+    同一任务的事件合并发送：两次发送至少间隔 interval 秒，期间的更新只保留最新一次，
+    超大文件下载也不会刷屏；状态变化（开始、完成、失败等）立即发送
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._last_sent = {}
+
+    def publish(self, event, key, payload, force=False):
+        """
+        发送事件
+        
+        Args:
+            event: 事件名称
+            key: 合并发送的键（任务 ID / 批次 ID）
+            payload: 事件数据，或返回事件数据的函数（只在真正发送时调用）
+            force: 是否忽略发送间隔立即发送
+        """
+        now = time.time()
+        with self.lock:
+            if not force and now - self._last_sent.get((event, key), 0) < self.interval:
+                return False
+            self._last_sent[(event, key)] = now
+        server = _prompt_server()
+        if server is None:
+            return False
+        try:
+            server.send_sync(event, payload() if callable(payload) else payload)
+        except Exception as e:
+            print(f"[警告] 推送进度事件失败 / [Warning] Failed to push progress event: {e}")
+            return False
+        return True
+
+    def forget(self, key):
+        """任务结束后清除合并状态"""
+        with self.lock:
+            for event_key in [k for k in self._last_sent if k[1] == key]:
+                del self._last_sent[event_key]
+
+
+progress_events = _ProgressPublisher()
+
+
+# 下载耗时记录（JSONL，每次下载一行），可通过环境变量 HIVE_TELEMETRY_LOG 指定路径，设为 off 关闭
+TELEMETRY_LOG_PATH = os.environ.get('HIVE_TELEMETRY_LOG') or os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "download_telemetry.jsonl")
+# 日志超过该大小（MB）时轮转为 .1 文件（只保留一个旧文件）
+TELEMETRY_LOG_MAX_BYTES = max(1, int(os.environ.get('HIVE_TELEMETRY_LOG_MAX_MB', 10))) * 1024 * 1024
+# 每条记录默认只包含分片统计和最慢的几个分片；设为 1 时记录每个分片请求（大文件会有上千条）
+TELEMETRY_SEGMENT_DETAIL = os.environ.get('HIVE_TELEMETRY_SEGMENTS', '0') == '1'
+
+# 进度停滞超过该时间（秒）记为一次停滞
+STALL_THRESHOLD = 5
+
+
+class _DownloadMetrics:
+    """
+    进程内的下载指标汇总，以 Prometheus 文本格式导出（GET /hive/metrics）
+    """
+    # 耗时直方图的分桶（秒）
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+    HELP = {
+        "hive_downloads_total": ("counter", "Finished downloads by result"),
+        "hive_download_bytes_total": ("counter", "Bytes downloaded"),
+        "hive_download_seconds_total": ("counter", "Wall time spent downloading"),
+        "hive_download_segment_requests_total": ("counter", "Segment requests by mirror and outcome"),
+        "hive_download_segment_retries_total": ("counter", "Segment retries"),
+        "hive_download_stall_seconds_total": ("counter", "Time with no download progress"),
+        "hive_download_last_throughput_bytes_per_second": ("gauge", "Throughput of the most recent completed download"),
+        "hive_download_probe_seconds": ("histogram", "HEAD/probe time including redirects"),
+        "hive_download_segment_ttfb_seconds": ("histogram", "Segment time to first byte (response headers)"),
+        "hive_download_finalize_seconds": ("histogram", "Time to verify and move the finished file into place"),
+        "hive_download_duration_seconds": ("histogram", "Total download time"),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [0] * len(self.BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    def _escape(value):
+        """转义标签值中的反斜杠、引号和换行"""
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self):
+        """Prometheus 文本格式"""
+        def format_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{self._escape(v)}"' for k, v in items) + "}"
+
+        lines = []
+        with self.lock:
+            for name, (metric_type, help_text) in self.HELP.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                if metric_type == "histogram":
+                    for (key_name, labels), histogram in self.histograms.items():
+                        if key_name != name:
+                            continue
+                        for bound, count in zip(self.BUCKETS, histogram):
+                            lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {histogram[-2]}")
+                        lines.append(f"{name}_count{format_labels(labels)} {histogram[-1]}")
+                else:
+                    for (key_name, labels), value in self.values.items():
+                        if key_name == name:
+                            lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+download_metrics = _DownloadMetrics()
+
+
+class _DownloadTelemetry:
+    """
+    一次下载的分阶段耗时记录：探测、校验值获取、预分配、传输、收尾（校验和重命名），
+    分片请求的统计（次数、失败、首字节时间、速度）和最慢的分片、重试和停滞区间；
+    下载结束时追加到 JSONL 日志并汇总到 download_metrics
+    """
+    # 开启 HIVE_TELEMETRY_SEGMENTS 时单次下载最多记录的分片请求数
+    MAX_SEGMENT_RECORDS = 2000
+    # 记录的最慢分片数和停滞区间数
+    SLOWEST_SEGMENTS = 10
+    MAX_STALL_RECORDS = 100
+
+    def __init__(self, url, save_directory):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.record = {
+            "url": url,
+            "save_directory": save_directory,
+            "started_at": self.started_at,
+            "phases": {},
+            "segment_requests": 0,
+            "segment_errors": 0,
+            "stalls": [],
+            "retries": 0,
+        }
+        if TELEMETRY_SEGMENT_DETAIL:
+            self.record["segments"] = []
+        # 分片统计：成功请求的首字节时间，最慢的分片（按速度保留 SLOWEST_SEGMENTS 个）
+        self._ttfbs = []
+        self._slowest = []
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个阶段的耗时（同名阶段累加）"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.time() - start)
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.record["phases"][name] = self.record["phases"].get(name, 0) + seconds
+
+    def set(self, **fields):
+        with self.lock:
+            self.record.update(fields)
+
+    def segment(self, mirror_host, start, length, ttfb, seconds, error=None):
+        """记录一次分片请求"""
+        entry = {
+            "mirror": mirror_host,
+            "start": start,
+            "bytes": length,
+            "ttfb": round(ttfb, 4) if ttfb is not None else None,
+            "seconds": round(seconds, 4),
+            "mb_s": round(length / seconds / 1024 / 1024, 2) if seconds > 0 else None,
+            "error": error,
+        }
+        with self.lock:
+            self.record["segment_requests"] += 1
+            if error:
+                self.record["segment_errors"] += 1
+            if ttfb is not None:
+                self._ttfbs.append(ttfb)
+            if not error and entry["mb_s"] is not None:
+                self._slowest.append(entry)
+                if len(self._slowest) > self.SLOWEST_SEGMENTS * 2:
+                    self._slowest.sort(key=lambda item: item["mb_s"])
+                    del self._slowest[self.SLOWEST_SEGMENTS:]
+            if TELEMETRY_SEGMENT_DETAIL and len(self.record["segments"]) < self.MAX_SEGMENT_RECORDS:
+                self.record["segments"].append(entry)
+        download_metrics.inc("hive_download_segment_requests_total", mirror=mirror_host, outcome="error" if error else "ok")
+        if ttfb is not None:
+            download_metrics.observe("hive_download_segment_ttfb_seconds", ttfb)
+
+    def stall(self, started, duration):
+        """记录一段没有进度的区间"""
+        with self.lock:
+            if len(self.record["stalls"]) < self.MAX_STALL_RECORDS:
+                self.record["stalls"].append({"at": round(started - self.started_at, 2), "seconds": round(duration, 2)})
+        download_metrics.inc("hive_download_stall_seconds_total", duration)
+
+    def finish(self, result, downloaded):
+        """
+        下载结束：计算总耗时和平均速度，写入 JSONL 日志并更新指标
+        
+        Args:
+            result: completed / linked / skipped / paused / cancelled / failed
+            downloaded: 本次实际下载的字节数
+        """
+        seconds = time.time() - self.started_at
+        with self.lock:
+            self.record.update({
+                "result": result,
+                "seconds": round(seconds, 3),
+                "bytes": downloaded,
+                "mb_s": round(downloaded / seconds / 1024 / 1024, 2) if seconds > 0 else None,
+            })
+            self.record["phases"] = {name: round(value, 4) for name, value in self.record["phases"].items()}
+            if self._ttfbs:
+                ttfbs = sorted(self._ttfbs)
+                self.record["segment_ttfb"] = {
+                    "p50": round(ttfbs[len(ttfbs) // 2], 4),
+                    "p90": round(ttfbs[min(len(ttfbs) - 1, len(ttfbs) * 9 // 10)], 4),
+                    "max": round(ttfbs[-1], 4),
+                }
+            self.record["slowest_segments"] = sorted(self._slowest, key=lambda item: item["mb_s"])[:self.SLOWEST_SEGMENTS]
+            line = json.dumps(self.record, ensure_ascii=False)
+            phases = dict(self.record["phases"])
+            retries = self.record["retries"]
+
+        download_metrics.inc("hive_downloads_total", result=result)
+        download_metrics.inc("hive_download_bytes_total", downloaded)
+        download_metrics.inc("hive_download_seconds_total", seconds)
+        download_metrics.inc("hive_download_segment_retries_total", retries)
+        download_metrics.observe("hive_download_duration_seconds", seconds, result=result)
+        if "probe" in phases:
+            download_metrics.observe("hive_download_probe_seconds", phases["probe"])
+        if "finalize" in phases:
+            download_metrics.observe("hive_download_finalize_seconds", phases["finalize"])
+        if result == "completed" and seconds > 0 and downloaded:
+            download_metrics.set("hive_download_last_throughput_bytes_per_second", downloaded / seconds)
+
+        if TELEMETRY_LOG_PATH.lower() == "off":
+            return
+        try:
+            os.makedirs(os.path.dirname(TELEMETRY_LOG_PATH), exist_ok=True)
+            with _telemetry_log_lock:
+                try:
+                    if os.path.getsize(TELEMETRY_LOG_PATH) + len(line) >= TELEMETRY_LOG_MAX_BYTES:
+                        os.replace(TELEMETRY_LOG_PATH, TELEMETRY_LOG_PATH + ".1")
+                except FileNotFoundError:
+                    pass
+                with open(TELEMETRY_LOG_PATH, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"[警告] 写入下载耗时记录失败 / [Warning] Failed to write download telemetry: {e}")
+
+
+_telemetry_log_lock = threading.Lock()
+
+
+class DownloadStopped(Exception):
+    """下载被暂停或取消"""
+
+
+class DownloadControl:
+    """
+    后台下载任务与下载过程之间的控制对象
+    任务管理器通过它请求暂停/取消，下载过程通过它上报进度
+    """
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.discard = False  # 停止后是否删除已下载的部分（取消时删除，暂停时保留以便续传）
+        self.completed = False
+        self.downloaded = 0
+        self.total_size = 0
+        self.partial_files = []  # 未完成下载留下的续传文件，取消已暂停的任务时删除
+        self.sha256 = None  # 下载完成后文件的 SHA-256
+        self.speed = None  # 下载速度（字节/秒，指数滑动平均）
+        self.eta = None  # 预计剩余时间（秒）
+        self.segments = None  # 分片状态 {"total", "finished", "active": [...]}
+        self.on_progress = None  # 进度更新回调（任务管理器用来推送进度事件）
+        self._wakeup = threading.Event()
+        self._speed_sample = None
+
+    def stop(self, discard=False):
+        self.discard = discard
+        self.stop_event.set()
+        self.notify()
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def notify(self):
+        """唤醒等待中的下载主线程（分片完成、线程退出、暂停/取消时调用）"""
+        self._wakeup.set()
+
+    def wait(self, timeout):
+        """
+        阻塞等待事件（分片完成、线程退出、暂停/取消），最多等待 timeout 秒
+        
+        Returns:
+            是否被事件唤醒
+        """
+        woken = self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return woken
+
+    def report(self, downloaded, segments=None):
+        """上报下载进度，计算速度和剩余时间，并通知任务管理器（由其合并后推送给前端）"""
+        now = time.time()
+        self.downloaded = downloaded
+        if segments is not None:
+            self.segments = segments
+        if self._speed_sample is None:
+            self._speed_sample = (now, downloaded)
+        elif now - self._speed_sample[0] >= 0.5:
+            sample_time, sample_bytes = self._speed_sample
+            speed = max(0, downloaded - sample_bytes) / (now - sample_time)
+            self.speed = speed if self.speed is None else self.speed * 0.7 + speed * 0.3
+            self._speed_sample = (now, downloaded)
+        if self.speed and self.total_size:
+            self.eta = max(0, self.total_size - downloaded) / self.speed
+        if self.on_progress:
+            self.on_progress()
+
 
 # ComfyUI 节点基类
 class HiveModelDownloader:
@@ -18,44 +1320,17 @@ class HiveModelDownloader:
     """
     @classmethod
     def INPUT_TYPES(cls):
-        # 获取 models 目录的子目录列表
-        def get_models_subdirs():
-            try:
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                comfyui_root = None
-                check_dir = current_dir
-                for _ in range(5):
-                    if os.path.exists(os.path.join(check_dir, "models")):
-                        comfyui_root = check_dir
-                        break
-                    parent = os.path.dirname(check_dir)
-                    if parent == check_dir:
-                        break
-                    check_dir = parent
-                
-                if comfyui_root:
-                    models_dir = os.path.join(comfyui_root, "models")
-                    if os.path.exists(models_dir):
-                        subdirs = []
-                        for item in os.listdir(models_dir):
-                            item_path = os.path.join(models_dir, item)
-                            if os.path.isdir(item_path):
-                                subdirs.append(item)
-                        return subdirs if subdirs else ["checkpoints", "loras", "vae", "upscale_models", "controlnet"]
-            except:
-                pass
-            return ["checkpoints", "loras", "vae", "upscale_models", "controlnet"]
-        
-        models_subdirs = get_models_subdirs()
+        # 获取 models 目录的子目录列表（按目录修改时间缓存）
+        models_subdirs = comfy_paths.models_subdirs()
         
         return {
             "required": {
                 "url": ("STRING", {
                     "name": "模型地址/model_url",
-                    "multiline": False,
+                    "multiline": True,
                     "default": "",
-                    "placeholder": "请将模型地址粘贴进来",
-                    "tooltip": "请将模型地址粘贴进来 / please paste the model address here"
+                    "placeholder": "请将模型地址粘贴进来，多个镜像地址每行一个",
+                    "tooltip": "请将模型地址粘贴进来；同一文件有多个镜像时每行一个，会同时从各镜像下载 / please paste the model address here; for a file published on several mirrors, put one URL per line to download from all of them at once"
                 }),
                 "save_directory": (models_subdirs, {
                     "name": "选择模型保存目录/select model save directory",
@@ -63,7 +1338,20 @@ class HiveModelDownloader:
                     "default": models_subdirs[0] if models_subdirs else "checkpoints"
                 }),
             },
-            "optional": {}
+            "optional": {
+                "sha256": ("STRING", {
+                    "name": "SHA-256校验值/expected SHA-256",
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "可选：文件的 SHA-256，留空则自动获取",
+                    "tooltip": "可选：文件的 SHA-256 校验值，留空时自动从 HuggingFace 或 .sha256 文件获取 / optional: expected SHA-256 of the file, fetched from HuggingFace or a .sha256 file when empty"
+                }),
+                "update_existing": ("BOOLEAN", {
+                    "name": "更新已有文件/update existing file",
+                    "default": False,
+                    "tooltip": "文件已存在时下载新版本替换它；远程提供 .blocks.json 块索引时只下载变化的部分 / replace an existing file with the new version; only the changed blocks are downloaded when the server provides a .blocks.json block index"
+                }),
+            }
         }
     
     RETURN_TYPES = ()
@@ -75,443 +1363,738 @@ class HiveModelDownloader:
 
 
     
-    def download_model(self, url, save_directory="checkpoints"):
+    def download_model(self, url, save_directory="checkpoints", sha256="", update_existing=False):
         """
-        下载模型文件
+        提交后台下载任务，立即返回任务 ID，不占用 ComfyUI 的执行队列
         
         Args:
             url: 模型文件的下载地址
             save_directory: 保存目录名称（models 下的子目录）
+            sha256: 可选的文件 SHA-256 校验值
+            update_existing: 文件已存在时是否更新为远程的新版本
+        
+        Returns:
+            status: 任务提交信息
+        """
+        if not url or not url.strip():
+            return {"ui": {"text": ["错误: 请提供有效的下载地址 / Error: Please provide a valid download URL"]}}
+        
+        submitted_at = time.time()
+        try:
+            job = download_jobs.submit(url.strip(), save_directory, sha256, update=update_existing)
+        except ValueError as e:
+            return {"ui": {"text": [f"错误 / Error: {str(e)}"]}}
+        if job.created_at < submitted_at:
+            msg = f"同一文件已在下载中，使用已有任务 / The same file is already being downloaded, attached to job: {job.job_id}\n{job.url}"
+        else:
+            msg = f"已提交后台下载任务 / Download job submitted: {job.job_id}\n{job.url}"
+        print(msg)
+        return {"ui": {"text": [msg], "job_id": [job.job_id]}}
+    
+    def _link_from_index(self, model_index, sha256, save_path, control, size=None):
+        """
+        在哈希索引中查找内容相同的本地文件，找到则链接到目标路径
+        
+        Args:
+            size: 远程文件大小；已知时还会检查 models 目录下大小相同、尚未索引的文件
+        
+        Returns:
+            找到时返回节点输出，否则返回 None
+        """
+        existing_path = model_index.find(sha256, exclude=save_path, size=size)
+        if not existing_path:
+            return None
+        try:
+            method = link_file(existing_path, save_path)
+        except OSError as e:
+            print(f"[警告] 链接已有文件失败，改为下载 / [Warning] Failed to link existing file, downloading instead: {e}")
+            return None
+        model_index.add(save_path, sha256)
+        file_size = os.path.getsize(save_path)
+        control.sha256 = sha256
+        control.total_size = file_size
+        control.downloaded = file_size
+        control.completed = True
+        msg = f"✓ 本地已有相同文件，已直接{'复制' if method == 'copy' else '链接'}，无需下载 / Identical file found locally, {'copied' if method == 'copy' else 'linked'} instead of downloading\n来源 / Source: {existing_path}\n文件路径 / File path: {save_path}\nSHA-256: {sha256}"
+        print(msg)
+        return {"ui": {"text": [msg]}}
+    
+    def run_download(self, url, save_directory="checkpoints", sha256="", control=None, update=False):
+        """
+        下载模型文件（阻塞直到下载完成），并记录本次下载的分阶段耗时
+        
+        Args:
+            url: 模型文件的下载地址；多个等价的镜像地址用换行或空格分隔，会同时从各镜像下载不同部分
+            save_directory: 保存目录名称（models 下的子目录）
+            sha256: 可选的文件 SHA-256 校验值，下载时边下载边校验
+            control: DownloadControl，用于暂停/取消和上报进度
+            update: 文件已存在时下载新版本替换它（远程有块索引时只下载变化的块）
         
         Returns:
             status: 下载状态信息
         """
+        if control is None:
+            control = DownloadControl()
+        telemetry = _DownloadTelemetry((url or "").strip(), save_directory)
+        
+        # 同一目标文件同时只允许一个下载（包括共用 models 目录的其他 ComfyUI 进程），其余的等待它完成
+        lock, result = self._acquire_download_lock(url, save_directory, control, telemetry)
+        if result is None:
+            try:
+                result = self._run_download(url, save_directory, sha256, control, telemetry, update)
+            finally:
+                if lock:
+                    lock.release()
+        
+        if control.completed:
+            outcome = telemetry.record.get("result") or "completed"
+        elif control.stopped:
+            outcome = "cancelled" if control.discard else "paused"
+        else:
+            outcome = "failed"
+        if outcome in ("linked", "skipped", "coalesced", "up_to_date"):
+            downloaded = 0
+        else:
+            downloaded = max(0, control.downloaded - telemetry.record.get("resumed_bytes", 0) - telemetry.record.get("delta_reused_bytes", 0))
+        telemetry.finish(outcome, downloaded)
+        return result
+    
+    def _acquire_download_lock(self, url, save_directory, control, telemetry):
+        """
+        获取目标文件的下载锁；其他进程或线程正在下载同一文件时等待，期间显示对方的下载进度
+        
+        Returns:
+            (lock, result)：获得锁时 result 为 None，由调用方下载后释放 lock；
+            对方已完成下载或等待期间被暂停/取消时 lock 为 None，result 为节点输出
+        """
+        urls = _split_urls(url or "")
+        if not urls:
+            return None, None
+        save_path = _download_destination(urls[0], save_directory)
+        try:
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            lock = FileLock(os.path.join(os.path.dirname(save_path), f'.{os.path.basename(save_path)}.lock'))
+            if lock.acquire():
+                return lock, None
+        except OSError as e:
+            # 无法加锁（例如目录不可写）时照常下载，由下载过程报告错误
+            print(f"[警告] 无法获取下载锁 / [Warning] Failed to acquire download lock: {e}")
+            return None, None
+        manifest_path = os.path.join(os.path.dirname(save_path), f'.{os.path.basename(save_path)}.part.json')
+        # 更新模式下文件在等待前就已存在，需要比较等待前后的文件才能判断对方是否完成了下载
+        identity = _file_identity(save_path)
+        msg = f"另一个任务正在下载同一文件，等待其完成 / Another download of the same file is in progress, waiting for it to finish: {save_path}"
+        print(msg)
+        with telemetry.phase("wait_other_download"):
+            while not lock.acquire():
+                if control.stopped:
+                    msg = "已停止等待 / Stopped waiting" if not control.discard else "已取消 / Cancelled"
+                    return None, {"ui": {"text": [f"{msg}: {save_path}"]}}
+                progress = _read_download_progress(manifest_path)
+                if progress:
+                    control.total_size = progress[1]
+                    control.report(progress[0])
+                control.wait(1)
+        current = _file_identity(save_path)
+        part_path = os.path.join(os.path.dirname(save_path), f'.{os.path.basename(save_path)}.part')
+        if current is None or current == identity or os.path.exists(part_path) or os.path.exists(manifest_path):
+            # 对方失败或暂停（文件不存在、没有变化或留有未完成的下载）：由本任务接着下载（续传清单仍然有效）
+            return lock, None
+        lock.release()
+        file_size = os.path.getsize(save_path)
+        control.total_size = file_size
+        control.downloaded = file_size
+        control.completed = True
+        telemetry.set(result="coalesced")
+        msg = f"✓ 同一文件已由另一个任务下载完成 / The same file was downloaded by another job: {save_path}\n文件大小 / File size: {file_size / 1024 / 1024:.2f} MB"
+        print(msg)
+        return None, {"ui": {"text": [msg]}}
+    
+    def _up_to_date(self, model_index, save_path, expected_sha256, control):
+        """
+        更新模式下本地文件与远程文件的 SHA-256 相同时无需下载
+        
+        Returns:
+            已是最新时返回节点输出，否则返回 None
+        """
+        if model_index.hash_file(save_path) != expected_sha256:
+            return None
+        model_index.save()
+        file_size = os.path.getsize(save_path)
+        control.sha256 = expected_sha256
+        control.total_size = file_size
+        control.downloaded = file_size
+        control.completed = True
+        msg = f"✓ 本地文件已是最新版本 / The local file is already up to date: {save_path}\nSHA-256: {expected_sha256}"
+        print(msg)
+        return {"ui": {"text": [msg]}}
+    
+    def _run_download(self, url, save_directory, sha256, control, telemetry, update=False):
+        """run_download 的实际下载过程"""
         if not url or not url.strip():
             return {"ui": {"text": ["错误: 请提供有效的下载地址 / Error: Please provide a valid download URL"]}}
         
-        url = url.strip()
+        # 第一个地址为主地址（决定文件名和续传清单），其余为镜像
+        urls = _split_urls(url)
+        url = urls[0]
+        expected_sha256 = _normalize_sha256(sha256)
+        if sha256 and sha256.strip() and not expected_sha256:
+            return {"ui": {"text": ["错误: SHA-256 校验值格式无效 / Error: Invalid SHA-256 value"]}}
         
         try:
-            # 尝试找到 ComfyUI 的 models 目录
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            # 向上查找 ComfyUI 根目录
-            comfyui_root = None
-            check_dir = current_dir
-            for _ in range(5):  # 最多向上查找5层
-                if os.path.exists(os.path.join(check_dir, "models")):
-                    comfyui_root = check_dir
-                    break
-                parent = os.path.dirname(check_dir)
-                if parent == check_dir:
-                    break
-                check_dir = parent
-            
-            if comfyui_root:
-                save_directory_path = os.path.join(comfyui_root, "models", save_directory)
-            else:
-                # 如果找不到，使用当前目录下的 models 文件夹
-                save_directory_path = os.path.join(current_dir, "models", save_directory)
-            
-            save_directory_path = os.path.abspath(save_directory_path)
+            # ComfyUI 的 models 目录（只解析一次）
+            models_root = comfy_paths.models_dir
+            save_path = _download_destination(url, save_directory)
+            filename = os.path.basename(save_path)
             
             # 创建目录（如果不存在）
-            os.makedirs(save_directory_path, exist_ok=True)
-            
-            # 获取文件名
-            filename = os.path.basename(url.split('?')[0])  # 移除查询参数
-            if not filename or '.' not in filename:
-                # 如果无法从URL获取文件名，尝试从Content-Disposition获取
-                filename = "downloaded_model.bin"
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
             
-            save_path = os.path.join(save_directory_path, filename)
-            
-            # 检查文件是否已存在
-            if os.path.exists(save_path):
+            # 检查文件是否已存在（更新模式下已有文件作为旧版本，内容相同的块直接复用）
+            seed_path = None
+            if os.path.exists(save_path) and update:
+                seed_path = save_path
+            elif os.path.exists(save_path):
                 file_size = os.path.getsize(save_path)
                 file_size_mb = file_size / (1024 * 1024)
-                return {"ui": {"text": [f"⚠️ 文件已存在，跳过下载 / File already exists, skipping download\n文件路径 / File path: {save_path}\n文件大小 / File size: {file_size_mb:.2f} MB\n\n如需重新下载，请先删除现有文件或更改保存位置 / To re-download, please delete the existing file or change the save location"]}}
+                control.completed = True
+                telemetry.set(result="skipped")
+                return {"ui": {"text": [f"⚠️ 文件已存在，跳过下载 / File already exists, skipping download\n文件路径 / File path: {save_path}\n文件大小 / File size: {file_size_mb:.2f} MB\n\n如需重新下载，请先删除现有文件、更改保存位置或开启“更新已有文件” / To re-download, please delete the existing file, change the save location or enable \"update existing file\""]}}
+            
+            # 已知文件哈希时，本地已有相同内容的文件（其他目录或其他文件名）直接链接，无需下载
+            # 下载过程中读回本地文件计算哈希也使用下载缓冲区，受 HIVE_DOWNLOAD_MEMORY_MB 约束
+            model_index = get_model_index(models_root, download_buffers)
+            if expected_sha256 and seed_path:
+                with telemetry.phase("checksum_lookup"):
+                    current = self._up_to_date(model_index, save_path, expected_sha256, control)
+                if current:
+                    telemetry.set(result="up_to_date")
+                    return current
+            if expected_sha256:
+                linked = self._link_from_index(model_index, expected_sha256, save_path, control)
+                if linked:
+                    telemetry.set(result="linked")
+                    return linked
             
             # 开始下载
             print(f"开始下载 / Starting download: {url}")
             print(f"保存到 / Saving to: {save_path}")
             status_msg = f"开始下载 / Starting download: {url}\n"
             
-            # 先获取文件信息（使用临时session，避免连接复用问题）
-            with requests.Session() as tmp_session:
-                tmp_session.headers.update({
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                head_response = tmp_session.head(url, allow_redirects=True, timeout=30)
-                head_response.raise_for_status()
+            # 分片重试统计（显示在最终状态中）
+            retry_stats = {"count": 0, "time": 0.0}
+            mirror_set = None
+            delta_text = None
+            
+            # 先获取文件信息（多个镜像时并行获取，以第一个可用的地址为准）
+            with telemetry.phase("probe"):
+                probes = _probe_mirrors(urls)
+            reference = next(((probe_url, response) for probe_url, response, error in probes if response is not None), None)
+            if reference is None:
+                raise probes[0][2]
+            url, head_response = reference
+            telemetry.set(redirects=len(head_response.history), mirrors=len(urls))
             
             # 获取文件大小
             total_size = int(head_response.headers.get('content-length', 0))
+            control.total_size = total_size
+            telemetry.set(total_size=total_size)
             
             # 检查服务器是否支持 Range 请求（多线程下载需要）
             supports_range = head_response.headers.get('accept-ranges', '').lower() == 'bytes'
             
+            # 更新已有文件时获取远程文件的块索引，用于只下载变化的块
+            block_index = None
+            if seed_path and total_size > 0 and supports_range:
+                with telemetry.phase("block_index"):
+                    block_index = _fetch_block_index(url, total_size)
+                if block_index and expected_sha256 and block_index.get("sha256") != expected_sha256:
+                    print("[警告] 块索引与 SHA-256 不一致，忽略块索引 / [Warning] Block index does not match the SHA-256, ignoring it")
+                    block_index = None
+            
+            # 没有指定 SHA-256 时，尝试从 HuggingFace 响应头、.sha256 文件或块索引获取
+            if not expected_sha256:
+                with telemetry.phase("checksum_lookup"):
+                    expected_sha256 = _find_remote_sha256(url, head_response) or _normalize_sha256((block_index or {}).get("sha256"))
+                if expected_sha256 and seed_path:
+                    current = self._up_to_date(model_index, save_path, expected_sha256, control)
+                    if current:
+                        telemetry.set(result="up_to_date")
+                        return current
+                if expected_sha256:
+                    print(f"获取到远程文件的 SHA-256 / Found remote SHA-256: {expected_sha256}")
+            
+            # 知道文件大小后再查找一次：索引中没有时，检查 models 目录下大小相同的其他文件
+            if expected_sha256:
+                with telemetry.phase("checksum_lookup"):
+                    linked = self._link_from_index(model_index, expected_sha256, save_path, control, total_size)
+                if linked:
+                    telemetry.set(result="linked")
+                    return linked
+            
             if total_size > 0 and supports_range:
                 # 使用多线程下载（支持 Range 请求）
-                # 对于超大文件（>10GB），限制线程数避免过多临时文件
-                # 每个线程处理约500MB-1GB的数据比较合理
+                # 所有分片直接写入同一个预分配的文件（按偏移写入），完成后再重命名为目标文件
+                # 避免每个分片一个临时文件再合并：合并需要把每个字节读写两遍，并占用两倍磁盘空间
+                part_path = os.path.join(os.path.dirname(save_path), f'.{os.path.basename(save_path)}.part')
+                manifest_path = part_path + '.json'
+                control.partial_files = [part_path, manifest_path]
+                etag = head_response.headers.get('etag')
+                last_modified = head_response.headers.get('last-modified')
+                
+                # 镜像与主地址的文件大小或 SHA-256 不一致、不支持 Range 时不使用
+                # 所有分片直接请求探测时跳转到的最终地址，不必每次重新跳转
+                mirrors = [_Mirror(url, etag, head_response.url)]
+                for mirror_url, response, error in probes:
+                    if mirror_url == url:
+                        continue
+                    if response is None:
+                        print(f"[镜像] 跳过不可用的镜像 / [Mirror] Skipping unavailable mirror {mirror_url}: {error}")
+                        continue
+                    mirror_sha256 = _linked_sha256(response)
+                    if int(response.headers.get('content-length', 0)) != total_size:
+                        print(f"[镜像] 跳过文件大小不一致的镜像 / [Mirror] Skipping mirror with different size: {mirror_url}")
+                    elif response.headers.get('accept-ranges', '').lower() != 'bytes':
+                        print(f"[镜像] 跳过不支持 Range 的镜像 / [Mirror] Skipping mirror without Range support: {mirror_url}")
+                    elif mirror_sha256 and expected_sha256 and mirror_sha256 != expected_sha256:
+                        print(f"[镜像] 跳过 SHA-256 不一致的镜像 / [Mirror] Skipping mirror with different SHA-256: {mirror_url}")
+                    else:
+                        mirrors.append(_Mirror(mirror_url, response.headers.get('etag'), response.url))
+                mirror_set = _MirrorSet(mirrors)
+                
+                # 先检查文件开头的内容，登录页、错误信息或头部与大小不符的文件不必启动多线程下载
+                with telemetry.phase("validate"):
+                    _sniff_remote(mirrors[0], filename, total_size)
+                if len(mirrors) > 1:
+                    print(f"同时从 {len(mirrors)} 个镜像下载 / Downloading from {len(mirrors)} mirrors: {', '.join(mirror.host for mirror in mirrors)}")
+                
+                # 初始连接数：对于超大文件（>10GB），限制线程数避免过多连接；下载过程中再按实测吞吐量自动调整
                 if total_size > 10 * 1024 * 1024 * 1024:  # 大于10GB
                     num_threads = min(8, max(4, total_size // (1024 * 1024 * 1024)))  # 每GB一个线程，最多8个
                 else:
                     num_threads = min(8, max(4, total_size // (10 * 1024 * 1024)))  # 每10MB一个线程，最多8个
-                chunk_size = total_size // num_threads
                 
-                print(f"使用 {num_threads} 个线程进行多线程下载... / Using {num_threads} threads for multi-threaded download...")
+                # 如果上次下载中断，根据清单只下载缺失的部分
+                saved_segments = _load_download_manifest(manifest_path, part_path, urls[0], total_size, etag, last_modified)
+                if saved_segments:
+                    scheduler = _SegmentScheduler([_Segment(seg['start'], seg['end'], seg['done']) for seg in saved_segments])
+                    resumed_size = scheduler.downloaded()
+                    telemetry.set(resumed_bytes=resumed_size)
+                    print(f"继续上次未完成的下载，已完成 / Resuming previous download, already finished: {resumed_size / 1024 / 1024:.2f} MB / {total_size / 1024 / 1024:.2f} MB")
+                else:
+                    # 切成比线程数多得多的小分片（每线程约4个，单个分片4MB~64MB），由空闲线程依次领取
+                    segment_size = max(4 * 1024 * 1024, min(64 * 1024 * 1024, total_size // (num_threads * 4)))
+                    plan = None
+                    if block_index:
+                        with telemetry.phase("delta_plan"):
+                            plan = plan_delta(block_index, seed_path)
+                    if plan and any(local_offset is not None for _, _, local_offset in plan):
+                        # 增量更新：与旧文件相同的块直接复制，只下载变化的部分
+                        with telemetry.phase("delta_copy"):
+                            scheduler, reused_size = _prepare_delta(plan, seed_path, part_path, total_size, segment_size)
+                        delta_text = f"增量更新：复用本地 {reused_size / 1024 / 1024:.2f} MB，下载 {(total_size - reused_size) / 1024 / 1024:.2f} MB / Delta update: reused {reused_size / 1024 / 1024:.2f} MB locally, downloading {(total_size - reused_size) / 1024 / 1024:.2f} MB"
+                        telemetry.set(delta_reused_bytes=reused_size)
+                        print(delta_text)
+                    else:
+                        scheduler = _SegmentScheduler.split_evenly(total_size, segment_size)
+                        with telemetry.phase("preallocate"):
+                            _preallocate_file(part_path, total_size)
+                
+                controller = _ConnectionController(num_threads)
+                num_threads = controller.target
+                print(f"使用 {num_threads} 个线程进行多线程下载（根据吞吐量在 {controller.min_connections}~{controller.max_connections} 之间自动调整）... / Using {num_threads} threads for multi-threaded download (adjusted between {controller.min_connections} and {controller.max_connections} by throughput)...")
                 
-                # 创建临时文件来存储各个分片
-                temp_files = {}  # 使用字典，以 chunk_id 为键
-                threads = []
-                downloaded_chunks = [0] * num_threads
-                lock = threading.Lock()
+                # 边下载边计算 SHA-256
+                hasher = _StreamingHasher(part_path)
                 
-                def download_chunk(chunk_id, start, end):
-                    """下载文件的一个分片"""
-                    # 【关键修复】每个线程创建独立的Session，避免连接池竞争和死锁
-                    local_session = requests.Session()
-                    local_session.headers.update({
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+                def save_manifest():
+                    """保存当前各分片进度到续传清单"""
+                    _save_download_manifest(manifest_path, {
+                        "url": urls[0],
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "total_size": total_size,
+                        "segments": scheduler.snapshot(),
                     })
+                
+                save_manifest()
+                
+                def download_segment(session, seg, view, mirror):
+                    """
+                    从指定镜像下载一个分片，直接写入目标文件的对应偏移位置；分片被拆分后只下载到新的结束位置
+                    数据通过 readinto 读入线程持有的预分配缓冲区 view，不在内存中累积
+                    """
+                    with scheduler.lock:
+                        range_start = seg.start + seg.done
+                        range_end = seg.end
+                    # 分片按原始字节偏移写入，要求服务器不压缩响应内容
+                    headers = {'Range': f'bytes={range_start}-{range_end}', 'Accept-Encoding': 'identity'}
                     
-                    temp_file_path = None
-                    temp_file = None
+                    # 读取超时120秒：超过120秒没有收到新数据，认为连接已中断
+                    request_start = time.time()
+                    ttfb = None
+                    error = None
                     try:
-                        headers = {'Range': f'bytes={start}-{end}'}
-                        expected_size = end - start + 1
-                        
-                        # 将临时文件放在目标目录附近，避免系统临时目录空间不足的问题
-                        # 对于超大文件，这样可以更好地控制临时文件位置
-                        temp_dir = os.path.dirname(save_path)
-                        temp_file_path = os.path.join(temp_dir, f'.{os.path.basename(save_path)}.part{chunk_id}.tmp')
-                        
-                        temp_file = open(temp_file_path, 'wb')
-                        
-                        # 使用锁保护字典写入操作
-                        with lock:
-                            temp_files[chunk_id] = temp_file_path
-                        
-                        # 对于中等大小的分片（<100MB），不使用 stream，直接获取全部内容
-                        # 这样可以避免流式读取可能的阻塞问题
-                        if expected_size < 100 * 1024 * 1024:  # 小于100MB
-                            # 不使用 stream=True，直接获取完整响应
-                            response = local_session.get(url, headers=headers, stream=False, timeout=(30, 300))
+                        with _get_resolved(session, mirror, headers=headers, stream=True, timeout=(30, 120)) as response:
+                            ttfb = time.time() - request_start
                             response.raise_for_status()
                             
-                            # 检查响应状态码
-                            if response.status_code not in [200, 206]:
-                                raise Exception(f"分片 {chunk_id} 响应状态码错误: {response.status_code} / Chunk {chunk_id} response status code error: {response.status_code}")
-                            
-                            content = response.content
-                            if not content or len(content) == 0:
-                                raise Exception(f"分片 {chunk_id} 响应内容为空 / Chunk {chunk_id} response content is empty")
-                            
-                            chunk_downloaded = len(content)
-                            temp_file.write(content)
-                            temp_file.flush()
-                            
-                            # 更新进度
-                            with lock:
-                                downloaded_chunks[chunk_id] = chunk_downloaded
-                        else:
-                            # 对于大分片（>=100MB），统一使用流式读取
-                            # 之前的直接读取方式对于大文件可能会阻塞，所以改为统一使用流式下载
-                            # 根据分片大小动态调整超时时间
-                            min_speed_mbps = 1.0  # 最低1MB/s
-                            estimated_time = (expected_size / (1024 * 1024)) / min_speed_mbps  # 秒
-                            # 连接超时60秒，读取超时为估算时间的2倍，最少300秒，最多1800秒（30分钟）
-                            read_timeout = max(300, min(1800, int(estimated_time * 2)))
-                            chunk_timeout = (60, read_timeout)
-                            
-                            response = local_session.get(url, headers=headers, stream=True, timeout=chunk_timeout)
-                            response.raise_for_status()
+                            # 文件在下载过程中被更新（ETag 变化），已下载的数据与新数据无法拼接
+                            response_etag = response.headers.get('etag')
+                            if mirror.etag and response_etag and response_etag != mirror.etag:
+                                raise _MirrorMismatch(f"{mirror.host} 的 ETag 已变化 / ETag changed on {mirror.host}: {mirror.etag} -> {response_etag}")
                             
-                            # 检查响应状态码
-                            if response.status_code not in [200, 206]:
-                                raise Exception(f"分片 {chunk_id} 响应状态码错误: {response.status_code} / Chunk {chunk_id} response status code error: {response.status_code}")
+                            # 服务器忽略 Range 返回整个文件时，数据无法写入分片位置
+                            if response.status_code != 206 and not (range_start == 0 and range_end == total_size - 1):
+                                raise _MirrorMismatch(f"分片 {range_start}-{range_end} 响应状态码错误: {response.status_code} / Segment {range_start}-{range_end} response status code error: {response.status_code}")
                             
                             # 检查Content-Range头，确保响应是正确的范围
                             content_range = response.headers.get('Content-Range', '')
-                            if content_range and chunk_id == 0:
-                                # 验证第一个分片的范围是否正确
-                                if 'bytes 0-' not in content_range:
-                                    print(f"[警告] 分片0的Content-Range可能异常: {content_range} / [Warning] Chunk 0 Content-Range may be abnormal: {content_range}")
-                            
-                            chunk_downloaded = 0
-                            # 根据分片大小调整更新间隔：大文件更新频率可以低一些
-                            if expected_size > 1024 * 1024 * 1024:  # >1GB
-                                update_interval = 50 * 1024 * 1024  # 每50MB更新一次进度
-                                flush_interval = 100 * 1024 * 1024  # 每100MB刷新一次（减少IO）
-                            else:
-                                update_interval = 5 * 1024 * 1024  # 每5MB更新一次进度
-                                flush_interval = 20 * 1024 * 1024  # 每20MB刷新一次
-                            
-                            last_update_size = 0
-                            last_flush_size = 0
-                            
-                            # 使用 iter_content 流式读取
-                            # 统一使用1MB块大小，避免过大Buffer触发防火墙流量整形，提高稳定性
-                            iter_chunk_size = 1024 * 1024  # 统一使用1MB块
-                            has_data = False
-                            last_chunk_time = time.time()  # 记录最后一次收到数据的时间
-                            chunk_read_timeout = 120  # 如果120秒没有收到新数据块，认为连接可能中断
-                            
-                            # 对于第一个分片，立即更新进度（即使只有很少的数据），确保进度可见
-                            first_chunk_received = False
-                            
-                            for chunk in response.iter_content(chunk_size=iter_chunk_size):
-                                current_time = time.time()
-                                if chunk:
-                                    has_data = True
-                                    last_chunk_time = current_time
-                                    temp_file.write(chunk)
-                                    chunk_downloaded += len(chunk)
-                                    
-                                    # 对于第一个分片的第一个数据块，立即更新进度
-                                    if chunk_id == 0 and not first_chunk_received:
-                                        with lock:
-                                            downloaded_chunks[chunk_id] = chunk_downloaded
-                                        first_chunk_received = True
-                                    
-                                    # 每次收到数据都检查是否需要刷新和更新进度
-                                    if chunk_downloaded - last_flush_size >= flush_interval:
-                                        temp_file.flush()
-                                        last_flush_size = chunk_downloaded
-                                    
-                                    # 更频繁地更新进度，特别是对于前几个数据块
-                                    # 前10MB每1MB更新一次，之后按正常间隔
-                                    force_update = chunk_downloaded < 10 * 1024 * 1024 and (chunk_downloaded - last_update_size >= 1024 * 1024)
-                                    if force_update or chunk_downloaded - last_update_size >= update_interval:
-                                        with lock:
-                                            downloaded_chunks[chunk_id] = chunk_downloaded
-                                        last_update_size = chunk_downloaded
-                                else:
-                                    # 如果收到空块，检查是否超时
-                                    if has_data and current_time - last_chunk_time > chunk_read_timeout:
-                                        raise Exception(f"分片 {chunk_id} 读取超时（{chunk_read_timeout}秒未收到数据，已下载 {chunk_downloaded / 1024 / 1024:.2f} MB） / Chunk {chunk_id} read timeout ({chunk_read_timeout}s no data, downloaded {chunk_downloaded / 1024 / 1024:.2f} MB)")
-                            
-                            if not has_data or chunk_downloaded == 0:
-                                raise Exception(f"分片 {chunk_id} 未下载到任何数据 / Chunk {chunk_id} downloaded no data")
+                            if content_range and f'bytes {range_start}-' not in content_range:
+                                raise _MirrorMismatch(f"分片 {range_start}-{range_end} 的Content-Range异常 / Segment {range_start}-{range_end} has unexpected Content-Range: {content_range}")
                             
-                            # 最后刷新并更新进度
-                            temp_file.flush()
-                            with lock:
-                                downloaded_chunks[chunk_id] = chunk_downloaded
-                        
-                        # 最后刷新并更新最终进度（对于流式下载，进度已在循环中更新；对于直接读取，进度也已更新）
-                        if temp_file:
-                            temp_file.flush()
-                        
-                        # 关闭文件
-                        if temp_file:
-                            temp_file.close()
-                        
-                        # 验证分片大小
-                        actual_size = os.path.getsize(temp_file_path)
-                        if actual_size != expected_size:
-                            raise Exception(f"分片 {chunk_id} 大小不匹配: 期望 {expected_size} 字节，实际 {actual_size} 字节 / Chunk {chunk_id} size mismatch: expected {expected_size} bytes, got {actual_size} bytes")
-                        
-                        return chunk_id, True, temp_file_path
+                            # 每个线程使用独立的文件句柄，定位到分片起始偏移后顺序写入
+                            # 不使用用户态缓冲，保证记录到续传清单的进度都已交给操作系统
+                            with open(part_path, 'r+b', buffering=0) as f:
+                                f.seek(range_start)
+                                offset = range_start
+                                while True:
+                                    if scheduler.aborted:
+                                        return False
+                                    received = response.raw.readinto(view)
+                                    if not received:
+                                        break
+                                    allowed = scheduler.reserve(seg, received)
+                                    if allowed:
+                                        f.write(view[:allowed])
+                                        hasher.feed(offset, view[:allowed])
+                                        offset += allowed
+                                    if scheduler.commit(seg, allowed) or allowed < received:
+                                        # 分片完成（或已被拆分，后面的数据由其他线程下载），提前关闭连接
+                                        return True
                     except Exception as e:
-                        error_detail = f"分片 {chunk_id} 下载失败: {str(e)} / Chunk {chunk_id} download failed: {str(e)}"
-                        print(f"[错误] {error_detail}")
-                        import traceback
-                        traceback.print_exc()  # 打印完整堆栈跟踪
-                        # 确保文件已关闭
-                        if temp_file:
-                            try:
-                                temp_file.close()
-                            except:
-                                pass
-                        # 清理失败的临时文件
-                        if temp_file_path and os.path.exists(temp_file_path):
-                            try:
-                                os.unlink(temp_file_path)
-                            except:
-                                pass
-                        return chunk_id, False, None
+                        error = str(e)
+                        raise
                     finally:
-                        # 【关键修复】务必关闭独立的Session，释放连接资源
+                        # 分片只由当前线程写入，本次请求写入的字节数即 done 的增量
+                        written = seg.start + seg.done - range_start
+                        elapsed = time.time() - request_start
+                        mirror_set.record(mirror, written, elapsed)
+                        telemetry.segment(mirror.host, range_start, written, ttfb, elapsed, error)
+                    
+                    raise Exception(f"分片 {range_start}-{range_end} 连接提前结束 / Segment {range_start}-{range_end} connection ended early ({seg.done / 1024 / 1024:.2f} MB / {seg.size / 1024 / 1024:.2f} MB)")
+                
+                # 单个分片的最大重试次数
+                max_retries = 5
+                
+                def download_worker(worker_id):
+                    """下载线程：不断领取分片直到全部完成，失败的分片从已写入的位置继续重试"""
+                    try:
+                        # 所有线程共用全局连接池，连接在分片之间复用
+                        session = get_http_session(controller.max_connections)
+                        # 从共享缓冲区池申请读缓冲区；缓冲区用完时等待其他线程释放，保证峰值内存不超过上限
+                        buffer = None
+                        while buffer is None:
+                            if scheduler.aborted:
+                                return worker_id, True
+                            buffer = download_buffers.acquire(timeout=1)
                         try:
-                            local_session.close()
-                        except:
-                            pass
+                            return download_segments(session, memoryview(buffer), worker_id)
+                        finally:
+                            download_buffers.release(buffer)
+                    finally:
+                        controller.exited(worker_id)
+                        control.notify()
+                
+                def download_segments(session, view, worker_id):
+                    """不断领取分片并下载，直到没有剩余分片"""
+                    while True:
+                        # 连接数目标降低时，多余的线程在分片之间退出
+                        if controller.try_retire(worker_id):
+                            return worker_id, True
+                        seg = scheduler.next_segment()
+                        if seg is None:
+                            return worker_id, True
+                        attempt = 0
+                        while True:
+                            attempt_start = time.time()
+                            mirror = mirror_set.pick()
+                            try:
+                                download_segment(session, seg, view, mirror)
+                                # 分片完成，唤醒主线程更新进度
+                                control.notify()
+                                break
+                            except Exception as e:
+                                # 镜像出错或与其他镜像不一致而被放弃时，立即换其他镜像继续下载该分片
+                                if not scheduler.aborted and mirror_set.fail(mirror, e):
+                                    continue
+                                controller.record_error()
+                                if attempt >= max_retries or not _is_retryable_error(e) or scheduler.aborted:
+                                    print(f"\n[错误] 分片下载失败 / [Error] Segment download failed: {str(e)}")
+                                    import traceback
+                                    traceback.print_exc()  # 打印完整堆栈跟踪
+                                    scheduler.release(seg)
+                                    scheduler.abort()
+                                    return worker_id, False
+                                # 指数退避 + 随机抖动，避免所有连接同时重连
+                                delay = min(30, 2 ** attempt) * random.uniform(0.5, 1.5)
+                                attempt += 1
+                                print(f"\n[重试] 分片 {seg.start + seg.done}-{seg.end} 第 {attempt} 次重试（{delay:.1f}秒后） / [Retry] Segment {seg.start + seg.done}-{seg.end} retry {attempt} in {delay:.1f}s: {str(e)}")
+                                time.sleep(delay)
+                                with scheduler.lock:
+                                    retry_stats["count"] += 1
+                                    retry_stats["time"] += time.time() - attempt_start
+                                # 出错后连接数目标可能已减少，交出分片（已写入的部分保留）由剩下的线程继续
+                                if controller.try_retire(worker_id):
+                                    scheduler.release(seg)
+                                    return worker_id, True
                 
                 # 启动多线程下载
-                with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                with ThreadPoolExecutor(max_workers=controller.max_connections) as executor:
                     futures = []
-                    for i in range(num_threads):
-                        start = i * chunk_size
-                        end = start + chunk_size - 1 if i < num_threads - 1 else total_size - 1
-                        future = executor.submit(download_chunk, i, start, end)
-                        futures.append(future)
                     
-                    # 显示进度并实时写入进度文件（供前端读取）
+                    def spawn_workers(count):
+                        for _ in range(count):
+                            controller.spawned()
+                            futures.append(executor.submit(download_worker, len(futures)))
+                    
+                    spawn_workers(num_threads)
+                    
+                    # 阻塞等待事件（分片完成、线程退出、暂停/取消），没有事件时每0.5秒醒来一次刷新进度并定期保存续传清单
                     last_progress = 0
                     last_total_downloaded = 0
-                    progress_updates = []
-                    stall_count = 0  # 检测是否卡住
-                    check_count = 0  # 循环计数器，用于给初始下载一些缓冲时间
-                    min_check_cycles = 15  # 至少循环15次（约5秒）后才开始检测停滞，给下载启动时间
+                    start_time = time.time()
+                    last_change_time = start_time  # 最近一次进度变化的时间，用于检测停滞
+                    last_stall_warning = start_time
+                    last_manifest_time = start_time
                     
                     while any(not f.done() for f in futures):
-                        # 使用锁读取进度数组，确保数据一致性
-                        with lock:
-                            total_downloaded = sum(downloaded_chunks)
+                        control.wait(0.5)
                         
-                        progress = (total_downloaded / total_size * 100) if total_size > 0 else 0
-                        check_count += 1
+                        # 暂停/取消：通知所有线程在当前数据块写完后退出
+                        if control.stopped:
+                            scheduler.abort()
                         
-                        # 只在有实际进度后，并且已经过了初始缓冲期，才检测停滞
-                        has_progress = total_downloaded > 0
-                        past_initial_period = check_count >= min_check_cycles
+                        # 定期保存续传清单（约每2秒），进程意外退出时最多丢失几秒的进度
+                        if time.time() - last_manifest_time >= 2:
+                            save_manifest()
+                            last_manifest_time = time.time()
                         
-                        # 检测进度是否停滞（超过15秒没有变化，且已经有了一些进度）
-                        if has_progress and past_initial_period and total_downloaded == last_total_downloaded:
-                            stall_count += 1
-                            # 只有超过15秒（约45个循环）没有进展才警告
-                            if stall_count >= 45:  # 15秒（45 * 0.33秒）
-                                # 显示每个线程的状态
-                                with lock:
-                                    status_info = []
-                                    for i in range(num_threads):
-                                        chunk_start = i * chunk_size
-                                        chunk_end = chunk_start + chunk_size - 1 if i < num_threads - 1 else total_size - 1
-                                        chunk_total = chunk_end - chunk_start + 1
-                                        chunk_progress = (downloaded_chunks[i] / chunk_total * 100) if chunk_total > 0 else 0
-                                        is_done = futures[i].done()
-                                        chunk_mb = downloaded_chunks[i] / 1024 / 1024
-                                        total_mb = chunk_total / 1024 / 1024
-                                        status_info.append(f"T{i}:{chunk_progress:.0f}%({chunk_mb:.1f}/{total_mb:.1f}MB){'✓' if is_done else '▶'}")
-                                    # 只在有实际卡住的分片时才显示警告（不是所有线程都完成了）
-                                    if any(not futures[i].done() for i in range(num_threads)):
-                                        print(f"\n⚠️ 进度可能停滞 / Progress may be stalled: {' | '.join(status_info)}")
-                                
-                                stall_count = 0  # 重置计数器
-                        else:
-                            stall_count = 0
+                        # 哈希位置之后已连续写入的数据（乱序到达的分片）从文件读回计算，每次最多256MB，避免影响进度刷新
+                        # 不等待缓冲区：全部被下载线程占用时下次再计算
+                        hasher.catch_up(min(scheduler.contiguous_done(), hasher.position + 256 * 1024 * 1024), timeout=0)
+                        
+                        total_downloaded = scheduler.downloaded()
+                        control.report(total_downloaded, scheduler.progress_state())
+                        
+                        # 按实测吞吐量增减连接（还有未领取的分片时才需要新线程）
+                        new_workers = controller.update(total_downloaded)
+                        if new_workers and not scheduler.aborted and scheduler.has_pending():
+                            spawn_workers(new_workers)
+                        progress = (total_downloaded / total_size * 100) if total_size > 0 else 0
+                        
+                        # 检测进度是否停滞：开始5秒后、已经有了一些进度，超过15秒没有变化才警告
+                        now = time.time()
+                        if total_downloaded != last_total_downloaded:
+                            # 记录停滞区间（有过进度之后超过 STALL_THRESHOLD 秒没有新数据）
+                            if last_total_downloaded > 0 and now - last_change_time >= STALL_THRESHOLD:
+                                telemetry.stall(last_change_time, now - last_change_time)
                             last_total_downloaded = total_downloaded
+                            last_change_time = now
+                        elif total_downloaded > 0 and now - start_time >= 5 and now - max(last_change_time, last_stall_warning) >= 15:
+                            status_info = scheduler.active_status()
+                            if status_info:
+                                print(f"\n⚠️ 进度可能停滞 / Progress may be stalled: {' | '.join(status_info)}")
+                            last_stall_warning = now
                         
                         if int(progress) != last_progress:
                             progress_text = f"下载进度 / Download progress: {progress:.1f}% ({total_downloaded / 1024 / 1024:.2f} MB / {total_size / 1024 / 1024:.2f} MB)"
                             print(f"\r{progress_text}", end='', flush=True)
                             last_progress = int(progress)
-                            
-                            # 保存最新的进度更新
-                            progress_updates.append(progress_text)
-                            if len(progress_updates) > 10:
-                                progress_updates.pop(0)  # 只保留最近10条
-                        
-                        time.sleep(0.33)  # 约每0.33秒更新一次（更频繁以检测停滞）
                     
-                    # 等待所有线程完成
-                    results = [f.result() for f in futures]
+                    telemetry.add_phase("transfer", time.time() - start_time)
+                    telemetry.set(
+                        retries=retry_stats["count"],
+                        retry_seconds=round(retry_stats["time"], 3),
+                        connections_peak=controller.peak,
+                        connections_final=controller.target,
+                        mirror_stats=mirror_set.summary(),
+                        url_refreshes=sum(mirror.refreshes for mirror in mirror_set.mirrors),
+                    )
                     
                     # 检查是否所有分片都下载成功
-                    failed_chunks = [r[0] for r in results if not r[1]]
-                    if failed_chunks:
-                        # 清理所有临时文件
-                        for i in range(num_threads):
-                            if i in temp_files:
-                                try:
-                                    os.unlink(temp_files[i])
-                                except:
-                                    pass
-                        raise Exception(f"部分分片下载失败 / Some chunks failed to download: {failed_chunks}")
+                    results = [f.result() for f in futures]
+                    if control.stopped:
+                        if control.discard:
+                            for path in (part_path, manifest_path):
+                                if os.path.exists(path):
+                                    os.unlink(path)
+                        else:
+                            save_manifest()
+                        raise DownloadStopped()
+                    if not all(r[1] for r in results) or scheduler.downloaded() != total_size:
+                        # 保留已下载的部分和续传清单，再次运行时只下载缺失的部分
+                        save_manifest()
+                        raise Exception("部分分片下载失败，再次运行将继续下载 / Some segments failed to download, run again to resume")
                 
                 print()  # 换行
                 
-                # 合并分片（按 chunk_id 顺序合并，确保文件顺序正确）
-                print("合并下载的分片... / Merging downloaded chunks...")
+                # 所有分片已写入正确位置，无需合并，直接重命名为目标文件
                 try:
-                    # 使用流式合并，避免大文件一次性加载到内存
-                    chunk_copy_size = 64 * 1024 * 1024  # 每次复制64MB，适合大文件
-                    with open(save_path, 'wb') as f:
-                        for i in range(num_threads):
-                            if i not in temp_files:
-                                raise Exception(f"分片 {i} 的临时文件不存在 / Temporary file for chunk {i} does not exist")
-                            temp_file_path = temp_files[i]
-                            if not os.path.exists(temp_file_path):
-                                raise Exception(f"分片 {i} 的临时文件不存在 / Temporary file for chunk {i} does not exist: {temp_file_path}")
-                            
-                            # 流式复制，避免一次性加载大文件到内存
-                            with open(temp_file_path, 'rb') as tf:
-                                while True:
-                                    chunk_data = tf.read(chunk_copy_size)
-                                    if not chunk_data:
-                                        break
-                                    f.write(chunk_data)
-                            
-                            # 删除临时文件
-                            os.unlink(temp_file_path)
-                    
-                    # 验证最终文件大小
-                    final_size = os.path.getsize(save_path)
-                    if final_size != total_size:
-                        raise Exception(f"文件大小不匹配: 期望 {total_size} 字节，实际 {final_size} 字节 / File size mismatch: expected {total_size} bytes, got {final_size} bytes")
-                    
+                    with telemetry.phase("finalize"):
+                        final_size = os.path.getsize(part_path)
+                        if final_size != total_size:
+                            raise Exception(f"文件大小不匹配: 期望 {total_size} 字节，实际 {final_size} 字节 / File size mismatch: expected {total_size} bytes, got {final_size} bytes")
+                        # 下载结束时还没追上的哈希部分（记录为单独的阶段，用于判断收尾慢是否因为读回文件计算哈希）
+                        with telemetry.phase("hash_finalize"):
+                            hasher.catch_up(total_size)
+                        control.sha256 = hasher.hexdigest()
+                        if expected_sha256 and control.sha256 != expected_sha256:
+                            raise Exception(f"SHA-256 校验失败: 期望 {expected_sha256}，实际 {control.sha256} / SHA-256 mismatch: expected {expected_sha256}, got {control.sha256}")
+                        # 结构检查（safetensors 头部与文件大小、zip 目录），不读取整个文件
+                        validate_file(part_path, filename)
+                        os.replace(part_path, save_path)
+                        if os.path.exists(manifest_path):
+                            os.unlink(manifest_path)
                 except Exception as e:
-                    # 清理所有临时文件
-                    for i in range(num_threads):
-                        if i in temp_files:
+                    # 清理未完成的下载文件（大小或校验值不一致说明数据已损坏，无法续传）
+                    for path in (part_path, manifest_path):
+                        if os.path.exists(path):
                             try:
-                                if os.path.exists(temp_files[i]):
-                                    os.unlink(temp_files[i])
+                                os.unlink(path)
                             except:
                                 pass
-                    # 如果最终文件已创建但不完整，删除它
-                    if os.path.exists(save_path):
-                        try:
-                            os.unlink(save_path)
-                        except:
-                            pass
                     raise
                 
                 
             else:
                 # 单线程下载（不支持 Range 或文件大小未知）
                 print("使用单线程下载... / Using single-threaded download...")
-                # 创建独立的Session用于单线程下载
-                with requests.Session() as single_session:
-                    single_session.headers.update({
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    })
-                    response = single_session.get(url, stream=True, timeout=(30, 300))
-                    response.raise_for_status()
-                    
-                    downloaded_size = 0
-                    block_size = 4 * 1024 * 1024  # 4MB 块大小
-                    
-                    with open(save_path, 'wb') as f:
-                        if total_size > 0:
-                            last_write_time = 0
-                            with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename) as pbar:
-                                for chunk in response.iter_content(chunk_size=block_size):
+                # 先下载到临时文件，检查通过后再替换为目标文件；中途失败、暂停或取消时删除临时文件
+                # （不支持 Range 的下载无法续传），不完整的文件不会出现在模型目录中
+                target_path = os.path.join(os.path.dirname(save_path), f'.{os.path.basename(save_path)}.part')
+                try:
+                    transfer_start = time.time()
+                    with _get_resolved(get_http_session(), _Mirror(url, resolved_url=head_response.url), stream=True, timeout=(30, 300)) as response, download_buffers.borrow() as buffer:
+                        ttfb = time.time() - transfer_start
+                        response.raise_for_status()
+                        
+                        downloaded_size = 0
+                        hasher = _StreamingHasher(target_path)
+                        
+                        def read_chunks(view=memoryview(buffer)):
+                            """读入共享缓冲区池的缓冲区，逐块返回（每块在读取下一块之前写入文件）"""
+                            while True:
+                                length = response.raw.readinto(view)
+                                if not length:
+                                    return
+                                yield view[:length]
+                        
+                        if response.headers.get('content-encoding', 'identity').lower() in ('', 'identity'):
+                            chunks = read_chunks()
+                        else:
+                            # 压缩传输需要解码，由 requests 读取
+                            chunks = response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE)
+                        
+                        # 写入文件前先检查第一块数据，登录页或错误信息不会被保存为模型文件
+                        first_chunk = next(chunks, b'')
+                        check_prefix(bytes(first_chunk), filename, total_size)
+                        chunks = chain([first_chunk], chunks)
+                        
+                        with open(target_path, 'wb') as f:
+                            if total_size > 0:
+                                last_write_time = 0
+                                with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename) as pbar:
+                                    for chunk in chunks:
+                                        if control.stopped:
+                                            break
+                                        if chunk:
+                                            f.write(chunk)
+                                            hasher.feed(downloaded_size, chunk)
+                                            downloaded_size += len(chunk)
+                                            control.report(downloaded_size)
+                                            pbar.update(len(chunk))
+                                            progress = (downloaded_size / total_size * 100) if total_size > 0 else 0
+                                            progress_text = f"下载进度 / Download progress: {progress:.1f}% ({downloaded_size / 1024 / 1024:.2f} MB / {total_size / 1024 / 1024:.2f} MB)"
+                                            print(f"\r{progress_text}", end='', flush=True)
+                                        
+                            else:
+                                for chunk in chunks:
+                                    if control.stopped:
+                                        break
                                     if chunk:
                                         f.write(chunk)
+                                        hasher.feed(downloaded_size, chunk)
                                         downloaded_size += len(chunk)
-                                        pbar.update(len(chunk))
-                                        progress = (downloaded_size / total_size * 100) if total_size > 0 else 0
-                                        progress_text = f"下载进度 / Download progress: {progress:.1f}% ({downloaded_size / 1024 / 1024:.2f} MB / {total_size / 1024 / 1024:.2f} MB)"
-                                        print(f"\r{progress_text}", end='', flush=True)
-                                        
-                        else:
-                            for chunk in response.iter_content(chunk_size=block_size):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded_size += len(chunk)
-                                    print(f"\r已下载 / Downloaded: {downloaded_size / 1024 / 1024:.2f} MB", end='', flush=True)
-                            print()  # 换行
+                                        control.report(downloaded_size)
+                                        print(f"\r已下载 / Downloaded: {downloaded_size / 1024 / 1024:.2f} MB", end='', flush=True)
+                                print()  # 换行
+                        
+                        transfer_time = time.time() - transfer_start
+                        telemetry.add_phase("transfer", transfer_time)
+                        telemetry.segment(url.split('/')[2] if '://' in url else url, 0, downloaded_size, ttfb, transfer_time)
+                        
+                        if control.stopped:
+                            raise DownloadStopped()
+                        
+                        if total_size > 0 and downloaded_size != total_size:
+                            raise Exception(f"文件大小不匹配: 期望 {total_size} 字节，实际 {downloaded_size} 字节 / File size mismatch: expected {total_size} bytes, got {downloaded_size} bytes")
+                        control.sha256 = hasher.hexdigest()
+                        if expected_sha256 and control.sha256 != expected_sha256:
+                            raise Exception(f"SHA-256 校验失败: 期望 {expected_sha256}，实际 {control.sha256} / SHA-256 mismatch: expected {expected_sha256}, got {control.sha256}")
+                        validate_file(target_path, filename)
+                        os.replace(target_path, save_path)
+                except BaseException:
+                    if os.path.exists(target_path):
+                        try:
+                            os.unlink(target_path)
+                        except OSError:
+                            pass
+                    raise
+            
+            # 记录到哈希索引；与已有文件内容相同时替换为硬链接，节省磁盘空间
+            dedup_text = None
+            if control.sha256:
+                existing_path = model_index.find(control.sha256, exclude=save_path)
+                if existing_path and link_file(existing_path, save_path, allow_copy=False):
+                    dedup_text = f"与已有文件内容相同，已合并为链接 / Identical to an existing file, deduplicated via link: {existing_path}"
+                model_index.add(save_path, control.sha256)
             
             print(f"✓ 下载完成 / Download completed: {save_path}")
             print("⚠️ 请重启 ComfyUI 以使新下载的模型生效 / Please restart ComfyUI for the newly downloaded model to take effect")
             
             # 构建最终消息（不包含进度信息和保存路径）
             final_msg = f"✓ 下载完成 / Download completed: {save_path}\n⚠️ 请重启 ComfyUI 以使新下载的模型生效 / Please restart ComfyUI for the newly downloaded model to take effect"
+            if control.sha256:
+                verified_text = "校验通过 / verified" if expected_sha256 else "未校验 / not verified"
+                sha256_text = f"SHA-256: {control.sha256} ({verified_text})"
+                print(sha256_text)
+                final_msg += f"\n{sha256_text}"
+            if dedup_text:
+                print(dedup_text)
+                final_msg += f"\n{dedup_text}"
+            if delta_text:
+                final_msg += f"\n{delta_text}"
+            if mirror_set and len(mirror_set.mirrors) > 1:
+                mirror_text = f"镜像 / Mirrors: {mirror_set.summary()}"
+                print(mirror_text)
+                final_msg += f"\n{mirror_text}"
+            if retry_stats["count"]:
+                retry_text = f"分片重试 / Segment retries: {retry_stats['count']} 次/times, 重试耗时 / time spent retrying: {retry_stats['time']:.1f}s"
+                print(retry_text)
+                final_msg += f"\n{retry_text}"
+            if control.total_size:
+                control.downloaded = control.total_size
+            control.completed = True
             return {"ui": {"text": [final_msg]}}
             
+        except DownloadStopped:
+            if control.discard:
+                msg = f"已取消下载 / Download cancelled: {url}"
+            else:
+                msg = f"已暂停下载，恢复后将继续下载 / Download paused, it will continue when resumed: {url}"
+            print(f"\n{msg}")
+            return {"ui": {"text": [msg]}}
         except requests.exceptions.RequestException as e:
             error_msg = f"下载失败 / Download failed: {str(e)}"
             print(error_msg)
@@ -522,11 +2105,462 @@ class HiveModelDownloader:
             return {"ui": {"text": [error_msg]}}
 
 
+class DownloadJob:
+    """一个后台下载任务"""
+    def __init__(self, job_id, url, save_directory, sha256="", batch_id=None, update=False):
+        self.job_id = job_id
+        self.url = url
+        self.save_directory = save_directory
+        self.sha256 = sha256
+        self.update = update  # 文件已存在时更新为新版本
+        self.batch_id = batch_id  # 所属的批量下载
+        self.state = "queued"  # queued / running / paused / completed / failed / cancelled
+        self.message = ""
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.control = DownloadControl()
+        self.run_id = 0  # 每次（重新）提交加一，避免暂停后恢复时同一任务被执行两次
+
+    def to_dict(self):
+        downloaded = self.control.downloaded
+        total_size = self.control.total_size
+        return {
+            "job_id": self.job_id,
+            "batch_id": self.batch_id,
+            "update": self.update,
+            "url": self.url,
+            "save_directory": self.save_directory,
+            "state": self.state,
+            "sha256": self.control.sha256,
+            "downloaded": downloaded,
+            "total_size": total_size,
+            "progress": round(downloaded / total_size * 100, 2) if total_size > 0 else 0,
+            "speed": self.control.speed if self.state == "running" else None,
+            "eta": self.control.eta if self.state == "running" else None,
+            "segments": self.control.segments if self.state == "running" else None,
+            "message": self.message,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class DownloadJobManager:
+    """
+    后台下载任务管理器（进程内单例，跨多次 prompt 持续存在）
+    同时运行的任务数受全局上限限制，超出的任务排队等待
+    """
+    FINISHED_STATES = ("completed", "failed", "cancelled")
+
+    def __init__(self, max_concurrent_jobs=2):
+        # 可重入：提交任务时（已持有锁）会推送批次进度，而获取批次进度也需要锁
+        self.lock = threading.RLock()
+        self.jobs = {}
+        self.batches = {}  # batch_id -> [job_id]
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="hive-download")
+
+    def _find_active(self, url, save_directory):
+        """
+        查找下载同一目标文件、仍在排队或运行的任务（调用方需持有锁）
+        
+        Returns:
+            DownloadJob，没有时返回 None
+        """
+        urls = _split_urls(url)
+        if not urls:
+            return None
+        save_path = _download_destination(urls[0], save_directory)
+        for job in self.jobs.values():
+            if job.state in ("queued", "running") and _download_destination(_split_urls(job.url)[0], job.save_directory) == save_path:
+                return job
+        return None
+    
+    def submit(self, url, save_directory, sha256="", update=False):
+        """
+        提交下载任务；同一目标文件已有任务在排队或运行时不重复下载，直接返回该任务
+        
+        Args:
+            update: 文件已存在时更新为远程的新版本
+        
+        Returns:
+            DownloadJob
+        
+        Raises:
+            ValueError: 保存目录不在 models 目录之内
+        """
+        save_directory = _normalize_save_directory(save_directory)
+        with self.lock:
+            job = self._find_active(url, save_directory)
+            if job is not None:
+                return job
+            job = DownloadJob(uuid.uuid4().hex[:12], url, save_directory, sha256, update=update)
+            self.jobs[job.job_id] = job
+            self._schedule(job)
+        return job
+
+    def submit_batch(self, entries):
+        """
+        提交批量下载：每个文件一个任务，按提交顺序排队（调用方按文件大小从大到小排序，大文件先开始）
+        
+        Args:
+            entries: [{"url", "save_directory", "sha256", "total_size"}]
+        
+        Returns:
+            batch_id
+        """
+        with self.lock:
+            batch_id = uuid.uuid4().hex[:12]
+            job_ids = []
+            for entry in entries:
+                # 已有任务在下载同一文件时，批次直接使用该任务
+                job = self._find_active(entry["url"], entry["save_directory"])
+                if job is not None:
+                    job_ids.append(job.job_id)
+                    continue
+                job = DownloadJob(uuid.uuid4().hex[:12], entry["url"], entry["save_directory"], entry.get("sha256") or "", batch_id=batch_id)
+                # 预先探测到的大小，任务开始前也能计算总进度
+                job.control.total_size = entry.get("total_size") or 0
+                self.jobs[job.job_id] = job
+                job_ids.append(job.job_id)
+                self._schedule(job)
+            self.batches[batch_id] = job_ids
+        return batch_id
+
+    def get_batch(self, batch_id):
+        """
+        批量下载的总进度和每个文件的进度
+        
+        Returns:
+            dict，批次不存在时返回 None
+        """
+        with self.lock:
+            job_ids = self.batches.get(batch_id)
+            if job_ids is None:
+                return None
+            files = [self.jobs[job_id].to_dict() for job_id in job_ids]
+        downloaded = sum(f["downloaded"] for f in files)
+        total_size = sum(f["total_size"] for f in files)
+        states = set(f["state"] for f in files)
+        if states & {"queued", "running"}:
+            state = "running"
+        elif states == {"completed"}:
+            state = "completed"
+        elif "failed" in states:
+            state = "failed"
+        elif "paused" in states:
+            state = "paused"
+        else:
+            state = "cancelled"
+        completed = sum(1 for f in files if f["state"] == "completed")
+        lines = [f"完成 / Completed: {completed}/{len(files)}"]
+        for f in files:
+            filename = os.path.basename(_split_urls(f["url"])[0].split('?')[0])
+            lines.append(f"[{f['state']}] {f['save_directory']}/{filename} {f['progress']:.1f}%")
+            if f["state"] == "failed" and f["message"]:
+                lines.append(f"    {f['message']}")
+        return {
+            "batch_id": batch_id,
+            "state": state,
+            "downloaded": downloaded,
+            "total_size": total_size,
+            "progress": round(downloaded / total_size * 100, 2) if total_size > 0 else 0,
+            "message": "\n".join(lines),
+            "files": files,
+        }
+
+    def batch_job_ids(self, batch_id):
+        with self.lock:
+            return list(self.batches.get(batch_id) or [])
+
+    def _schedule(self, job):
+        """把任务放入执行队列（调用方需持有锁）"""
+        job.run_id += 1
+        job.state = "queued"
+        job.updated_at = time.time()
+        job.control.on_progress = lambda: self._publish(job)
+        self._publish(job, force=True)
+        self.executor.submit(self._run, job, job.run_id)
+
+    def _publish(self, job, force=False):
+        """
+        通过 websocket 推送任务进度（hive.download.progress）和所属批次的总进度（hive.batch.progress）
+        进度更新合并发送，状态变化时 force=True 立即发送
+        """
+        progress_events.publish("hive.download.progress", job.job_id, job.to_dict, force)
+        if job.batch_id:
+            progress_events.publish("hive.batch.progress", job.batch_id, lambda: self.get_batch(job.batch_id), force)
+
+    def _run(self, job, run_id):
+        with self.lock:
+            # 排队期间任务可能已被暂停/取消或重新提交
+            if job.run_id != run_id or job.state != "queued":
+                return
+            job.state = "running"
+            job.updated_at = time.time()
+        self._publish(job, force=True)
+        try:
+            result = HiveModelDownloader().run_download(job.url, job.save_directory, job.sha256, control=job.control, update=job.update)
+            message = result["ui"]["text"][0]
+        except Exception as e:
+            message = f"发生错误 / Error occurred: {str(e)}"
+        with self.lock:
+            job.message = message
+            job.updated_at = time.time()
+            if job.control.completed:
+                job.state = "completed"
+            elif job.control.stopped:
+                job.state = "cancelled" if job.control.discard else "paused"
+            else:
+                job.state = "failed"
+        self._publish(job, force=True)
+        progress_events.forget(job.job_id)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def pause(self, job_id):
+        """暂停任务：保留已下载的部分，恢复时从断点继续"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in ("queued", "running"):
+                return job
+            job.control.stop()
+            if job.state == "queued":
+                job.state = "paused"
+                job.updated_at = time.time()
+        self._publish(job, force=True)
+        return job
+
+    def resume(self, job_id):
+        """恢复已暂停或失败的任务"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in ("paused", "failed"):
+                return job
+            old_control = job.control
+            job.control = DownloadControl()
+            job.control.downloaded, job.control.total_size = old_control.downloaded, old_control.total_size
+            job.control.partial_files = old_control.partial_files
+            self._schedule(job)
+            return job
+
+    def cancel(self, job_id):
+        """取消任务并删除已下载的部分"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in self.FINISHED_STATES:
+                return job
+            job.control.stop(discard=True)
+            if job.state == "running":
+                return job
+            # 未在运行的任务直接标记为取消，并删除暂停时保留的续传文件
+            for path in job.control.partial_files:
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except OSError:
+                    pass
+            job.state = "cancelled"
+            job.updated_at = time.time()
+        self._publish(job, force=True)
+        return job
+
+
+download_jobs = DownloadJobManager(max_concurrent_jobs=max(1, int(os.environ.get('HIVE_MAX_DOWNLOAD_JOBS', 2))))
+
+
+def _manifest_entry(item, default_directory):
+    """把清单中的一项（对象或地址字符串）转换为 {"url", "save_directory", "sha256"}"""
+    if isinstance(item, str):
+        item = {"url": item}
+    if not isinstance(item, dict):
+        raise ValueError(f"无法识别的清单项 / Unrecognized manifest entry: {item!r}")
+    urls = item.get("urls") or item.get("url") or ""
+    if isinstance(urls, (list, tuple)):
+        urls = "\n".join(str(u) for u in urls)
+    directory = item.get("save_directory") or item.get("directory") or item.get("dir") or default_directory
+    return {"url": str(urls).strip(), "save_directory": str(directory).strip(), "sha256": str(item.get("sha256") or item.get("hash") or "").strip()}
+
+
+def parse_download_manifest(text, default_directory="checkpoints"):
+    """
+    解析批量下载清单，支持以下格式：
+    - JSON 数组（或 {"models": [...]}），每项为 {"url", "save_directory", "sha256"} 对象或地址字符串，
+      多个镜像地址可以写成数组（urls）
+    - JSON Lines：每行一个 JSON 对象
+    - YAML 列表（需要 PyYAML，ComfyUI 自带）
+    - 纯文本：每行 "地址 [镜像地址...] [保存目录] [SHA-256]"，# 开头的行为注释
+
+    Args:
+        text: 清单内容
+        default_directory: 清单项未指定保存目录时使用的目录
+
+    Returns:
+        去重后的清单项列表 [{"url", "save_directory", "sha256"}]
+    """
+    text = (text or "").strip()
+    items = None
+    if text.startswith("[") or text.startswith("{"):
+        try:
+            data = json.loads(text)
+            items = data.get("models", []) if isinstance(data, dict) else data
+        except ValueError:
+            # 不是单个 JSON 文档，按 JSON Lines 解析
+            items = [json.loads(line) for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+    elif text.startswith("-") or text.startswith("models:"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML 清单需要安装 PyYAML / YAML manifests require PyYAML")
+        data = yaml.safe_load(text)
+        items = data.get("models", []) if isinstance(data, dict) else data
+    if items is None:
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = {"urls": [], "sha256": ""}
+            for token in line.split():
+                if "://" in token:
+                    entry["urls"].append(token)
+                elif _normalize_sha256(token) == token.lower():
+                    entry["sha256"] = token
+                else:
+                    entry["save_directory"] = token
+            items.append(entry)
+    if not isinstance(items, list):
+        raise ValueError("清单应为列表 / The manifest should be a list")
+
+    entries = []
+    seen = set()
+    for item in items:
+        entry = _manifest_entry(item, default_directory)
+        if not entry["url"]:
+            raise ValueError(f"清单项缺少下载地址 / Manifest entry without URL: {item!r}")
+        # 保存目录必须在 models 目录之内
+        entry["save_directory"] = _normalize_save_directory(entry["save_directory"])
+        # 同一目录下的同一地址（或同一 SHA-256）只下载一次
+        keys = [(_split_urls(entry["url"])[0], entry["save_directory"])]
+        sha256 = _normalize_sha256(entry["sha256"])
+        if sha256:
+            keys.append((sha256, entry["save_directory"]))
+        if any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        entries.append(entry)
+    return entries
+
+
+class HiveBatchModelDownloader:
+    """
+    批量模型下载器节点
+    粘贴包含多个模型的清单，一次提交全部下载任务，显示总进度和每个文件的进度
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        models_subdirs = comfy_paths.models_subdirs()
+        return {
+            "required": {
+                "manifest": ("STRING", {
+                    "name": "下载清单/download manifest",
+                    "multiline": True,
+                    "default": "",
+                    "placeholder": "每行一个：地址 [保存目录] [SHA-256]，也支持 JSON/YAML",
+                    "tooltip": "每行一个模型：地址 [保存目录] [SHA-256]；也支持 JSON 数组、JSON Lines 和 YAML 列表（字段 url/save_directory/sha256） / one model per line: URL [save directory] [SHA-256]; JSON arrays, JSON Lines and YAML lists with url/save_directory/sha256 fields are also accepted"
+                }),
+                "save_directory": (models_subdirs, {
+                    "name": "默认保存目录/default save directory",
+                    "tooltip": "清单中未指定保存目录时使用 / used for entries without a save directory",
+                    "default": models_subdirs[0] if models_subdirs else "checkpoints"
+                }),
+            },
+            "optional": {}
+        }
+    
+    RETURN_TYPES = ()
+    FUNCTION = "download_models"
+    OUTPUT_NODE = True
+    CATEGORY = "Hive/Download"
+    # 注意语言文件中不能用@符号
+    DESCRIPTION = "批量模型下载器 - 粘贴包含多个模型地址的清单，一次下载工作流需要的全部模型。/ Batch model downloader - paste a manifest of model URLs and download every model a workflow needs in one go. - Github: https://github.com/luguoli - 📧Email: luguoli﹫vip.qq.com"
+    
+    def download_models(self, manifest, save_directory="checkpoints"):
+        """
+        解析清单，并行获取所有文件的大小，然后提交批量后台下载
+        
+        Args:
+            manifest: 下载清单
+            save_directory: 默认保存目录
+        
+        Returns:
+            status: 提交结果和批次 ID
+        """
+        try:
+            entries = parse_download_manifest(manifest, save_directory)
+        except (ValueError, TypeError) as e:
+            return {"ui": {"text": [f"错误: 清单格式无效 / Error: Invalid manifest: {str(e)}"]}}
+        if not entries:
+            return {"ui": {"text": ["错误: 清单为空 / Error: The manifest is empty"]}}
+        
+        # 并行获取所有文件的大小；主地址不可用且没有镜像的文件直接报告，不提交任务
+        probes = _probe_mirrors([_split_urls(entry["url"])[0] for entry in entries])
+        accepted = []
+        lines = []
+        for entry, (probe_url, response, error) in zip(entries, probes):
+            if response is None and len(_split_urls(entry["url"])) == 1:
+                lines.append(f"✗ {probe_url}: {error}")
+                continue
+            entry["total_size"] = int(response.headers.get('content-length', 0)) if response is not None else 0
+            accepted.append(entry)
+        if not accepted:
+            return {"ui": {"text": ["错误: 清单中的地址都不可用 / Error: None of the manifest URLs are reachable\n" + "\n".join(lines)]}}
+        
+        # 大文件先开始，缩短整批下载的总时间
+        accepted.sort(key=lambda entry: entry["total_size"], reverse=True)
+        batch_id = download_jobs.submit_batch(accepted)
+        total_size = sum(entry["total_size"] for entry in accepted)
+        for entry in accepted:
+            filename = os.path.basename(_split_urls(entry["url"])[0].split('?')[0])
+            lines.append(f"• {entry['save_directory']}/{filename} ({entry['total_size'] / 1024 / 1024:.1f} MB)")
+        msg = f"已提交 {len(accepted)} 个下载任务，共 {total_size / 1024 / 1024:.1f} MB（批次 ID: {batch_id}） / Submitted {len(accepted)} downloads, {total_size / 1024 / 1024:.1f} MB in total (batch ID: {batch_id})\n" + "\n".join(lines)
+        print(msg)
+        return {"ui": {"text": [msg], "batch_id": [batch_id]}}
+
+
+# 节点安装方式：shallow 只获取最新提交，blobless 获取提交历史但按需下载文件内容，full 完整克隆
+GIT_INSTALL_MODES = ["shallow", "blobless", "full"]
+
+# 节点仓库的本地裸镜像缓存目录（多个 ComfyUI 实例、容器共用），未设置时不使用缓存
+GIT_CACHE_DIR = os.environ.get('HIVE_GIT_CACHE') or None
+
+# 批量安装时同时安装的节点数
+NODE_INSTALL_WORKERS = max(1, int(os.environ.get('HIVE_MAX_INSTALL_JOBS', 4)))
+
+
+def _is_commit_sha(ref):
+    """ref 是否为提交哈希（7~40 位十六进制）"""
+    return bool(ref) and re.fullmatch(r'[0-9a-fA-F]{7,40}', ref) is not None
+
+
+def _mirror_name(git_url):
+    """镜像目录名：仓库名 + 规范化 URL 的哈希（同名的不同仓库互不冲突）"""
+    repo_name = os.path.basename(git_url.rstrip('/')).replace('.git', '') or 'repo'
+    return f"{repo_name}-{hashlib.sha1(git_url.encode('utf-8')).hexdigest()[:12]}.git"
+
+
 class HiveNodeInstaller:
     """
     节点安装器
     用户可以粘贴节点的安装地址（GitHub/GitLab/Gitee等），自动安装到 ComfyUI 的 custom_nodes 目录
     """
+    # git 输出的前缀（批量安装时用于区分各个节点）
+    log_prefix = ""
+    
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -539,7 +2573,20 @@ class HiveNodeInstaller:
                     "placeholder": "请将节点安装地址粘贴进来（GitHub/GitLab/Gitee等）",
                 }),
             },
-            "optional": {}
+            "optional": {
+                "install_mode": (GIT_INSTALL_MODES, {
+                    "name": "安装方式/install mode",
+                    "default": "shallow",
+                    "tooltip": "shallow：只下载最新版本（最快）；blobless：保留提交历史，文件内容按需下载；full：完整克隆 / shallow: latest version only (fastest); blobless: keep the commit history but fetch file contents on demand; full: complete clone"
+                }),
+                "ref": ("STRING", {
+                    "name": "版本/branch, tag or commit",
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "可选：分支、标签或提交，留空使用默认分支",
+                    "tooltip": "可选：安装指定的分支、标签或提交；留空使用默认分支 / optional: branch, tag or commit to install; the default branch is used when empty"
+                }),
+            }
         }
     
     RETURN_TYPES = ()
@@ -556,34 +2603,7 @@ class HiveNodeInstaller:
         Returns:
             custom_nodes 目录路径，如果找不到则返回 None
         """
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 方法1: 当前文件就在 custom_nodes 目录下
-        if os.path.basename(os.path.dirname(current_dir)) == "custom_nodes":
-            return os.path.dirname(current_dir)
-        
-        # 方法2: 向上查找 custom_nodes 目录
-        check_dir = current_dir
-        for _ in range(5):  # 最多向上查找5层
-            if os.path.basename(check_dir) == "custom_nodes":
-                return check_dir
-            parent = os.path.dirname(check_dir)
-            if parent == check_dir:
-                break
-            check_dir = parent
-        
-        # 方法3: 查找 ComfyUI 根目录下的 custom_nodes
-        check_dir = current_dir
-        for _ in range(5):
-            custom_nodes_path = os.path.join(check_dir, "custom_nodes")
-            if os.path.exists(custom_nodes_path) and os.path.isdir(custom_nodes_path):
-                return custom_nodes_path
-            parent = os.path.dirname(check_dir)
-            if parent == check_dir:
-                break
-            check_dir = parent
-        
-        return None
+        return comfy_paths.custom_nodes_dir
     
     def normalize_git_url(self, url):
         """
@@ -628,12 +2648,14 @@ class HiveNodeInstaller:
         
         return url
     
-    def install_node(self, url):
+    def install_node(self, url, install_mode="shallow", ref=""):
         """
         安装节点
         
         Args:
             url: 节点的安装地址（Git 仓库 URL 或 ZIP 文件 URL）
+            install_mode: Git 仓库的安装方式 shallow / blobless / full
+            ref: 可选的分支、标签或提交
         
         Returns:
             status: 安装状态信息
@@ -645,24 +2667,12 @@ class HiveNodeInstaller:
         
         try:
             # 查找 custom_nodes 目录
-            custom_nodes_dir = self.find_comfyui_custom_nodes_dir()
-            
-            if not custom_nodes_dir:
-                # 如果找不到，尝试使用当前目录的父目录
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                custom_nodes_dir = os.path.join(os.path.dirname(current_dir), "custom_nodes")
-                os.makedirs(custom_nodes_dir, exist_ok=True)
-                print(f"警告: 未找到 ComfyUI custom_nodes 目录，使用 / Warning: ComfyUI custom_nodes directory not found, using: {custom_nodes_dir}")
-            else:
-                print(f"找到 custom_nodes 目录 / Found custom_nodes directory: {custom_nodes_dir}")
+            custom_nodes_dir = self.resolve_custom_nodes_dir()
             
             # 判断是 Git 仓库还是 ZIP 文件
-            is_git_repo = any(domain in url.lower() for domain in ['github.com', 'gitlab.com', 'gitee.com', 'git@'])
-            is_zip_file = url.lower().endswith('.zip') or '/archive/' in url.lower()
-            
-            if is_git_repo and not is_zip_file:
+            if self.is_git_url(url):
                 # Git 仓库安装
-                return self._install_from_git(url, custom_nodes_dir)
+                return self._install_from_git(url, custom_nodes_dir, install_mode, ref)
             else:
                 # ZIP 文件安装
                 return self._install_from_zip(url, custom_nodes_dir)
@@ -674,21 +2684,338 @@ class HiveNodeInstaller:
             traceback.print_exc()
             return (error_msg,)
     
-    def _install_from_git(self, url, custom_nodes_dir):
+    def resolve_custom_nodes_dir(self):
+        """
+        查找 custom_nodes 目录，找不到时使用插件目录的上一级下的 custom_nodes
+        
+        Returns:
+            custom_nodes 目录路径
+        """
+        custom_nodes_dir = self.find_comfyui_custom_nodes_dir()
+        
+        if not custom_nodes_dir:
+            # 如果找不到，尝试使用当前目录的父目录
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            custom_nodes_dir = os.path.join(os.path.dirname(current_dir), "custom_nodes")
+            os.makedirs(custom_nodes_dir, exist_ok=True)
+            print(f"警告: 未找到 ComfyUI custom_nodes 目录，使用 / Warning: ComfyUI custom_nodes directory not found, using: {custom_nodes_dir}")
+        else:
+            print(f"找到 custom_nodes 目录 / Found custom_nodes directory: {custom_nodes_dir}")
+        return custom_nodes_dir
+    
+    @staticmethod
+    def is_git_url(url):
+        """判断地址是 Git 仓库还是 ZIP 文件"""
+        is_git_repo = any(domain in url.lower() for domain in ['github.com', 'gitlab.com', 'gitee.com', 'git@']) or url.lower().rstrip('/').endswith('.git')
+        is_zip_file = url.lower().endswith('.zip') or '/archive/' in url.lower()
+        return is_git_repo and not is_zip_file
+    
+    def _run_git(self, args, cwd=None):
+        """
+        运行 git 命令，实时输出进度
+        
+        Args:
+            args: git 之后的参数列表
+            cwd: 工作目录
+        
+        Returns:
+            (返回码, 输出行列表)
+        """
+        process = subprocess.Popen(
+            ['git'] + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        output_lines = []
+        for line in process.stdout:
+            line = line.strip()
+            if line:
+                print(f"{self.log_prefix}{line}")
+                output_lines.append(line)
+        process.wait()
+        return process.returncode, output_lines
+    
+    def _git_output(self, args, cwd):
+        """运行 git 命令并返回输出（失败时返回 None）"""
+        result = subprocess.run(['git'] + args, cwd=cwd, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+    
+    def _ref_from_tree_url(self, url, git_url):
+        """
+        从网页地址（.../tree/<分支>/<目录>）中取出分支或标签
+        /tree/ 之后既可能是分支名（可以包含 /），也可能带有仓库中的目录，
+        按远程实际存在的分支和标签取最长的匹配；无法确定时使用默认分支
+        
+        Args:
+            url: 网页地址
+            git_url: 规范化后的仓库地址
+        
+        Returns:
+            分支、标签或提交；无法确定时返回空字符串
+        """
+        parts = [part for part in url.split('/tree/', 1)[1].split('?')[0].split('#')[0].split('/') if part]
+        if not parts:
+            return ""
+        try:
+            # 禁止 git 询问账号密码，需要认证的仓库直接报错而不是卡住
+            result = subprocess.run(
+                ['git', 'ls-remote', '--heads', '--tags', git_url],
+                capture_output=True, text=True, timeout=60,
+                env=dict(os.environ, GIT_TERMINAL_PROMPT='0')
+            )
+            refs = set()
+            if result.returncode == 0:
+                for line in result.stdout.splitlines():
+                    name = line.split('\t', 1)[-1]
+                    for prefix in ('refs/heads/', 'refs/tags/'):
+                        if name.startswith(prefix):
+                            refs.add(name[len(prefix):].replace('^{}', ''))
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            refs = set()
+        for length in range(len(parts), 0, -1):
+            candidate = '/'.join(parts[:length])
+            if candidate in refs:
+                return candidate
+        if _is_commit_sha(parts[0]):
+            return parts[0]
+        print(f"[警告] 无法确定网页地址中的分支，使用默认分支 / [Warning] Could not determine the branch in the web URL, using the default branch: {url}")
+        return ""
+    
+    def _clone_repo(self, git_url, install_path, mode="shallow", ref=""):
+        """
+        克隆仓库
+        shallow：只获取最新一次提交（--depth 1 --single-branch）
+        blobless：获取提交历史，但文件内容只下载检出需要的（--filter=blob:none --single-branch）
+        full：完整克隆
+        
+        Args:
+            git_url: 仓库地址
+            install_path: 安装目录
+            mode: 安装方式 shallow / blobless / full
+            ref: 可选的分支、标签或提交
+        
+        Returns:
+            (返回码, 输出行列表)
+        """
+        depth_args = {"shallow": ['--depth', '1'], "blobless": ['--filter=blob:none'], "full": []}[mode]
+        
+        if _is_commit_sha(ref) and len(ref) == 40 and mode != "full":
+            # 固定到某个提交：git clone --branch 不接受提交哈希，初始化空仓库后只获取该提交
+            os.makedirs(install_path)
+            commands = [
+                ['init', '--quiet'],
+                ['remote', 'add', 'origin', git_url],
+                ['fetch', '--progress'] + depth_args + ['origin', ref],
+                ['checkout', '--detach', 'FETCH_HEAD'],
+            ]
+            for args in commands:
+                returncode, output_lines = self._run_git(args, cwd=install_path)
+                if returncode != 0:
+                    shutil.rmtree(install_path, ignore_errors=True)
+                    break
+            else:
+                return returncode, output_lines
+            # 服务器不允许直接获取提交（或提交不在任何分支上）时，改为获取全部历史后检出
+            print("无法直接获取该提交，改为克隆后检出 / Cannot fetch the commit directly, cloning and checking it out instead")
+        
+        if _is_commit_sha(ref):
+            # 提交（包括短哈希）：克隆全部历史后检出，不能使用 --depth 和 --single-branch（浅克隆改为 blobless）
+            if mode == "shallow":
+                depth_args = ['--filter=blob:none']
+            returncode, output_lines = self._run_git(['clone', '--progress'] + depth_args + [git_url, install_path])
+            if returncode == 0:
+                returncode, output_lines = self._run_git(['checkout', '--detach', ref], cwd=install_path)
+                if returncode != 0:
+                    shutil.rmtree(install_path, ignore_errors=True)
+            return returncode, output_lines
+        
+        args = ['clone', '--progress'] + depth_args
+        if mode != "full":
+            args.append('--single-branch')
+        if ref:
+            args += ['--branch', ref]
+        return self._run_git(args + [git_url, install_path])
+    
+    def _update_mirror(self, git_url):
+        """
+        创建或增量更新仓库的本地裸镜像（只包含分支和标签）
+        多个进程同时使用同一个镜像时用文件锁排队；无法联网时继续使用已有的镜像
+        
+        Args:
+            git_url: 规范化后的仓库地址
+        
+        Returns:
+            镜像路径，无法创建镜像时返回 None
+        """
+        mirror_path = os.path.join(GIT_CACHE_DIR, _mirror_name(git_url))
+        try:
+            os.makedirs(GIT_CACHE_DIR, exist_ok=True)
+            lock = FileLock(mirror_path + '.lock')
+            if not lock.acquire():
+                print("另一个进程正在更新镜像，等待其完成 / Another process is updating the mirror, waiting for it to finish")
+                while not lock.acquire():
+                    time.sleep(0.2)
+        except OSError as e:
+            print(f"[警告] 无法使用镜像缓存 / [Warning] Failed to use the mirror cache: {e}")
+            return None
+        try:
+            if os.path.isdir(mirror_path):
+                print(f"更新镜像 / Updating mirror: {mirror_path}")
+                returncode, _ = self._run_git(['fetch', '--progress', '--prune', '--tags', 'origin'], cwd=mirror_path)
+                if returncode != 0:
+                    print("镜像更新失败，使用缓存中的版本 / Failed to update the mirror, using the cached version")
+                return mirror_path
+            
+            print(f"创建镜像 / Creating mirror: {mirror_path}")
+            # 先克隆到临时目录，中断时不会留下不完整的镜像
+            tmp_path = f"{mirror_path}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            returncode, _ = self._run_git(['clone', '--bare', '--progress', git_url, tmp_path])
+            if returncode != 0:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                return None
+            # 裸克隆默认不配置 fetch 规则；节点通过 alternates 引用镜像中的对象，镜像不能自动 gc 清理对象
+            self._run_git(['config', 'remote.origin.fetch', '+refs/heads/*:refs/heads/*'], cwd=tmp_path)
+            self._run_git(['config', 'gc.auto', '0'], cwd=tmp_path)
+            os.replace(tmp_path, mirror_path)
+            return mirror_path
+        finally:
+            lock.release()
+    
+    def _clone_from_mirror(self, mirror_path, git_url, install_path, ref=""):
+        """
+        从本地镜像克隆（--shared，通过 alternates 共用镜像中的对象，不复制也不联网），
+        然后把 origin 指回原仓库地址
+        
+        Args:
+            mirror_path: 镜像路径
+            git_url: 原仓库地址
+            install_path: 安装目录
+            ref: 可选的分支、标签或提交
+        
+        Returns:
+            (返回码, 输出行列表)
+        """
+        args = ['clone', '--shared', '--progress']
+        if ref and not _is_commit_sha(ref):
+            args += ['--branch', ref]
+        returncode, output_lines = self._run_git(args + [mirror_path, install_path])
+        if returncode == 0 and _is_commit_sha(ref):
+            returncode, output_lines = self._run_git(['checkout', '--detach', ref], cwd=install_path)
+        if returncode == 0:
+            returncode, output_lines = self._run_git(['remote', 'set-url', 'origin', git_url], cwd=install_path)
+        if returncode != 0:
+            shutil.rmtree(install_path, ignore_errors=True)
+        return returncode, output_lines
+    
+    def _has_local_commits(self, install_path, branch):
+        """
+        当前分支是否有远程没有的提交（本地提交）
+        有 origin/<分支> 时比较两者；没有时浅克隆的 HEAD 仍是获取到的提交（在 .git/shallow 中）说明没有本地提交
+        
+        Returns:
+            是否有本地提交（无法判断时视为有）
+        """
+        tracking = self._git_output(['rev-parse', '--verify', '-q', f'refs/remotes/origin/{branch}'], install_path)
+        if tracking:
+            count = self._git_output(['rev-list', '--count', f'{tracking}..HEAD'], install_path)
+            return count != '0'
+        head = self._git_output(['rev-parse', 'HEAD'], install_path)
+        try:
+            with open(os.path.join(install_path, '.git', 'shallow'), 'r', encoding='utf-8') as f:
+                return head not in f.read().split()
+        except OSError:
+            return True
+    
+    def _update_repo(self, install_path, ref="", source=None):
+        """
+        更新已安装的仓库：只获取需要的分支（浅克隆的仓库只获取最新提交），然后快进
+        
+        Args:
+            install_path: 安装目录
+            ref: 可选的分支、标签或提交；与当前分支不同时切换过去（分离 HEAD）
+            source: 获取更新的来源（本地镜像路径），默认为 origin
+        
+        Returns:
+            节点输出，"status" 为 updated / up_to_date / skipped / failed
+        """
+        source = source or 'origin'
+        shallow = os.path.exists(os.path.join(install_path, '.git', 'shallow'))
+        depth_args = ['--depth', '1'] if shallow else []
+        branch = self._git_output(['rev-parse', '--abbrev-ref', 'HEAD'], install_path)
+        old_head = self._git_output(['rev-parse', 'HEAD'], install_path)
+        
+        if not ref and branch == 'HEAD':
+            # 安装时固定到了标签或提交
+            return {"ui": {"text": [f"节点已固定到 {old_head[:12] if old_head else 'HEAD'}，未更新；如需切换版本请指定分支、标签或提交 / The node is pinned to {old_head[:12] if old_head else 'HEAD'} and was not updated; specify a branch, tag or commit to switch versions\n{install_path}"]}, "status": "skipped"}
+        target = ref or branch
+        # 获取前判断本地是否有远程没有的提交（获取会更新 origin/<分支>）：
+        # 浅克隆无法快进时会直接移动到远程的最新提交，只有没有本地提交时才允许
+        local_commits = shallow and not (ref and ref != branch) and self._has_local_commits(install_path, branch)
+        
+        if _is_commit_sha(ref) and self._git_output(['cat-file', '-e', f'{ref}^{{commit}}'], install_path) is not None:
+            # 本地已有该提交，直接检出
+            returncode, output_lines = 0, []
+        elif _is_commit_sha(ref) and len(ref) < 40:
+            # 短哈希无法直接获取，获取完整历史后检出
+            unshallow_args = ['--unshallow'] if shallow else []
+            returncode, output_lines = self._run_git(['fetch', '--progress'] + unshallow_args + [source], cwd=install_path)
+        else:
+            refspec = target
+            if source != 'origin' and target == branch:
+                # 从镜像获取时同时更新 origin/<分支>，与直接从 origin 获取的结果一致
+                refspec = f'+refs/heads/{target}:refs/remotes/origin/{target}'
+            returncode, output_lines = self._run_git(['fetch', '--progress'] + depth_args + [source, refspec], cwd=install_path)
+        if returncode != 0:
+            return {"ui": {"text": [f"更新失败，返回码 / Update failed, return code: {returncode}\n{chr(10).join(output_lines[-5:])}\n请手动删除 {install_path} 后重新安装 / Please manually delete {install_path} and reinstall"]}, "status": "failed"}
+        
+        if ref and ref != branch:
+            # 切换到指定的标签、提交或其他分支
+            checkout_target = ref if _is_commit_sha(ref) else 'FETCH_HEAD'
+            returncode, output_lines = self._run_git(['checkout', '--detach', checkout_target], cwd=install_path)
+        else:
+            returncode, output_lines = self._run_git(['merge', '--ff-only', 'FETCH_HEAD'], cwd=install_path)
+            if returncode != 0 and shallow and not local_commits:
+                # 浅克隆只有最新提交，新旧提交之间的历史不在本地，无法判断快进关系：
+                # 没有本地提交时直接移动到远程的最新提交（--keep 保留未提交的本地修改，有冲突时放弃）
+                returncode, output_lines = self._run_git(['reset', '--keep', 'FETCH_HEAD'], cwd=install_path)
+        if returncode != 0:
+            return {"ui": {"text": [f"更新失败（本地有修改或与远程分叉） / Update failed (local changes or diverged from the remote)\n{chr(10).join(output_lines[-5:])}\n请手动删除 {install_path} 后重新安装 / Please manually delete {install_path} and reinstall"]}, "status": "failed"}
+        
+        new_head = self._git_output(['rev-parse', 'HEAD'], install_path)
+        if new_head == old_head:
+            msg = f"✓ 节点已是最新版本 / The node is already up to date: {install_path}"
+            print(msg)
+            return {"ui": {"text": [msg]}, "status": "up_to_date"}
+        print(f"✓ 更新完成 / Update completed: {install_path}")
+        print("⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect")
+        return {"ui": {"text": [f"✓ 更新完成 / Update completed: {install_path} ({(old_head or '')[:7]} → {(new_head or '')[:7]})\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}, "status": "updated"}
+    
+    def _install_from_git(self, url, custom_nodes_dir, mode="shallow", ref=""):
         """
         从 Git 仓库安装节点
         
         Args:
             url: Git 仓库 URL
             custom_nodes_dir: custom_nodes 目录路径
+            mode: 安装方式 shallow / blobless / full
+            ref: 可选的分支、标签或提交
         
         Returns:
-            status: 安装状态信息
+            status: 安装状态信息，"status" 为 installed / updated / up_to_date / skipped / failed
         """
         try:
             # 规范化 URL
             git_url = self.normalize_git_url(url)
             
+            # 网页地址中的分支（.../tree/<分支>）在没有指定版本时使用
+            ref = (ref or "").strip()
+            if not ref and '/tree/' in url:
+                ref = self._ref_from_tree_url(url, git_url)
+            
             # 提取仓库名称
             repo_name = os.path.basename(git_url).replace('.git', '')
             if not repo_name:
@@ -699,41 +3026,20 @@ class HiveNodeInstaller:
             
             # 检查是否已存在
             if os.path.exists(install_path):
-                # 如果已存在，尝试更新（使用 git pull）
+                # 如果已存在，尝试更新
                 print(f"节点已存在 / Node already exists: {install_path}")
                 print("尝试更新节点... / Attempting to update node...")
                 try:
                     # 检查是否是 git 仓库
                     git_dir = os.path.join(install_path, '.git')
                     if os.path.exists(git_dir):
-                        # 使用 git pull 更新
-                        process = subprocess.Popen(
-                            ['git', 'pull'],
-                            cwd=install_path,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            universal_newlines=True,
-                            bufsize=1
-                        )
-                        output_lines = []
-                        for line in process.stdout:
-                            line = line.strip()
-                            if line:
-                                print(line)
-                                output_lines.append(line)
-                        process.wait()
-                        
-                        if process.returncode == 0:
-                            print(f"✓ 更新完成 / Update completed: {install_path}")
-                            print("⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect")
-                            return {"ui": {"text": [f"✓ 更新完成 / Update completed: {install_path}\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}}
-                        else:
-                            return {"ui": {"text": [f"更新失败，返回码 / Update failed, return code: {process.returncode}\n请手动删除 {install_path} 后重新安装 / Please manually delete {install_path} and reinstall"]}}
+                        mirror_path = self._update_mirror(git_url) if GIT_CACHE_DIR else None
+                        return self._update_repo(install_path, ref, mirror_path)
                     else:
                         # 不是 git 仓库，需要删除后重新安装
-                        return {"ui": {"text": [f"节点已存在但不是 Git 仓库 / Node exists but is not a Git repository: {install_path}\n如需重新安装，请手动删除该目录后再次运行 / To reinstall, please manually delete this directory and run again"]}}
+                        return {"ui": {"text": [f"节点已存在但不是 Git 仓库 / Node exists but is not a Git repository: {install_path}\n如需重新安装，请手动删除该目录后再次运行 / To reinstall, please manually delete this directory and run again"]}, "status": "skipped"}
                 except Exception as e:
-                    return {"ui": {"text": [f"更新失败 / Update failed: {str(e)}\n请手动删除 {install_path} 后重新安装 / Please manually delete {install_path} and reinstall"]}}
+                    return {"ui": {"text": [f"更新失败 / Update failed: {str(e)}\n请手动删除 {install_path} 后重新安装 / Please manually delete {install_path} and reinstall"]}, "status": "failed"}
             
             print(f"开始克隆仓库 / Starting to clone repository: {git_url}")
             print(f"安装到 / Installing to: {install_path}")
@@ -742,43 +3048,33 @@ class HiveNodeInstaller:
             try:
                 subprocess.run(['git', '--version'], check=True, capture_output=True)
             except (subprocess.CalledProcessError, FileNotFoundError):
-                return {"ui": {"text": ["错误: 未找到 git 命令，请先安装 Git / Error: Git command not found, please install Git first"]}}
-            
-            # 克隆仓库
-            # 使用 subprocess 并显示进度
-            process = subprocess.Popen(
-                ['git', 'clone', '--progress', git_url, install_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-            
-            # 实时输出进度
-            output_lines = []
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    print(line)
-                    output_lines.append(line)
+                return {"ui": {"text": ["错误: 未找到 git 命令，请先安装 Git / Error: Git command not found, please install Git first"]}, "status": "failed"}
             
-            process.wait()
+            # 设置了镜像缓存时从本地镜像克隆，否则直接克隆（默认只获取最新提交）
+            returncode = None
+            mirror_path = self._update_mirror(git_url) if GIT_CACHE_DIR else None
+            if mirror_path:
+                returncode, output_lines = self._clone_from_mirror(mirror_path, git_url, install_path, ref)
+                if returncode != 0:
+                    print("从镜像克隆失败，改为直接克隆 / Failed to clone from the mirror, cloning from the remote instead")
+            if returncode != 0:
+                returncode, output_lines = self._clone_repo(git_url, install_path, mode, ref)
             
-            if process.returncode == 0:
+            if returncode == 0:
                 print(f"✓ 安装完成 / Installation completed: {install_path}")
                 print("⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect")
-                return {"ui": {"text": [f"✓ 安装完成 / Installation completed: {install_path}\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}}
+                return {"ui": {"text": [f"✓ 安装完成 / Installation completed: {install_path}\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}, "status": "installed"}
             else:
-                error_msg = f"Git 克隆失败，返回码 / Git clone failed, return code: {process.returncode}"
+                error_msg = f"Git 克隆失败，返回码 / Git clone failed, return code: {returncode}"
                 print(error_msg)
-                return {"ui": {"text": [error_msg]}}
+                return {"ui": {"text": [error_msg]}, "status": "failed"}
                 
         except Exception as e:
             error_msg = f"Git 安装失败 / Git installation failed: {str(e)}"
             print(error_msg)
             import traceback
             traceback.print_exc()
-            return {"ui": {"text": [error_msg]}}
+            return {"ui": {"text": [error_msg]}, "status": "failed"}
     
     def _install_from_zip(self, url, custom_nodes_dir):
         """
@@ -789,112 +3085,405 @@ class HiveNodeInstaller:
             custom_nodes_dir: custom_nodes 目录路径
         
         Returns:
-            status: 安装状态信息
+            status: 安装状态信息，"status" 为 installed / up_to_date / failed
         """
         try:
             print(f"开始下载 ZIP 文件 / Starting to download ZIP file: {url}")
             
-            # 下载 ZIP 文件 - 优化下载速度
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            
-            response = session.get(url, stream=True, timeout=(30, 300))  # 连接超时30秒，读取超时300秒
-            response.raise_for_status()
-            
-            # 获取文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            
-            # 下载到临时文件
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-            temp_path = temp_file.name
+            # 下载 ZIP 文件 - 使用全局共享连接池
+            session = get_http_session()
             
-            try:
-                downloaded_size = 0
-                block_size = 2 * 1024 * 1024  # 2MB 块大小（提高下载速度）
+            # 连接超时30秒，读取超时300秒；出错时也关闭连接
+            with session.get(url, stream=True, timeout=(30, 300)) as response:
+                response.raise_for_status()
+                
+                # 获取文件大小
+                total_size = int(response.headers.get('content-length', 0))
                 
-                with open(temp_path, 'wb') as f:
+                # 边下载边解压：已经完整到达的成员立即并行解压，磁盘上内容相同的文件跳过
+                with ZipStreamExtractor(custom_nodes_dir) as extractor:
+                    downloaded_size = 0
+                    block_size = 2 * 1024 * 1024  # 2MB 块大小（提高下载速度）
+                    
                     if total_size > 0:
-                        with tqdm(total=total_size, unit='B', unit_scale=True, desc="下载中 / Downloading") as pbar:
+                        with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"{self.log_prefix}下载中 / Downloading") as pbar:
                             for chunk in response.iter_content(chunk_size=block_size):
                                 if chunk:
-                                    f.write(chunk)
+                                    extractor.feed(chunk)
                                     downloaded_size += len(chunk)
                                     pbar.update(len(chunk))
                     else:
                         for chunk in response.iter_content(chunk_size=block_size):
                             if chunk:
-                                f.write(chunk)
+                                extractor.feed(chunk)
                                 downloaded_size += len(chunk)
                                 print(f"\r已下载 / Downloaded: {downloaded_size / 1024 / 1024:.2f} MB", end='', flush=True)
                         print()
-                
-                print("开始解压... / Starting to extract...")
-                
-                # 解压 ZIP 文件
-                with zipfile.ZipFile(temp_path, 'r') as zip_ref:
-                    # 获取 ZIP 文件中的所有文件列表
-                    file_list = zip_ref.namelist()
-                    
-                    # 查找根目录名称（通常是第一个目录）
-                    root_dir = None
-                    for name in file_list:
-                        if '/' in name:
-                            root_dir = name.split('/')[0]
-                            break
-                    
-                    # 检查根目录是否已存在
-                    if root_dir:
-                        extracted_path = os.path.join(custom_nodes_dir, root_dir)
-                        if os.path.exists(extracted_path):
-                            print(f"警告: 节点目录已存在 / Warning: Node directory already exists: {extracted_path}")
-                            print("将覆盖现有文件... / Will overwrite existing files...")
                     
-                    # 解压文件
-                    total_files = len(file_list)
-                    extracted = 0
-                    
-                    with tqdm(total=total_files, unit='files', desc="解压中 / Extracting") as pbar:
-                        for member in zip_ref.namelist():
-                            zip_ref.extract(member, custom_nodes_dir)
-                            extracted += 1
-                            pbar.update(1)
-                    
-                    # 如果 ZIP 文件包含单个根目录，显示安装路径
-                    if root_dir:
-                        extracted_path = os.path.join(custom_nodes_dir, root_dir)
-                        print(f"节点安装路径 / Node installation path: {extracted_path}")
-                
-                print(f"✓ 安装完成 / Installation completed: {custom_nodes_dir}")
-                print("⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect")
-                return {"ui": {"text": [f"✓ 安装完成 / Installation completed: {custom_nodes_dir}\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}}
-                
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+                    print(f"{self.log_prefix}完成解压... / Finishing extraction...")
+                    file_list = extractor.finish()
+                    print(f"{self.log_prefix}写入 {extractor.extracted} 个文件，{extractor.skipped} 个未变化已跳过 / {extractor.extracted} files written, {extractor.skipped} unchanged files skipped")
+            
+            # 如果 ZIP 文件包含单个根目录，显示安装路径
+            root_dir = None
+            for name in file_list:
+                if '/' in name:
+                    root_dir = name.split('/')[0]
+                    break
+            if root_dir:
+                extracted_path = os.path.join(custom_nodes_dir, root_dir)
+                print(f"节点安装路径 / Node installation path: {extracted_path}")
+            
+            if not extractor.extracted and extractor.skipped:
+                # 所有文件都与磁盘上的相同，无需重启
+                msg = f"✓ 节点已是最新版本 / The node is already up to date: {extracted_path if root_dir else custom_nodes_dir}"
+                print(msg)
+                return {"ui": {"text": [msg]}, "status": "up_to_date"}
+            
+            print(f"✓ 安装完成 / Installation completed: {custom_nodes_dir}")
+            print("⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect")
+            return {"ui": {"text": [f"✓ 安装完成 / Installation completed: {custom_nodes_dir}\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"]}, "status": "installed"}
                     
         except zipfile.BadZipFile:
             error_msg = "错误: 下载的文件不是有效的 ZIP 文件 / Error: The downloaded file is not a valid ZIP file"
             print(error_msg)
-            return {"ui": {"text": [error_msg]}}
+            return {"ui": {"text": [error_msg]}, "status": "failed"}
         except Exception as e:
             error_msg = f"ZIP 安装失败 / ZIP installation failed: {str(e)}"
             print(error_msg)
             import traceback
             traceback.print_exc()
-            return {"ui": {"text": [error_msg]}}
+            return {"ui": {"text": [error_msg]}, "status": "failed"}
+
+
+class HiveBatchNodeInstaller:
+    """
+    批量节点安装器
+    粘贴多个节点地址（Git 仓库或 ZIP 文件），按规范化后的地址去重，用有限数量的线程同时安装，
+    总耗时接近最慢的一个仓库而不是所有仓库之和，最后输出汇总表
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "urls": ("STRING", {
+                    "name": "节点安装地址/node installation addresses",
+                    "tooltip": "每行一个节点：地址 [分支/标签/提交]，# 开头的行会被忽略 / one node per line: URL [branch/tag/commit]; lines starting with # are ignored",
+                    "multiline": True,
+                    "default": "",
+                    "placeholder": "每行一个节点：地址 [分支/标签/提交]",
+                }),
+            },
+            "optional": {
+                "install_mode": (GIT_INSTALL_MODES, {
+                    "name": "安装方式/install mode",
+                    "default": "shallow",
+                    "tooltip": "shallow：只下载最新版本（最快）；blobless：保留提交历史，文件内容按需下载；full：完整克隆 / shallow: latest version only (fastest); blobless: keep the commit history but fetch file contents on demand; full: complete clone"
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ()
+    FUNCTION = "install_nodes"
+    OUTPUT_NODE = True
+    CATEGORY = "Hive/Install"
+    # 注意语言文件中不能用@符号
+    DESCRIPTION = "批量节点安装器 - 粘贴多个节点的安装地址，同时安装工作流缺少的全部节点。/ Batch node installer - paste the installation addresses of several nodes and install every node a workflow is missing at once. - Github: https://github.com/luguoli - 📧Email: luguoli﹫vip.qq.com"
+    
+    @staticmethod
+    def zip_target_name(url):
+        """
+        ZIP 文件解压后的目录名，用于去重和显示
+        GitHub 的源码压缩包（.../<仓库>/archive/[refs/heads/|refs/tags/]<分支>.zip）解压为 <仓库>-<分支>，
+        其他地址使用文件名（去掉 .zip）
+        """
+        path = url.split('?')[0].split('#')[0].rstrip('/')
+        match = re.search(r'github\.com/[^/]+/([^/]+)/archive/(?:refs/(?:heads|tags)/)?(.+)\.zip$', path)
+        if match:
+            return f"{match.group(1)}-{match.group(2).replace('/', '-')}"
+        name = os.path.basename(path) or url
+        return name[:-4] if name.lower().endswith('.zip') else name
+    
+    @staticmethod
+    def parse_node_list(urls):
+        """
+        解析节点列表，按规范化后的地址去重；地址不同但会安装到同一目录的节点只安装第一个，
+        其余的标记为目录冲突（"conflict" 为先出现的地址），在汇总表中列出
+        
+        Args:
+            urls: 每行一个节点：地址 [分支/标签/提交]
+        
+        Returns:
+            [{"url", "ref", "git", "name", "conflict"}]
+        """
+        installer = HiveNodeInstaller()
+        entries = []
+        seen = set()
+        directories = {}
+        for line in (urls or "").splitlines():
+            tokens = line.split()
+            if not tokens or tokens[0].startswith('#'):
+                continue
+            url = tokens[0]
+            ref = tokens[1] if len(tokens) > 1 else ""
+            git = installer.is_git_url(url)
+            if git:
+                key = installer.normalize_git_url(url)
+                name = os.path.basename(key.rstrip('/')).replace('.git', '')
+            else:
+                key = url
+                name = HiveBatchNodeInstaller.zip_target_name(url)
+            # 同一仓库（地址写法不同）只安装一次
+            if key in seen:
+                continue
+            seen.add(key)
+            directory = ('dir' if git else 'zip', name.lower())
+            conflict = directories.setdefault(directory, url)
+            entries.append({"url": url, "ref": ref, "git": git, "name": name, "conflict": conflict if conflict != url else None})
+        return entries
+    
+    def install_nodes(self, urls, install_mode="shallow"):
+        """
+        并行安装多个节点
+        
+        Args:
+            urls: 节点列表
+            install_mode: Git 仓库的安装方式 shallow / blobless / full
+        
+        Returns:
+            status: 每个节点的安装结果汇总
+        """
+        entries = self.parse_node_list(urls)
+        if not entries:
+            return {"ui": {"text": ["错误: 请提供有效的安装地址 / Error: Please provide a valid installation URL"]}}
+        
+        custom_nodes_dir = HiveNodeInstaller().resolve_custom_nodes_dir()
+        workers = min(NODE_INSTALL_WORKERS, len(entries))
+        print(f"开始安装 {len(entries)} 个节点（{workers} 个同时进行） / Installing {len(entries)} nodes ({workers} at a time)")
+        
+        def install(entry):
+            # 每个节点使用单独的安装器，输出加上节点名前缀，同时安装时也能分辨
+            installer = HiveNodeInstaller()
+            installer.log_prefix = f"[{entry['name']}] "
+            if entry["conflict"]:
+                return f"目录冲突，已跳过：与 {entry['conflict']} 安装到同一目录 / Directory conflict, skipped: installs to the same directory as {entry['conflict']}", "skipped", 0.0
+            start = time.perf_counter()
+            try:
+                if entry["git"]:
+                    result = installer._install_from_git(entry["url"], custom_nodes_dir, install_mode, entry["ref"])
+                else:
+                    result = installer._install_from_zip(entry["url"], custom_nodes_dir)
+                text, status = result["ui"]["text"][0], result["status"]
+            except Exception as e:
+                text, status = f"安装失败 / Installation failed: {str(e)}", "failed"
+            seconds = time.perf_counter() - start
+            print(f"{installer.log_prefix}完成 / finished in {seconds:.1f}s")
+            return text, status, seconds
+        
+        start = time.perf_counter()
+        results = [None] * len(entries)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hive-install") as executor:
+            futures = {executor.submit(install, entry): i for i, entry in enumerate(entries)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        elapsed = time.perf_counter() - start
+        
+        lines = []
+        installed = up_to_date = failed = 0
+        for entry, (text, status, seconds) in zip(entries, results):
+            first_line = text.splitlines()[0] if text else ""
+            if status in ("installed", "updated", "up_to_date"):
+                mark = "✓"
+                # 已是最新的节点没有改动，与节点更新器一样单独计数
+                if status == "up_to_date":
+                    up_to_date += 1
+                else:
+                    installed += 1
+                first_line = first_line.lstrip("✓").strip()
+            elif status == "failed":
+                mark = "✗"
+                failed += 1
+            else:
+                # 已固定版本、目录已存在但不是 Git 仓库、目录冲突等，未做改动
+                mark = "–"
+            lines.append(f"{mark} {seconds:6.1f}s  {entry['name']}: {first_line}")
+        
+        summary = f"{installed}/{len(entries)} 个节点安装或更新完成，{up_to_date} 个已是最新，{failed} 个失败，总耗时 {elapsed:.1f}s / {installed}/{len(entries)} nodes installed or updated, {up_to_date} already up to date, {failed} failed, {elapsed:.1f}s in total"
+        msg = summary + "\n" + "\n".join(lines)
+        if installed:
+            msg += "\n⚠️ 请重启 ComfyUI 以使新安装的节点生效 / Please restart ComfyUI for the newly installed node to take effect"
+        print(msg)
+        return {"ui": {"text": [msg]}}
+
+
+class HiveNodeUpdater:
+    """
+    节点更新器
+    列出 custom_nodes 目录下所有 Git 仓库，用线程池同时通过 git ls-remote 对比本地与远程的最新提交，
+    只对有更新的仓库获取并快进，报告更新了哪些节点以及检查耗时
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {},
+            "optional": {
+                "check_only": ("BOOLEAN", {
+                    "name": "只检查/check only",
+                    "default": False,
+                    "tooltip": "只检查哪些节点有更新，不更新 / only report which nodes have updates without updating them"
+                }),
+            }
+        }
+    
+    RETURN_TYPES = ()
+    FUNCTION = "update_all"
+    OUTPUT_NODE = True
+    CATEGORY = "Hive/Install"
+    # 注意语言文件中不能用@符号
+    DESCRIPTION = "节点更新器 - 同时检查 custom_nodes 目录下所有 Git 安装的节点，只更新有新版本的节点。/ Node updater - check every git-installed node in custom_nodes at once and update only the ones with a newer version. - Github: https://github.com/luguoli - 📧Email: luguoli﹫vip.qq.com"
+    
+    @staticmethod
+    def _check_repo(installer, install_path):
+        """
+        对比仓库当前分支与远程分支的最新提交（不下载任何对象）
+        
+        Returns:
+            (状态, 说明)，状态为 stale / current / pinned / error
+        """
+        head = installer._git_output(['rev-parse', 'HEAD'], install_path)
+        branch = installer._git_output(['rev-parse', '--abbrev-ref', 'HEAD'], install_path)
+        if not head or not branch:
+            return "error", "无法读取仓库状态 / Failed to read the repository state"
+        if branch == 'HEAD':
+            return "pinned", f"已固定到 / pinned to {head[:7]}"
+        remote = installer._git_output(['config', f'branch.{branch}.remote'], install_path) or 'origin'
+        merge_ref = installer._git_output(['config', f'branch.{branch}.merge'], install_path) or f'refs/heads/{branch}'
+        try:
+            # 禁止 git 询问账号密码，需要认证的仓库直接报错而不是卡住
+            result = subprocess.run(
+                ['git', 'ls-remote', remote, merge_ref],
+                cwd=install_path, capture_output=True, text=True, timeout=60,
+                env=dict(os.environ, GIT_TERMINAL_PROMPT='0')
+            )
+        except subprocess.TimeoutExpired:
+            return "error", "检查超时 / Timed out"
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            errors = [line for line in lines if line.startswith('fatal:')] or lines
+            return "error", errors[0] if errors else f"git ls-remote: {result.returncode}"
+        fields = result.stdout.split()
+        if not fields:
+            return "error", f"远程没有分支 / Remote branch not found: {merge_ref}"
+        remote_head = fields[0]
+        if remote_head == head:
+            return "current", head[:7]
+        # 本地领先于远程（远程的最新提交已经是本地历史的一部分）时不需要更新
+        if installer._git_output(['merge-base', '--is-ancestor', remote_head, 'HEAD'], install_path) is not None:
+            return "current", f"{head[:7]}（本地领先 / ahead of remote）"
+        return "stale", f"{head[:7]} → {remote_head[:7]}"
+    
+    def update_all(self, check_only=False):
+        """
+        检查并更新所有 Git 安装的节点
+        
+        Args:
+            check_only: 只检查，不更新
+        
+        Returns:
+            status: 检查和更新结果
+        """
+        installer = HiveNodeInstaller()
+        custom_nodes_dir = installer.find_comfyui_custom_nodes_dir()
+        if not custom_nodes_dir:
+            return {"ui": {"text": ["错误: 未找到 ComfyUI custom_nodes 目录 / Error: ComfyUI custom_nodes directory not found"]}}
+        try:
+            subprocess.run(['git', '--version'], check=True, capture_output=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return {"ui": {"text": ["错误: 未找到 git 命令，请先安装 Git / Error: Git command not found, please install Git first"]}}
+        
+        repos = []
+        for name in sorted(os.listdir(custom_nodes_dir)):
+            path = os.path.join(custom_nodes_dir, name)
+            if os.path.isdir(path) and os.path.exists(os.path.join(path, '.git')):
+                repos.append((name, path))
+        if not repos:
+            return {"ui": {"text": [f"custom_nodes 目录下没有 Git 安装的节点 / No git-installed nodes in {custom_nodes_dir}"]}}
+        
+        print(f"检查 {len(repos)} 个节点的更新 / Checking {len(repos)} nodes for updates")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(16, len(repos)), thread_name_prefix="hive-check") as executor:
+            checks = list(executor.map(lambda repo: self._check_repo(installer, repo[1]), repos))
+        scan_seconds = time.perf_counter() - start
+        
+        lines = []
+        stale = [(name, path) for (name, path), (state, _) in zip(repos, checks) if state == "stale"]
+        updates = {}
+        update_seconds = 0
+        if stale and not check_only:
+            def update(repo):
+                name, path = repo
+                repo_installer = HiveNodeInstaller()
+                repo_installer.log_prefix = f"[{name}] "
+                try:
+                    mirror_path = None
+                    if GIT_CACHE_DIR:
+                        origin_url = repo_installer._git_output(['remote', 'get-url', 'origin'], path)
+                        # 与安装时一样按规范化后的地址查找镜像，否则 origin 为网页地址或不带 .git 时会另建一个镜像
+                        mirror_path = repo_installer._update_mirror(repo_installer.normalize_git_url(origin_url)) if origin_url else None
+                    result = repo_installer._update_repo(path, "", mirror_path)
+                    return result["ui"]["text"][0], result["status"]
+                except Exception as e:
+                    return f"更新失败 / Update failed: {str(e)}", "failed"
+            
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(NODE_INSTALL_WORKERS, len(stale)), thread_name_prefix="hive-install") as executor:
+                updates = dict(zip([name for name, _ in stale], executor.map(update, stale)))
+            update_seconds = time.perf_counter() - start
+        
+        updated = failed = 0
+        for (name, _), (state, detail) in zip(repos, checks):
+            if name in updates:
+                text, status = updates[name]
+                first_line = text.splitlines()[0]
+                if status in ("updated", "up_to_date"):
+                    lines.append(f"✓ {name}: {detail}")
+                    updated += 1
+                else:
+                    lines.append(f"✗ {name}: {first_line}")
+                    failed += 1
+            elif state == "stale":
+                lines.append(f"↑ {name}: {detail}")
+            elif state == "error":
+                lines.append(f"✗ {name}: {detail}")
+                failed += 1
+        
+        up_to_date = sum(1 for state, _ in checks if state == "current")
+        pinned = sum(1 for state, _ in checks if state == "pinned")
+        if check_only:
+            summary = f"检查了 {len(repos)} 个节点，耗时 {scan_seconds:.1f}s：{len(stale)} 个有更新，{up_to_date} 个已是最新，{pinned} 个已固定版本，{failed} 个检查失败 / Checked {len(repos)} nodes in {scan_seconds:.1f}s: {len(stale)} have updates, {up_to_date} up to date, {pinned} pinned, {failed} failed"
+        else:
+            summary = f"检查了 {len(repos)} 个节点，耗时 {scan_seconds:.1f}s；更新了 {updated} 个，耗时 {update_seconds:.1f}s；{up_to_date} 个已是最新，{pinned} 个已固定版本，{failed} 个失败 / Checked {len(repos)} nodes in {scan_seconds:.1f}s; updated {updated} in {update_seconds:.1f}s; {up_to_date} up to date, {pinned} pinned, {failed} failed"
+        msg = summary + ("\n" + "\n".join(lines) if lines else "")
+        if updated:
+            msg += "\n⚠️ 请重启 ComfyUI 以使更新的节点生效 / Please restart ComfyUI for the updated nodes to take effect"
+        print(msg)
+        return {"ui": {"text": [msg]}}
 
 
 # 注册节点
 NODE_CLASS_MAPPINGS = {
     "HiveModelDownloader": HiveModelDownloader,
+    "HiveBatchModelDownloader": HiveBatchModelDownloader,
     "HiveNodeInstaller": HiveNodeInstaller,
+    "HiveBatchNodeInstaller": HiveBatchNodeInstaller,
+    "HiveNodeUpdater": HiveNodeUpdater,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "HiveModelDownloader": "Hive 模型下载器/Model Downloader - Github:﹫luguoli",
+    "HiveBatchModelDownloader": "Hive 批量模型下载器/Batch Model Downloader - Github:﹫luguoli",
     "HiveNodeInstaller": "Hive 节点安装器/Node Installer - Github:﹫luguoli",
+    "HiveBatchNodeInstaller": "Hive 批量节点安装器/Batch Node Installer - Github:﹫luguoli",
+    "HiveNodeUpdater": "Hive 节点更新器/Node Updater - Github:﹫luguoli",
 }
 
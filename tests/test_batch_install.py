@@ -0,0 +1,75 @@
+"""
+批量节点安装器测试：去重、目录冲突和按安装状态汇总
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+from bench_common import load_hive
+
+nodes = load_hive("nodes")
+
+
+class ParseNodeListTest(unittest.TestCase):
+    def test_duplicates_and_conflicts(self):
+        entries = nodes.HiveBatchNodeInstaller.parse_node_list(
+            "https://github.com/a/ComfyUI-Foo\n"
+            "# 注释\n"
+            "https://github.com/a/ComfyUI-Foo.git\n"
+            "https://github.com/b/ComfyUI-Foo main\n"
+            "https://github.com/a/Bar/archive/refs/heads/main.zip\n"
+        )
+        self.assertEqual([(entry["url"], entry["conflict"]) for entry in entries], [
+            ("https://github.com/a/ComfyUI-Foo", None),
+            ("https://github.com/b/ComfyUI-Foo", "https://github.com/a/ComfyUI-Foo"),
+            ("https://github.com/a/Bar/archive/refs/heads/main.zip", None),
+        ])
+        self.assertEqual(entries[1]["ref"], "main")
+        self.assertEqual(entries[2]["name"], "Bar-main")
+
+
+class InstallSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(nodes.HiveNodeInstaller, "resolve_custom_nodes_dir", return_value=self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def install(self, statuses):
+        def install_from_git(installer, url, custom_nodes_dir, mode="shallow", ref=""):
+            # 界面文字与状态无关，汇总只看 status
+            return {"ui": {"text": [f"message for {url}"]}, "status": statuses[url]}
+
+        with mock.patch.object(nodes.HiveNodeInstaller, "_install_from_git", install_from_git):
+            return nodes.HiveBatchNodeInstaller().install_nodes("\n".join(statuses))["ui"]["text"][0]
+
+    def test_up_to_date_is_counted_separately(self):
+        text = self.install({"https://github.com/a/A": "up_to_date", "https://github.com/a/B": "up_to_date"})
+        self.assertTrue(text.startswith("0/2 "), text)
+        self.assertIn("2 already up to date", text)
+        self.assertNotIn("restart", text)
+
+    def test_installed_and_failed(self):
+        text = self.install({"https://github.com/a/A": "installed", "https://github.com/a/B": "updated", "https://github.com/a/C": "failed"})
+        self.assertTrue(text.startswith("2/3 "), text)
+        self.assertIn("1 failed", text)
+        self.assertIn("restart", text)
+
+    def test_directory_conflict_is_reported(self):
+        text = self.install({"https://github.com/a/Foo": "installed", "https://github.com/b/Foo": "installed"})
+        self.assertTrue(text.startswith("1/2 "), text)
+        self.assertIn("Directory conflict", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
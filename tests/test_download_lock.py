@@ -0,0 +1,73 @@
+"""
+下载锁测试：等待另一个任务下载同一文件后，只有文件确实被对方替换时才算对方完成了下载
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+from bench_common import load_hive, use_models_dir
+
+nodes = load_hive("nodes")
+hive_store = load_hive("hive_store")
+
+URL = "http://127.0.0.1:1/model.safetensors"
+
+
+class DownloadLockTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        use_models_dir(self.tmp.name)
+        self.save_path = os.path.join(self.tmp.name, "checkpoints", "model.safetensors")
+        os.makedirs(os.path.dirname(self.save_path))
+        with open(self.save_path, 'wb') as f:
+            f.write(b'old')
+        self.holder = hive_store.FileLock(os.path.join(os.path.dirname(self.save_path), ".model.safetensors.lock"))
+        self.assertTrue(self.holder.acquire())
+
+    def wait_for_holder(self, holder_action):
+        """另一个线程持有锁并执行 holder_action 后释放，返回本任务 _acquire_download_lock 的结果"""
+        def hold():
+            time.sleep(0.2)
+            holder_action()
+            self.holder.release()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        lock, result = nodes.HiveModelDownloader()._acquire_download_lock(
+            URL, "checkpoints", nodes.DownloadControl(), nodes._DownloadTelemetry(URL, "checkpoints"))
+        thread.join()
+        if lock is not None:
+            lock.release()
+        return lock, result
+
+    def test_unchanged_file_is_not_coalesced(self):
+        # 更新模式下对方失败或暂停：文件在等待前就存在，但没有被替换
+        lock, result = self.wait_for_holder(lambda: None)
+        self.assertIsNotNone(lock)
+        self.assertIsNone(result)
+
+    def test_replaced_file_is_coalesced(self):
+        def replace():
+            new_path = self.save_path + ".new"
+            with open(new_path, 'wb') as f:
+                f.write(b'new')
+            os.replace(new_path, self.save_path)
+
+        lock, result = self.wait_for_holder(replace)
+        self.assertIsNone(lock)
+        self.assertIn("另一个任务下载完成", result["ui"]["text"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
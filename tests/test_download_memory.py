@@ -0,0 +1,104 @@
+"""
+下载内存上限测试：HIVE_DOWNLOAD_MEMORY_MB=1 时只有一个 1MB 读缓冲区，分片下载、哈希读回、单线程下载
+和哈希索引查找都要共用它
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ["HIVE_DOWNLOAD_MEMORY_MB"] = "1"
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+import requests
+
+from bench_common import load_hive, use_models_dir, make_sparse_safetensors, RangeServer, NetworkConditions
+
+nodes = load_hive("nodes")
+hive_store = load_hive("hive_store")
+
+
+class DownloadMemoryTest(unittest.TestCase):
+    def setUp(self):
+        # 其他测试先加载了插件时，环境变量不再生效，直接替换缓冲区池
+        if nodes.download_buffers.count != 1:
+            nodes.download_buffers = nodes._BufferPool(nodes.DOWNLOAD_BUFFER_SIZE, 1)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.serve_dir = os.path.join(self.tmp.name, "serve")
+        self.models_dir = os.path.join(self.tmp.name, "models")
+        os.makedirs(self.serve_dir)
+        os.makedirs(self.models_dir)
+        use_models_dir(self.models_dir)
+        self.source = os.path.join(self.serve_dir, "model.safetensors")
+        make_sparse_safetensors(self.source, 24 * 1024 * 1024)
+        with open(self.source, 'rb') as f:
+            self.sha256 = hashlib.sha256(f.read()).hexdigest()
+        # 记录插件分配的读缓冲区和 requests 的分块大小，缓冲区池之外的大块内存都算超出上限
+        self.large_buffers = 0
+        self.pool_allocated = nodes.download_buffers._allocated
+        self.chunk_sizes = []
+
+        def counting_bytearray(*args):
+            buffer = bytearray(*args)
+            if len(buffer) >= nodes.DOWNLOAD_BUFFER_SIZE:
+                self.large_buffers += 1
+            return buffer
+
+        iter_content = requests.Response.iter_content
+
+        def recording_iter_content(response, chunk_size=1, *args, **kwargs):
+            self.chunk_sizes.append(chunk_size or 0)
+            return iter_content(response, chunk_size, *args, **kwargs)
+
+        for module in (nodes, hive_store):
+            module.bytearray = counting_bytearray
+            self.addCleanup(delattr, module, "bytearray")
+        requests.Response.iter_content = recording_iter_content
+        self.addCleanup(setattr, requests.Response, "iter_content", iter_content)
+
+    def download(self, network=None):
+        with RangeServer(self.serve_dir, network=network) as server:
+            result = {}
+            thread = threading.Thread(target=lambda: result.setdefault("status", nodes.HiveModelDownloader().run_download(
+                server.url("model.safetensors"), "checkpoints", self.sha256, nodes.DownloadControl())), daemon=True)
+            thread.start()
+            thread.join(120)
+            self.assertFalse(thread.is_alive(), "下载在缓冲区上死锁 / download deadlocked on the buffer pool")
+        path = os.path.join(self.models_dir, "checkpoints", "model.safetensors")
+        self.assertTrue(os.path.isfile(path), result.get("status"))
+        self.assertEqual(os.path.getsize(path), os.path.getsize(self.source))
+        pool = nodes.download_buffers
+        self.assertEqual(pool.count, 1)
+        self.assertLessEqual(pool._allocated, pool.count)
+        self.assertEqual(len(pool._free), pool._allocated)
+        # 缓冲区池之外没有分配过大块内存
+        self.assertEqual(self.large_buffers, pool._allocated - self.pool_allocated)
+        self.assertTrue(all(size <= nodes.DOWNLOAD_BUFFER_SIZE for size in self.chunk_sizes), self.chunk_sizes)
+
+    def test_segmented_download(self):
+        self.download()
+
+    def test_single_connection_download(self):
+        self.download(NetworkConditions(range_support=False))
+
+    def test_hash_index_lookup(self):
+        # models 目录下已有相同内容但未索引的文件：查找时对大小相同的文件计算哈希，然后直接链接
+        existing = os.path.join(self.models_dir, "loras", "copy.safetensors")
+        os.makedirs(os.path.dirname(existing))
+        shutil.copyfile(self.source, existing)
+        self.download()
+        self.assertEqual(hive_store.get_model_index(self.models_dir).find(self.sha256, exclude=existing),
+                         os.path.join(self.models_dir, "checkpoints", "model.safetensors"))
+
+
+if __name__ == "__main__":
+    unittest.main()
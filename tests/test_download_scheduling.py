@@ -0,0 +1,253 @@
+"""
+多线程下载调度测试：分片拆分（工作窃取）、自适应连接数（AIMD）、错误分类、镜像放弃和签名地址重新获取
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+import requests
+
+from bench_common import load_hive, use_models_dir, make_sparse_safetensors, RangeServer
+
+nodes = load_hive("nodes")
+
+MB = 1024 * 1024
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+
+class SegmentSchedulerTest(unittest.TestCase):
+    def test_split_evenly(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(10 * MB + 1, 4 * MB)
+        self.assertEqual([(seg.start, seg.end) for seg in scheduler.segments],
+                         [(0, 4 * MB - 1), (4 * MB, 8 * MB - 1), (8 * MB, 10 * MB)])
+
+    def test_queued_segments_first(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(8 * MB, 4 * MB)
+        first, second = scheduler.next_segment(), scheduler.next_segment()
+        self.assertEqual((first.start, second.start), (0, 4 * MB))
+        self.assertTrue(first.active and second.active)
+
+    def test_steal_half_of_largest_remaining(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(24 * MB, 12 * MB)
+        first, second = scheduler.next_segment(), scheduler.next_segment()
+        # 第一个分片已写入 4MB，剩余 8MB；第二个分片剩余 12MB，被拆分的应是第二个
+        scheduler.commit(first, scheduler.reserve(first, 4 * MB))
+        stolen = scheduler.next_segment()
+        self.assertEqual((stolen.start, stolen.end), (18 * MB, 24 * MB - 1))
+        self.assertEqual(second.end, 18 * MB - 1)
+        self.assertTrue(stolen.active)
+        # 再拆分时按已占位的位置计算剩余部分
+        scheduler.reserve(first, 2 * MB)
+        stolen = scheduler.next_segment()
+        self.assertEqual((stolen.start, stolen.end), (6 * MB + 3 * MB, 12 * MB - 1))
+
+    def test_no_split_below_minimum(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(2 * nodes._SegmentScheduler.MIN_SPLIT_SIZE - 1, 64 * MB)
+        self.assertIsNotNone(scheduler.next_segment())
+        self.assertIsNone(scheduler.next_segment())
+        self.assertFalse(scheduler.has_pending())
+
+    def test_reserve_is_clamped_after_split(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(16 * MB, 16 * MB)
+        seg = scheduler.next_segment()
+        stolen = scheduler.next_segment()
+        self.assertEqual(stolen.start, 8 * MB)
+        scheduler.commit(seg, scheduler.reserve(seg, 7 * MB))
+        # 原分片只剩 1MB，写入请求被截断，避免覆盖被拆走的部分
+        self.assertEqual(scheduler.reserve(seg, 4 * MB), MB)
+        self.assertTrue(scheduler.commit(seg, MB))
+        self.assertEqual(scheduler.contiguous_done(), 8 * MB)
+
+    def test_release_and_abort(self):
+        scheduler = nodes._SegmentScheduler.split_evenly(4 * MB, 4 * MB)
+        seg = scheduler.next_segment()
+        scheduler.commit(seg, scheduler.reserve(seg, MB))
+        scheduler.release(seg)
+        again = scheduler.next_segment()
+        self.assertIs(again, seg)
+        self.assertEqual(again.start + again.done, MB)
+        scheduler.release(seg)
+        scheduler.abort()
+        self.assertIsNone(scheduler.next_segment())
+
+
+class ConnectionControllerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = nodes._ConnectionController(4, min_connections=2, max_connections=8)
+        for _ in range(4):
+            self.controller.spawned()
+        self.now = 0.0
+        self.downloaded = 0
+        self.controller.update(0, now=self.now)
+
+    def window(self, mb_s):
+        """经过一个测量窗口，期间吞吐量为 mb_s，返回需要新启动的线程数"""
+        self.now += nodes._ConnectionController.WINDOW
+        self.downloaded += int(mb_s * MB * nodes._ConnectionController.WINDOW)
+        spawn = self.controller.update(self.downloaded, now=self.now)
+        for _ in range(spawn):
+            self.controller.spawned()
+        return spawn
+
+    def test_additive_increase_while_throughput_grows(self):
+        self.assertEqual(self.window(10), 1)
+        self.assertEqual(self.controller.target, 5)
+        self.assertEqual(self.window(12), 1)
+        self.assertEqual(self.controller.target, 6)
+
+    def test_back_off_when_probe_does_not_help(self):
+        self.window(10)
+        self.window(10)
+        self.assertEqual(self.controller.target, 4)
+        # 保持 HOLD_WINDOWS 个窗口后才再次试探
+        for _ in range(nodes._ConnectionController.HOLD_WINDOWS):
+            self.window(10)
+            self.assertEqual(self.controller.target, 4)
+        self.window(10)
+        self.assertEqual(self.controller.target, 5)
+
+    def test_multiplicative_decrease_on_errors(self):
+        self.controller.record_error()
+        self.assertEqual(self.window(10), 0)
+        self.assertEqual(self.controller.target, 2)
+        # 多余的线程在分片之间退出，不低于下限
+        self.assertTrue(self.controller.try_retire(0))
+        self.assertTrue(self.controller.try_retire(1))
+        self.assertFalse(self.controller.try_retire(2))
+        self.controller.exited(0)
+        self.assertEqual(self.controller.active, 2)
+
+    def test_upper_limit(self):
+        for mb_s in range(10, 30):
+            self.window(mb_s)
+        self.assertEqual(self.controller.target, 8)
+
+
+class RetryClassificationTest(unittest.TestCase):
+    def test_retryable(self):
+        for error in (http_error(500), http_error(503), http_error(429), http_error(408),
+                      requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout()):
+            self.assertTrue(nodes._is_retryable_error(error), error)
+
+    def test_not_retryable(self):
+        for status in (400, 401, 403, 404, 416):
+            self.assertFalse(nodes._is_retryable_error(http_error(status)), status)
+
+
+class MirrorSetTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.a = nodes._Mirror("https://a.example/model.safetensors", etag='"1"')
+        self.b = nodes._Mirror("https://b.example/model.safetensors", etag='"1"')
+        self.mirrors = nodes._MirrorSet([self.a, self.b])
+
+    def test_mismatch_drops_immediately(self):
+        self.assertTrue(self.mirrors.fail(self.b, nodes._MirrorMismatch("ETag changed")))
+        self.assertEqual(self.mirrors.available(), [self.a])
+        self.assertIs(self.mirrors.pick(), self.a)
+
+    def test_last_mirror_is_kept(self):
+        self.mirrors.fail(self.b, nodes._MirrorMismatch("ETag changed"))
+        self.assertFalse(self.mirrors.fail(self.a, nodes._MirrorMismatch("ETag changed")))
+        self.assertEqual(self.mirrors.available(), [self.a])
+
+    def test_transient_errors_drop_after_repeated_failures(self):
+        for _ in range(nodes._Mirror.MAX_FAILURES - 1):
+            self.assertFalse(self.mirrors.fail(self.b, requests.exceptions.ConnectionError()))
+        self.assertTrue(self.mirrors.fail(self.b, requests.exceptions.ConnectionError()))
+        self.assertTrue(self.b.dropped)
+
+    def test_success_resets_failures(self):
+        self.mirrors.fail(self.b, requests.exceptions.ConnectionError())
+        self.mirrors.record(self.b, MB, 0.5)
+        self.assertEqual(self.b.failures, 0)
+        self.assertEqual(self.b.speed, 2 * MB)
+
+    def test_client_error_drops_immediately(self):
+        self.assertTrue(self.mirrors.fail(self.a, http_error(404)))
+
+    def test_weighted_pick(self):
+        self.mirrors.record(self.a, 9 * MB, 1)
+        self.mirrors.record(self.b, MB, 1)
+        with mock.patch.object(nodes.random, "choices", side_effect=lambda candidates, weights: [candidates[0]]) as choices:
+            self.mirrors.pick()
+        self.assertEqual(choices.call_args.kwargs["weights"], [9 * MB, MB])
+
+
+class SignedUrlTest(unittest.TestCase):
+    def test_expiry_parsing(self):
+        self.assertEqual(nodes._signed_url_expiry("https://cdn.example/f?Expires=1700000000&Signature=x"), 1700000000)
+        self.assertEqual(nodes._signed_url_expiry("https://s3.example/f?X-Amz-Date=20240101T000000Z&X-Amz-Expires=3600"), 1704070800)
+        self.assertIsNone(nodes._signed_url_expiry("https://example.com/f?download=true"))
+
+    def test_expired_url_is_not_used(self):
+        mirror = nodes._Mirror("https://hub.example/f", resolved_url=f"https://cdn.example/f?Expires={int(time.time()) + 30}")
+        # 距离过期不足 EXPIRY_MARGIN，改用原始地址重新跳转
+        self.assertEqual(mirror.request_url(), "https://hub.example/f")
+        self.assertEqual(mirror.refreshes, 1)
+        mirror.set_resolved(f"https://cdn.example/f?Expires={int(time.time()) + 3600}")
+        self.assertTrue(mirror.request_url().startswith("https://cdn.example/"))
+
+    def test_rejected_signature_is_re_resolved(self):
+        mirror = nodes._Mirror("https://hub.example/f", resolved_url="https://cdn.example/f?sig=old")
+
+        def response(url, status, history=()):
+            result = requests.Response()
+            result.status_code = status
+            result.url = url
+            result.history = list(history)
+            result.raw = mock.Mock()
+            return result
+
+        session = mock.Mock()
+        session.get.side_effect = [
+            response("https://cdn.example/f?sig=old", 403),
+            response("https://cdn.example/f?sig=new", 206, history=[response("https://hub.example/f", 302)]),
+        ]
+        result = nodes._get_resolved(session, mirror)
+        self.assertEqual(result.status_code, 206)
+        self.assertEqual([call.args[0] for call in session.get.call_args_list], ["https://cdn.example/f?sig=old", "https://hub.example/f"])
+        self.assertEqual(mirror.request_url(), "https://cdn.example/f?sig=new")
+
+
+class MirrorDownloadTest(unittest.TestCase):
+    def test_mirror_with_different_size_is_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            serve_dir = os.path.join(tmp, "serve")
+            models_dir = os.path.join(tmp, "models")
+            os.makedirs(serve_dir)
+            os.makedirs(models_dir)
+            use_models_dir(models_dir)
+            make_sparse_safetensors(os.path.join(serve_dir, "model.safetensors"), 12 * MB)
+            make_sparse_safetensors(os.path.join(serve_dir, "other.safetensors"), 10 * MB)
+            with RangeServer(serve_dir) as server, mock.patch("builtins.print") as printed:
+                urls = server.url("model.safetensors") + "\n" + server.url("other.safetensors")
+                result = nodes.HiveModelDownloader().run_download(urls, "checkpoints", "", nodes.DownloadControl())
+            self.assertIn("✓", result["ui"]["text"][0])
+            self.assertEqual(os.path.getsize(os.path.join(models_dir, "checkpoints", "model.safetensors")), 12 * MB)
+            output = " ".join(str(arg) for call in printed.call_args_list for arg in call.args)
+            self.assertIn("Skipping mirror with different size", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+单线程下载测试（服务器不支持 Range）：中途断开时不完整的文件不能留在模型目录中
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+from bench_common import load_hive, use_models_dir, make_sparse_safetensors, RangeServer, NetworkConditions
+
+nodes = load_hive("nodes")
+
+
+class SingleConnectionDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.serve_dir = os.path.join(self.tmp.name, "serve")
+        self.models_dir = os.path.join(self.tmp.name, "models")
+        os.makedirs(self.serve_dir)
+        os.makedirs(self.models_dir)
+        use_models_dir(self.models_dir)
+        make_sparse_safetensors(os.path.join(self.serve_dir, "model.safetensors"), 8 * 1024 * 1024)
+        self.save_dir = os.path.join(self.models_dir, "checkpoints")
+
+    def download(self, network):
+        with RangeServer(self.serve_dir, network=network) as server:
+            return nodes.HiveModelDownloader().run_download(server.url("model.safetensors"), "checkpoints", "", nodes.DownloadControl())
+
+    def test_complete_download(self):
+        self.download(NetworkConditions(range_support=False))
+        self.assertEqual(os.listdir(self.save_dir), ["model.safetensors"])
+
+    def test_dropped_connection_leaves_nothing(self):
+        result = self.download(NetworkConditions(range_support=False, drop_rate=1.0))
+        self.assertIn("错误", result["ui"]["text"][0])
+        self.assertFalse([name for name in os.listdir(self.save_dir) if not name.endswith('.lock')])
+
+
+if __name__ == "__main__":
+    unittest.main()
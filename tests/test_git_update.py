@@ -0,0 +1,137 @@
+"""
+节点安装和更新测试：浅克隆的节点更新时快进，本地有提交时拒绝更新而不是丢弃本地提交；
+网页地址中的分支解析和本地镜像缓存
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+for key, value in (("GIT_AUTHOR_NAME", "hive"), ("GIT_AUTHOR_EMAIL", "hive@example.com"),
+                   ("GIT_COMMITTER_NAME", "hive"), ("GIT_COMMITTER_EMAIL", "hive@example.com")):
+    os.environ.setdefault(key, value)
+
+from bench_common import load_hive
+
+nodes = load_hive("nodes")
+
+
+def git(*args, cwd):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit(repo, name, content="x"):
+    with open(os.path.join(repo, name), 'w') as f:
+        f.write(content)
+    git('add', name, cwd=repo)
+    git('commit', '-q', '-m', name, cwd=repo)
+    return git('rev-parse', 'HEAD', cwd=repo)
+
+
+class ShallowUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.remote = os.path.join(self.tmp.name, "remote")
+        os.makedirs(self.remote)
+        git('init', '-q', '-b', 'main', cwd=self.remote)
+        commit(self.remote, "a.txt")
+        commit(self.remote, "b.txt")
+        self.install_path = os.path.join(self.tmp.name, "ComfyUI-Node")
+        # 与 shallow 安装方式相同：只获取最新提交
+        git('clone', '-q', '--depth', '1', '--single-branch', f'file://{self.remote}', self.install_path, cwd=self.tmp.name)
+        self.installer = nodes.HiveNodeInstaller()
+
+    def test_fast_forward(self):
+        new_head = commit(self.remote, "c.txt")
+        result = self.installer._update_repo(self.install_path)
+        self.assertEqual(result["status"], "updated")
+        self.assertEqual(git('rev-parse', 'HEAD', cwd=self.install_path), new_head)
+
+    def test_up_to_date(self):
+        result = self.installer._update_repo(self.install_path)
+        self.assertEqual(result["status"], "up_to_date")
+
+    def test_local_commit_is_kept(self):
+        local_head = commit(self.install_path, "local.txt")
+        commit(self.remote, "c.txt")
+        result = self.installer._update_repo(self.install_path)
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(git('rev-parse', 'HEAD', cwd=self.install_path), local_head)
+        self.assertTrue(os.path.isfile(os.path.join(self.install_path, "local.txt")))
+
+    def test_local_commit_without_tracking_branch(self):
+        # 没有 origin/<分支> 时按 .git/shallow 判断
+        git('update-ref', '-d', 'refs/remotes/origin/main', cwd=self.install_path)
+        local_head = commit(self.install_path, "local.txt")
+        commit(self.remote, "c.txt")
+        self.installer._update_repo(self.install_path)
+        self.assertEqual(git('rev-parse', 'HEAD', cwd=self.install_path), local_head)
+
+
+class TreeUrlRefTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.remote = os.path.join(self.tmp.name, "remote")
+        os.makedirs(self.remote)
+        git('init', '-q', '-b', 'main', cwd=self.remote)
+        commit(self.remote, "a.txt")
+        git('branch', 'feature/x', cwd=self.remote)
+        git('tag', 'v1.0', cwd=self.remote)
+        self.installer = nodes.HiveNodeInstaller()
+
+    def ref(self, path):
+        return self.installer._ref_from_tree_url(f"https://github.com/a/Node/tree/{path}", f"file://{self.remote}")
+
+    def test_branch_with_slash_and_directory(self):
+        self.assertEqual(self.ref("feature/x/nodes/sub"), "feature/x")
+
+    def test_tag(self):
+        self.assertEqual(self.ref("v1.0"), "v1.0")
+
+
+class MirrorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.remote = os.path.join(self.tmp.name, "ComfyUI-Node")
+        os.makedirs(self.remote)
+        git('init', '-q', '-b', 'main', cwd=self.remote)
+        commit(self.remote, "a.txt")
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self.custom_nodes = os.path.join(self.tmp.name, "custom_nodes")
+        os.makedirs(self.custom_nodes)
+        for patcher in (mock.patch.object(nodes, "GIT_CACHE_DIR", self.cache_dir), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.installer = nodes.HiveNodeInstaller()
+        self.install_path = os.path.join(self.custom_nodes, "ComfyUI-Node")
+
+    def install(self):
+        return self.installer._install_from_git(f"file://{self.remote}", self.custom_nodes, "shallow")
+
+    def test_install_and_update_through_mirror(self):
+        self.assertEqual(self.install()["status"], "installed")
+        mirror = os.path.join(self.cache_dir, nodes._mirror_name(f"file://{self.remote}"))
+        self.assertTrue(os.path.isdir(mirror))
+        # 节点通过 alternates 引用镜像中的对象
+        with open(os.path.join(self.install_path, ".git", "objects", "info", "alternates")) as f:
+            self.assertIn(os.path.realpath(mirror), os.path.realpath(f.read().strip()))
+        self.assertEqual(self.install()["status"], "up_to_date")
+        new_head = commit(self.remote, "b.txt")
+        self.assertEqual(self.install()["status"], "updated")
+        self.assertEqual(git('rev-parse', 'HEAD', cwd=self.install_path), new_head)
+        self.assertEqual(git('rev-parse', 'main', cwd=mirror), new_head)
+
+
+if __name__ == "__main__":
+    unittest.main()
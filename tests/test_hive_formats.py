@@ -0,0 +1,54 @@
+"""
+safetensors 头部规则测试：下载时的格式检查与增量更新的数据区划分使用同一个头部长度检查
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import io
+import json
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hive_delta
+import hive_formats
+
+
+def safetensors_bytes(data_size=16, header_size=None):
+    header = json.dumps({"w": {"dtype": "U8", "shape": [data_size], "data_offsets": [0, data_size]}}).encode('utf-8')
+    length = len(header) if header_size is None else header_size
+    return struct.pack('<Q', length) + header + b'\0' * data_size
+
+
+class SafetensorsHeaderTest(unittest.TestCase):
+    def check(self, data):
+        """格式检查是否通过，以及增量更新得到的数据区起始位置"""
+        try:
+            hive_formats.check_prefix(data, "model.safetensors", len(data))
+            valid = True
+        except hive_formats.ModelFormatError:
+            valid = False
+        return valid, hive_delta.safetensors_data_offset(io.BytesIO(data), len(data))
+
+    def test_valid_file(self):
+        data = safetensors_bytes()
+        self.assertEqual(self.check(data), (True, len(data) - 16))
+
+    def test_header_longer_than_file(self):
+        data = safetensors_bytes(header_size=10 ** 6)
+        self.assertEqual(self.check(data), (False, 0))
+
+    def test_header_over_limit(self):
+        data = safetensors_bytes(header_size=hive_formats.MAX_SAFETENSORS_HEADER + 1)
+        self.assertIsNone(hive_formats.safetensors_header_size(data))
+        self.assertEqual(self.check(data), (False, 0))
+
+    def test_not_json(self):
+        data = b"<html>" + b"\0" * 100
+        self.assertEqual(self.check(data), (False, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
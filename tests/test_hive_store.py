@@ -0,0 +1,52 @@
+"""
+hive_store 哈希索引测试
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hive_store
+
+
+class ModelHashIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.models_dir = self.tmp.name
+        os.makedirs(os.path.join(self.models_dir, "loras"))
+        os.makedirs(os.path.join(self.models_dir, "checkpoints"))
+        self.data = os.urandom(hive_store.MIN_DEDUP_SIZE + 1000)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.path = os.path.join(self.models_dir, "loras", "existing.safetensors")
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        # 大小相同但内容不同的文件
+        with open(os.path.join(self.models_dir, "loras", "other.safetensors"), 'wb') as f:
+            f.write(os.urandom(len(self.data)))
+
+    def test_find_unindexed_file_by_size(self):
+        index = hive_store.ModelHashIndex(self.models_dir)
+        target = os.path.join(self.models_dir, "checkpoints", "new.safetensors")
+        # 文件没有被索引过：只查索引时找不到，给出大小后通过计算同样大小文件的哈希找到
+        self.assertIsNone(index.find(self.sha256, exclude=target))
+        self.assertEqual(index.find(self.sha256, exclude=target, size=len(self.data)), self.path)
+        # 结果已写入索引，之后不需要再计算
+        self.assertEqual(hive_store.ModelHashIndex(self.models_dir).find(self.sha256, exclude=target), self.path)
+
+    def test_find_other_size(self):
+        index = hive_store.ModelHashIndex(self.models_dir)
+        self.assertIsNone(index.find(self.sha256, size=len(self.data) + 1))
+
+    def test_find_excludes_target(self):
+        index = hive_store.ModelHashIndex(self.models_dir)
+        self.assertIsNone(index.find(self.sha256, exclude=self.path, size=len(self.data)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+hive_zip 的流式/增量解压测试
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hive_zip
+
+
+class _Unseekable(io.RawIOBase):
+    """只能顺序写入的输出，zipfile 写入时会为每个成员使用数据描述符"""
+    def __init__(self):
+        self.data = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.data.write(b)
+
+
+def make_zip(files, data_descriptors=False):
+    if data_descriptors:
+        out = _Unseekable()
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+        return out.data.getvalue()
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return out.getvalue()
+
+
+class ZipStreamExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.files = {f"Pack/f{i}.py": os.urandom(2000) + b"x" * 5000 for i in range(10)}
+
+    def extract(self, data, chunk_size=4096):
+        with hive_zip.ZipStreamExtractor(self.tmp.name) as extractor:
+            for i in range(0, len(data), chunk_size):
+                extractor.feed(data[i:i + chunk_size])
+            names = extractor.finish()
+            return names, extractor.extracted, extractor.skipped
+
+    def assertExtracted(self):
+        for name, content in self.files.items():
+            with open(os.path.join(self.tmp.name, name), 'rb') as f:
+                self.assertEqual(f.read(), content)
+
+    def test_streamed_members(self):
+        names, extracted, skipped = self.extract(make_zip(self.files))
+        self.assertEqual(sorted(names), sorted(self.files))
+        self.assertEqual((extracted, skipped), (10, 0))
+        self.assertExtracted()
+
+    def test_data_descriptors_use_central_directory(self):
+        # 使用数据描述符的成员全部在 finish 中通过 zipfile 解压（Python 3.10 上曾因归档对象缺少 seekable() 失败）
+        names, extracted, _ = self.extract(make_zip(self.files, data_descriptors=True))
+        self.assertEqual(extracted, 10)
+        self.assertExtracted()
+
+    def test_spill_to_temporary_file(self):
+        original = hive_zip.SPOOL_SIZE
+        hive_zip.SPOOL_SIZE = 10000
+        self.addCleanup(setattr, hive_zip, "SPOOL_SIZE", original)
+        _, extracted, _ = self.extract(make_zip(self.files, data_descriptors=True))
+        self.assertEqual(extracted, 10)
+        self.assertExtracted()
+
+    def test_unchanged_files_are_skipped(self):
+        data = make_zip(self.files)
+        self.extract(data)
+        with open(os.path.join(self.tmp.name, "Pack/f3.py"), 'wb') as f:
+            f.write(b"changed")
+        _, extracted, skipped = self.extract(data)
+        self.assertEqual((extracted, skipped), (1, 9))
+        self.assertExtracted()
+
+    def test_path_traversal(self):
+        self.files = {"../evil.py": b"evil", "Pack/ok.py": b"ok"}
+        self.extract(make_zip(self.files))
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.tmp.name), "evil.py")))
+        with open(os.path.join(self.tmp.name, "evil.py"), 'rb') as f:
+            self.assertEqual(f.read(), b"evil")
+
+    def test_not_a_zip(self):
+        with self.assertRaises(zipfile.BadZipFile):
+            self.extract(b"<html>login</html>")
+
+    def test_interrupted_download_leaves_nothing(self):
+        data = make_zip(self.files)
+        with self.assertRaises(ConnectionError):
+            with hive_zip.ZipStreamExtractor(self.tmp.name) as extractor:
+                extractor.feed(data[:len(data) // 2])
+                raise ConnectionError("dropped")
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_failed_update_restores_old_files(self):
+        self.extract(make_zip(self.files))
+        old_files = self.files
+        self.files = {name: b"new" + content for name, content in old_files.items()}
+        self.files["Pack/added.py"] = b"added"
+        data = make_zip(self.files)
+        # 截断的归档：流式阶段已经覆盖了部分文件，finish 找不到中央目录
+        with self.assertRaises(zipfile.BadZipFile):
+            self.extract(data[:len(data) * 3 // 4])
+        self.files = old_files
+        self.assertExtracted()
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["Pack"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp.name, "Pack"))), sorted(os.path.basename(name) for name in old_files))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+"""
+共享 HTTP 连接池测试：扩容时关闭被替换的连接池，进行中的请求不受影响
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+from bench_common import load_hive, RangeServer
+
+nodes = load_hive("nodes")
+
+
+class HttpSessionTest(unittest.TestCase):
+    def test_grow_closes_replaced_adapter(self):
+        with tempfile.TemporaryDirectory() as serve_dir:
+            data = os.urandom(3 * 1024 * 1024)
+            with open(os.path.join(serve_dir, "file.bin"), 'wb') as f:
+                f.write(data)
+            with RangeServer(serve_dir) as server:
+                session = nodes.get_http_session()
+                old_adapter = session.adapters['http://']
+                with session.get(server.url("file.bin"), stream=True) as response:
+                    head = response.raw.read(1000)
+                    nodes.get_http_session(nodes._http_pool_size + 8)
+                    self.assertIsNot(session.adapters['http://'], old_adapter)
+                    self.assertEqual(len(old_adapter.poolmanager.pools), 0)
+                    self.assertEqual(head + response.raw.read(), data)
+                self.assertEqual(session.get(server.url("file.bin")).content, data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+下载耗时记录测试：默认只记录分片统计和最慢的分片，日志超过上限时轮转
+
+运行: python -m pytest tests  或  python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.setdefault("HIVE_TELEMETRY_LOG", "off")
+
+from bench_common import load_hive
+
+nodes = load_hive("nodes")
+
+
+class DownloadTelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log_path = os.path.join(self.tmp.name, "telemetry.jsonl")
+        for name, value in (("TELEMETRY_LOG_PATH", self.log_path), ("TELEMETRY_LOG_MAX_BYTES", 4096), ("TELEMETRY_SEGMENT_DETAIL", False)):
+            patcher = mock.patch.object(nodes, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def download(self, segments=3000):
+        telemetry = nodes._DownloadTelemetry("http://example.com/model.safetensors", "checkpoints")
+        for i in range(segments):
+            # 第 i 个分片耗时 1 + i/1000 秒，越往后越慢
+            telemetry.segment("example.com", i * 1024 * 1024, 1024 * 1024, 0.01 * (i % 100), 1 + i / 1000, error="timeout" if i % 500 == 0 else None)
+        telemetry.finish("completed", segments * 1024 * 1024)
+
+    def read_records(self, path):
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_segment_summary(self):
+        self.download()
+        record, = self.read_records(self.log_path)
+        self.assertNotIn("segments", record)
+        self.assertEqual(record["segment_requests"], 3000)
+        self.assertEqual(record["segment_errors"], 6)
+        self.assertEqual(record["segment_ttfb"]["max"], 0.99)
+        slowest = record["slowest_segments"]
+        self.assertEqual(len(slowest), nodes._DownloadTelemetry.SLOWEST_SEGMENTS)
+        # 最慢的分片都在最后，按速度从慢到快排列
+        self.assertTrue(all(item["start"] >= 2900 * 1024 * 1024 for item in slowest), slowest)
+        self.assertEqual([item["mb_s"] for item in slowest], sorted(item["mb_s"] for item in slowest))
+        self.assertLess(os.path.getsize(self.log_path), 4096)
+
+    def test_segment_detail_opt_in(self):
+        with mock.patch.object(nodes, "TELEMETRY_SEGMENT_DETAIL", True):
+            self.download(segments=10)
+        record, = self.read_records(self.log_path)
+        self.assertEqual(len(record["segments"]), 10)
+
+    def test_rotation(self):
+        for _ in range(5):
+            self.download(segments=10)
+        self.assertTrue(os.path.exists(self.log_path + ".1"))
+        self.assertLessEqual(os.path.getsize(self.log_path), 4096)
+        self.assertTrue(self.read_records(self.log_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
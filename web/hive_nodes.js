@@ -2,6 +2,7 @@
 // 这个文件放在 web 根目录以确保被 ComfyUI 自动加载
 
 import { app } from "/scripts/app.js";
+import { api } from "/scripts/api.js";
 
 // 解析当前脚本路径，动态获取插件基准路径（避免依赖目录名，支持 -main 或任意目录名）
 function detectHiveBaseUrl() {
@@ -78,19 +79,19 @@ app.registerExtension({
     
     // 节点创建时添加自定义 UI
     nodeCreated(node) {
-        // 处理 HiveModelDownloader 节点
-        if (node.comfyClass === "HiveModelDownloader") {
-            setupModelDownloaderNode(node, app);
+        // 处理 HiveModelDownloader / HiveBatchModelDownloader 节点
+        if (node.comfyClass === "HiveModelDownloader" || node.comfyClass === "HiveBatchModelDownloader") {
+            setupModelDownloaderNode(node, app, node.comfyClass);
         }
-        // 处理 HiveNodeInstaller 节点
-        else if (node.comfyClass === "HiveNodeInstaller") {
-            setupNodeInstallerNode(node, app);
+        // 处理 HiveNodeInstaller / HiveBatchNodeInstaller / HiveNodeUpdater 节点
+        else if (node.comfyClass === "HiveNodeInstaller" || node.comfyClass === "HiveBatchNodeInstaller" || node.comfyClass === "HiveNodeUpdater") {
+            setupNodeInstallerNode(node, app, node.comfyClass);
         }
     },
     
     // 在节点配置时处理输出文本显示
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
-        if (nodeData.name === "HiveModelDownloader" || nodeData.name === "HiveNodeInstaller") {
+        if (nodeData.name === "HiveModelDownloader" || nodeData.name === "HiveBatchModelDownloader" || nodeData.name === "HiveNodeInstaller" || nodeData.name === "HiveBatchNodeInstaller" || nodeData.name === "HiveNodeUpdater") {
             const origOnExecuted = nodeType.prototype.onExecuted;
             nodeType.prototype.onExecuted = function (message) {
                 if (origOnExecuted) {
@@ -104,13 +105,22 @@ app.registerExtension({
                         outputWidget.value = message.text[0];
                     }
                 }
+                
+                // 模型下载器返回的是后台任务 ID，继续跟踪任务进度
+                if (message && message.job_id && message.job_id.length > 0) {
+                    monitorDownloadJob(this, message.job_id[0]);
+                }
+                // 批量下载器返回的是批次 ID，跟踪整批任务的进度
+                if (message && message.batch_id && message.batch_id.length > 0) {
+                    monitorDownloadJob(this, message.batch_id[0], `/hive/batches/${message.batch_id[0]}`);
+                }
             };
         }
     }
 });
 
-// 设置模型下载器节点
-function setupModelDownloaderNode(node, app) {
+// 设置模型下载器节点（单个/批量）
+function setupModelDownloaderNode(node, app, nodeType = "HiveModelDownloader") {
     // 检查是否已经设置过
     if (node.hiveStartButton) {
         return;
@@ -120,7 +130,7 @@ function setupModelDownloaderNode(node, app) {
     try {
         const startDownloadText = 'Start Download (开始下载)';
         const startButton = node.addWidget("button", startDownloadText, null, () => {
-            executeNode(node, app, "HiveModelDownloader");
+            executeNode(node, app, nodeType);
         });
         startButton.serialize = false;
         node.hiveStartButton = startButton;
@@ -186,8 +196,8 @@ function setupModelDownloaderNode(node, app) {
     }, 200);
 }
 
-// 设置节点安装器节点
-function setupNodeInstallerNode(node, app) {
+// 设置节点安装器节点（单个/批量/更新器）
+function setupNodeInstallerNode(node, app, nodeType = "HiveNodeInstaller") {
     // 检查是否已经设置过
     if (node.hiveStartButton) {
         return;
@@ -195,9 +205,9 @@ function setupNodeInstallerNode(node, app) {
     
     // 添加开始按钮
     try {
-        const startInstallText = 'Start Install (开始安装)';
+        const startInstallText = nodeType === "HiveNodeUpdater" ? 'Update All (全部更新)' : 'Start Install (开始安装)';
         const startButton = node.addWidget("button", startInstallText, null, () => {
-            executeNode(node, app, "HiveNodeInstaller");
+            executeNode(node, app, nodeType);
         });
         startButton.serialize = false;
         node.hiveStartButton = startButton;
@@ -433,8 +443,11 @@ async function executeNode(node, app, nodeType) {
         
         // 定义输入名称映射（根据节点类型和 widget 顺序）
         const inputNameMap = {
-            "HiveNodeInstaller": ["url"],
-            "HiveModelDownloader": ["url", "save_directory"]
+            "HiveNodeInstaller": ["url", "install_mode", "ref"],
+            "HiveBatchNodeInstaller": ["urls", "install_mode"],
+            "HiveNodeUpdater": ["check_only"],
+            "HiveModelDownloader": ["url", "save_directory", "sha256", "update_existing"],
+            "HiveBatchModelDownloader": ["manifest", "save_directory"]
         };
         
         const inputNames = inputNameMap[nodeType] || [];
@@ -648,6 +661,12 @@ function monitorExecution(node, app, promptId) {
                         if (output.text && output.text.length > 0 && node.hiveOutputWidget) {
                             node.hiveOutputWidget.value = output.text[0];
                         }
+                        if (output.job_id && output.job_id.length > 0) {
+                            monitorDownloadJob(node, output.job_id[0]);
+                        }
+                        if (output.batch_id && output.batch_id.length > 0) {
+                            monitorDownloadJob(node, output.batch_id[0], `/hive/batches/${output.batch_id[0]}`);
+                        }
                     } else if (data[promptId].status.status_str === "success") {
                         // 如果执行成功但没有输出，显示成功消息
                         if (node.hiveOutputWidget) {
@@ -740,3 +759,112 @@ function monitorExecution(node, app, promptId) {
     // 移除超时限制 - 允许长时间运行的任务
     // 不再设置超时，让任务自然完成
 }
+
+// 跟踪后台下载任务（或批量下载）的进度（下载器提交任务后立即返回任务 ID / 批次 ID）
+// 进度由服务端通过 websocket 推送（hive.download.progress / hive.batch.progress，已合并发送），
+// 另外每5秒查询一次状态作为兜底，避免 websocket 重连期间错过完成事件
+function monitorDownloadJob(node, jobId, statusUrl = `/hive/downloads/${jobId}`) {
+    if (node.hiveMonitoringJobId === jobId) {
+        return;
+    }
+    node.hiveMonitoringJobId = jobId;
+    
+    const finishedStates = ["completed", "failed", "cancelled", "paused"];
+    let jobInterval = null;
+    
+    const stopMonitoring = () => {
+        if (jobInterval) {
+            clearInterval(jobInterval);
+            jobInterval = null;
+        }
+        hiveProgressListeners.delete(jobId);
+        if (node.hiveMonitoringJobId === jobId) {
+            node.hiveMonitoringJobId = null;
+        }
+    };
+    
+    const applyStatus = (job) => {
+        if (node.hiveMonitoringJobId !== jobId) {
+            stopMonitoring();
+            return;
+        }
+        
+        if (finishedStates.includes(job.state)) {
+            stopMonitoring();
+            if (node.hiveOutputWidget && job.message) {
+                node.hiveOutputWidget.value = job.message;
+            }
+            if (node.hiveProgressWidget) {
+                node.hiveProgressWidget.setProgress(job.progress, `${job.progress.toFixed(1)}% - ${job.state}`);
+                setTimeout(() => {
+                    if (node.hiveProgressWidget) {
+                        node.hiveProgressWidget.hide();
+                    }
+                }, 1500);
+            }
+            return;
+        }
+        
+        if (node.hiveProgressWidget) {
+            const downloadedMb = (job.downloaded / 1024 / 1024).toFixed(1);
+            const totalMb = (job.total_size / 1024 / 1024).toFixed(1);
+            let text = `${job.progress.toFixed(1)}% (${downloadedMb} / ${totalMb} MB)`;
+            if (job.speed) {
+                text += ` ${(job.speed / 1024 / 1024).toFixed(1)} MB/s`;
+            }
+            if (job.eta) {
+                text += ` ETA ${formatEta(job.eta)}`;
+            }
+            node.hiveProgressWidget.show();
+            node.hiveProgressWidget.setProgress(job.progress, text);
+        }
+        // 批量下载时显示每个文件的进度
+        if (job.files && node.hiveOutputWidget && job.message) {
+            node.hiveOutputWidget.value = job.message;
+        }
+    };
+    
+    hiveProgressListeners.set(jobId, applyStatus);
+    
+    const pollStatus = async () => {
+        try {
+            const response = await fetch(statusUrl);
+            if (!response.ok) {
+                stopMonitoring();
+                return;
+            }
+            applyStatus(await response.json());
+        } catch (error) {
+            const jobErrorMsg = 'Failed to check download job status (检查下载任务状态失败)';
+            console.error(jobErrorMsg + ':', error);
+        }
+    };
+    pollStatus();
+    jobInterval = setInterval(pollStatus, 5000);
+}
+
+// 剩余时间格式化为 h:mm:ss / m:ss
+function formatEta(seconds) {
+    seconds = Math.round(seconds);
+    const h = Math.floor(seconds / 3600);
+    const m = Math.floor((seconds % 3600) / 60);
+    const sec = String(seconds % 60).padStart(2, "0");
+    return h > 0 ? `${h}:${String(m).padStart(2, "0")}:${sec}` : `${m}:${sec}`;
+}
+
+// 正在跟踪的任务/批次 ID -> 进度处理函数
+const hiveProgressListeners = new Map();
+
+api.addEventListener("hive.download.progress", (event) => {
+    const listener = hiveProgressListeners.get(event.detail.job_id);
+    if (listener) {
+        listener(event.detail);
+    }
+});
+
+api.addEventListener("hive.batch.progress", (event) => {
+    const listener = hiveProgressListeners.get(event.detail.batch_id);
+    if (listener) {
+        listener(event.detail);
+    }
+});